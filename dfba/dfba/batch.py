@@ -0,0 +1,118 @@
+"""
+Batch simulations of DFBA models over many scenarios.
+
+A scenario is a set of values for roadrunner selections, e.g. initial
+concentrations 'init([glc__D_e])' or parameter ids. The scenarios are
+simulated on a pool of worker processes, every worker loads the model once.
+"""
+import logging
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from sbmlutils.dfba.results import BatchResult
+
+# simulator of the worker process
+_simulator = None
+
+
+def conditions_table(conditions):
+    """ Table of scenarios.
+
+    :param conditions: pandas DataFrame (scenarios x selections) or list of dicts
+    :return: pandas DataFrame
+    """
+    if isinstance(conditions, pd.DataFrame):
+        return conditions
+    return pd.DataFrame(list(conditions))
+
+
+def simulate_condition(dfba_simulator, condition, **kwargs):
+    """ Simulates a single scenario.
+
+    The model is reset to its original state, then the values of the scenario are set.
+
+    :param dfba_simulator: DFBASimulator
+    :param condition: dict {selection: value}
+    :param kwargs: arguments for DFBASimulator.simulate
+    :return: DFBAResult
+    """
+    ode_model = dfba_simulator.ode_model
+    ode_model.resetAll()
+    for key, value in condition.items():
+        if value is not None and not (isinstance(value, float) and np.isnan(value)):
+            ode_model.setValue(key, value)
+    kwargs['reset'] = True
+    return dfba_simulator.simulate(**kwargs)
+
+
+def _init_worker(sbml_path, simulator_kwargs):
+    global _simulator
+    # imported here to avoid circular imports
+    from sbmlutils.dfba.model import DFBAModel
+    from sbmlutils.dfba.simulator import DFBASimulator
+
+    dfba_model = DFBAModel(sbml_path=sbml_path)
+    _simulator = DFBASimulator(dfba_model, **simulator_kwargs)
+
+
+def _worker_simulate(task):
+    k, condition, kwargs = task
+    try:
+        result = simulate_condition(_simulator, condition, **kwargs)
+    except Exception as e:
+        logging.error("Scenario {} failed: {}".format(k, e))
+        return k, None, None, None, False
+    if not result.complete:
+        logging.error("Scenario {} failed: {}".format(k, result.error))
+    return k, np.array(result.data), np.array(result.time), result.columns, result.complete
+
+
+def simulate_batch(dfba_simulator, conditions, n_workers=1, chunksize=1, **kwargs):
+    """ Simulates the scenarios of the conditions table.
+
+    With a single worker the scenarios are simulated with the given simulator,
+    otherwise every worker process creates its own simulator from the SBML file.
+
+    :param dfba_simulator: DFBASimulator
+    :param conditions: pandas DataFrame (scenarios x selections) or list of dicts
+    :param n_workers: number of worker processes
+    :param chunksize: number of scenarios sent to a worker at once
+    :param kwargs: arguments for DFBASimulator.simulate, by default without ODE settings output
+    :return: BatchResult
+    """
+    kwargs.setdefault('show_settings', False)
+    conditions = conditions_table(conditions)
+    records = conditions.to_dict(orient='records')
+    n = len(records)
+    results = [None] * n
+
+    if n_workers is None or n_workers <= 1:
+        for k, condition in enumerate(records):
+            try:
+                result = simulate_condition(dfba_simulator, condition, **kwargs)
+            except Exception as e:
+                logging.error("Scenario {} failed: {}".format(k, e))
+                continue
+            if not result.complete:
+                logging.error("Scenario {} failed: {}".format(k, result.error))
+            results[k] = (np.array(result.data), np.array(result.time), result.columns, result.complete)
+    else:
+        simulator_kwargs = dict(dfba_simulator.simulator_kwargs)
+        # worker processes can not start their own FVA pools
+        simulator_kwargs['fva_processes'] = 1
+        simulator_kwargs['lp_processes'] = 1
+        pool = multiprocessing.Pool(processes=n_workers, initializer=_init_worker,
+                                    initargs=(dfba_simulator.dfba_model.sbml_top, simulator_kwargs))
+        try:
+            tasks = ((k, condition, kwargs) for k, condition in enumerate(records))
+            for k, data, time, columns, complete in pool.imap_unordered(_worker_simulate, tasks,
+                                                                        chunksize=chunksize):
+                if data is not None:
+                    results[k] = (data, time, columns, complete)
+        finally:
+            pool.close()
+            pool.join()
+
+    return BatchResult.from_results(results, conditions=conditions)
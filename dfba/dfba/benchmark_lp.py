@@ -0,0 +1,101 @@
+"""
+Benchmark of the LP backends on the example models.
+
+Every example model is simulated with each LP solver, the wall times of
+the simulations and the deviation of the results from the first solver
+are reported.
+
+Usage:
+    python -m sbmlutils.dfba.benchmark_lp
+"""
+import os
+import logging
+import importlib
+
+import numpy as np
+import pandas as pd
+
+from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.simulator import DFBASimulator
+from sbmlutils.dfba.utils import versioned_directory
+
+# example models with simulation end time and step size
+EXAMPLES = [
+    ('toy_wholecell', 50.0, 0.1),
+    ('toy_atp', 15.0, 0.1),
+    ('diauxic_growth', 10.0, 0.05),
+    ('ecoli', 3.5, 0.01),
+    ('rbc', 10.0, 0.1),
+    ('recon1', 10.0, 0.1),
+]
+
+
+def example_sbml_paths(name):
+    """ Top model and submodels of the example.
+
+    :param name: package of the example
+    :return: list of paths to the SBML files, the top model first
+    """
+    settings = importlib.import_module('sbmlutils.dfba.{}.settings'.format(name))
+    directory = versioned_directory(settings.OUT_DIR, settings.VERSION)
+    return [os.path.join(directory, location) for location in (settings.TOP_LOCATION, settings.FBA_LOCATION,
+                                                               settings.BOUNDS_LOCATION, settings.UPDATE_LOCATION)]
+
+
+def benchmark_lp_solvers(sbml_path, tend, dt, lp_solvers=('glpk', 'highs'), n_repeat=5, **kwargs):
+    """ Benchmarks the LP solvers on a model.
+
+    :param sbml_path: path to top level SBML file
+    :param tend: end time
+    :param dt: step size
+    :param lp_solvers: LP solvers, the results are compared to the first solver
+    :param n_repeat: number of simulations per solver
+    :param kwargs: arguments for DFBASimulator
+    :return: pandas DataFrame with the timings per solver
+    """
+    records = []
+    reference = None
+    for lp_solver in lp_solvers:
+        # the simulator changes the solver of the cobra model, every solver gets its own model
+        dfba_model = DFBAModel(sbml_path=sbml_path)
+        dfba_simulator = DFBASimulator(dfba_model, lp_solver=lp_solver, **kwargs)
+        timings = dfba_simulator.benchmark(n_repeat=n_repeat, tstart=0.0, tend=tend, dt=dt,
+                                           show_settings=False)
+        data = dfba_simulator.result.data
+        if reference is None:
+            reference = data
+        deviation = np.nanmax(np.abs(data - reference)) if data.shape == reference.shape else np.nan
+        records.append({
+            'lp_solver': lp_solver,
+            'mean': np.mean(timings),
+            'std': np.std(timings),
+            'per_step': np.mean(timings) / np.round(tend / dt),
+            'max_deviation': deviation,
+        })
+    return pd.DataFrame(records, columns=['lp_solver', 'mean', 'std', 'per_step', 'max_deviation'])
+
+
+def benchmark_examples(lp_solvers=('glpk', 'highs'), n_repeat=5, **kwargs):
+    """ Benchmarks the LP solvers on all example models.
+
+    :return: pandas DataFrame with the timings per model and solver
+    """
+    dfs = []
+    for name, tend, dt in EXAMPLES:
+        sbml_paths = example_sbml_paths(name)
+        missing = [path for path in sbml_paths if not os.path.exists(path)]
+        if missing:
+            # e.g. the FBA submodel of recon1 is not part of the repository
+            logging.warning("Example model is incomplete, create it first: {}".format(missing))
+            continue
+        sbml_path = sbml_paths[0]
+        df = benchmark_lp_solvers(sbml_path, tend=tend, dt=dt, lp_solvers=lp_solvers,
+                                  n_repeat=n_repeat, **kwargs)
+        df.insert(0, 'model', name)
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True) if dfs else None
+
+
+if __name__ == "__main__":
+    df = benchmark_examples()
+    print(df)
@@ -0,0 +1,209 @@
+"""
+On-disk cache of compiled DFBA models.
+
+Compiling the roadrunner model and reading the cobra models are the expensive
+parts of creating a DFBAModel. The cache stores the roadrunner state, the
+pickled cobra models and the mappings of the FBA models. Entries are keyed by
+a hash of the top model and all referenced external model definitions, so any
+change of the model files results in a new entry. The size of the cache is
+bounded, the least recently used entries are evicted.
+"""
+import os
+import json
+import shutil
+import pickle
+import hashlib
+import logging
+import tempfile
+
+import libsbml
+import roadrunner
+import cobra
+
+from sbmlutils.dfba import builder
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sbmlutils', 'dfba')
+DEFAULT_MAX_SIZE = 2 * 1024**3  # [bytes]
+
+RR_STATE_FILE = 'roadrunner.state'
+INFO_FILE = 'info.json'
+ACCESS_FILE = 'access'
+
+# element of external model definitions in the SBML files
+EMD_TAG = b'externalModelDefinition'
+
+# mappings of the FBAModel which are cached
+FBA_ATTRIBUTES = ['objective_direction', 'ub_pid2rid', 'lb_pid2rid', 'fba2top_bounds',
+                  'fba2top_reactions', 'top2flat_reactions']
+
+
+def referenced_files(sbml_path, doc=None):
+    """ SBML file and all files referenced via external model definitions.
+
+    The files are read as bytes, only files with external model definitions
+    are parsed with libsbml (the top file not at all if its document is given).
+
+    :param sbml_path: path to SBML file
+    :param doc: parsed SBMLDocument of the file
+    :return: list of (absolute path, file content), the given file first
+    """
+    files = []
+    paths = set()
+    stack = [(os.path.abspath(sbml_path), doc)]
+    while stack:
+        path, doc = stack.pop()
+        if path in paths or not os.path.exists(path):
+            continue
+        paths.add(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        files.append((path, content))
+        if doc is None:
+            if EMD_TAG not in content:
+                continue
+            doc = libsbml.readSBMLFromString(content.decode('utf-8'))
+        doc_comp = doc.getPlugin(builder.SBML_COMP_NAME)
+        if doc_comp is None:
+            continue
+        for emd in doc_comp.getListOfExternalModelDefinitions():
+            source = emd.getSource()
+            if not os.path.isabs(source):
+                source = os.path.join(os.path.dirname(path), source)
+            stack.append((os.path.abspath(source), None))
+    return files
+
+
+class ModelCache(object):
+    """ Size-bounded on-disk cache of compiled DFBA models. """
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_MAX_SIZE):
+        """ Create the cache.
+
+        :param cache_dir: directory of the cache
+        :param max_size: maximal size of the cache in bytes
+        """
+        if cache_dir is None:
+            cache_dir = DEFAULT_CACHE_DIR
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    def key(self, sbml_path, doc=None):
+        """ Hash of the model files and the versions of the simulation libraries.
+
+        :param sbml_path: path to top level SBML file
+        :param doc: parsed SBMLDocument of the top level file
+        :return: hex digest
+        """
+        h = hashlib.sha256()
+        for lib in (roadrunner, cobra, libsbml):
+            h.update(str(getattr(lib, '__version__', '')).encode('utf-8'))
+        # entries with other cached attributes are not compatible
+        h.update(','.join(FBA_ATTRIBUTES).encode('utf-8'))
+        for _, content in referenced_files(sbml_path, doc=doc):
+            h.update(hashlib.sha256(content).digest())
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """ Cached artifacts of the model.
+
+        :param key: cache key
+        :return: dict with 'rr_state' (path), 'flux_rules' and 'fba_models'
+            (list of dicts with 'cobra_model' and the FBA_ATTRIBUTES) or None
+        """
+        entry = self._entry_dir(key)
+        info_path = os.path.join(entry, INFO_FILE)
+        if not os.path.exists(info_path):
+            return None
+        try:
+            with open(info_path, 'r') as f:
+                info = json.load(f)
+            fba_models = []
+            for k, fba_info in enumerate(info['fba_models']):
+                with open(os.path.join(entry, 'cobra_{}.pickle'.format(k)), 'rb') as f:
+                    fba_info['cobra_model'] = pickle.load(f)
+                fba_models.append(fba_info)
+        except Exception as e:
+            logging.warning("Invalid cache entry '{}': {}".format(key, e))
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        # access time for LRU eviction
+        os.utime(os.path.join(entry, ACCESS_FILE), None)
+        logging.info("Model loaded from cache: {}".format(entry))
+        return {
+            'rr_state': os.path.join(entry, RR_STATE_FILE),
+            'flux_rules': info['flux_rules'],
+            'fba_models': fba_models,
+        }
+
+    def store(self, key, dfba_model):
+        """ Stores the artifacts of a processed DFBAModel.
+
+        The entry is written to a temporary directory and moved in place,
+        so concurrent processes never read partial entries.
+
+        :param key: cache key
+        :param dfba_model: DFBAModel
+        """
+        entry = self._entry_dir(key)
+        if os.path.exists(entry):
+            return
+        tmp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp_')
+        try:
+            dfba_model.rr_comp.saveState(os.path.join(tmp_dir, RR_STATE_FILE))
+            fba_models = []
+            for k, fba_model in enumerate(dfba_model.fba_models):
+                with open(os.path.join(tmp_dir, 'cobra_{}.pickle'.format(k)), 'wb') as f:
+                    pickle.dump(fba_model.cobra_model, f, protocol=pickle.HIGHEST_PROTOCOL)
+                fba_models.append({name: getattr(fba_model, name) for name in FBA_ATTRIBUTES})
+            info = {
+                'sbml_top': dfba_model.sbml_top,
+                'flux_rules': dfba_model.flux_rules,
+                'fba_models': fba_models,
+            }
+            with open(os.path.join(tmp_dir, INFO_FILE), 'w') as f:
+                json.dump(info, f, indent=2)
+            with open(os.path.join(tmp_dir, ACCESS_FILE), 'w'):
+                pass
+            os.rename(tmp_dir, entry)
+        except Exception as e:
+            logging.warning("Model could not be cached: {}".format(e))
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+        self.evict()
+
+    def entries(self):
+        """ Cache entries sorted from least to most recently used.
+
+        :return: list of (access time, size in bytes, path)
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            access_path = os.path.join(path, ACCESS_FILE)
+            if name.startswith('.') or not os.path.exists(access_path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(access_path), size, path))
+        return sorted(entries)
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache fits in max_size. """
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for _, size, path in entries[:-1]:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            logging.info("Cache entry evicted: {}".format(path))
+
+    def clear(self):
+        """ Removes all entries. """
+        for _, _, path in self.entries():
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,110 @@
+"""
+Checkpoints of running DFBA simulations.
+
+A checkpoint consists of the pickled simulation state, the rows of the
+simulation ('<path>.rows') and the roadrunner state file of the step next
+to it ('<path>.<step>.rr'). The rows are written incrementally: every
+checkpoint appends the rows since the last checkpoint as a chunk, the state
+records the size of the rows file. The state is written to a temporary file
+and moved in place after the rows and the roadrunner state, so a simulation
+killed while writing keeps the last complete checkpoint.
+"""
+import os
+import glob
+import pickle
+
+import numpy as np
+
+CHECKPOINT_VERSION = 2
+
+# arrays of the rows, chunks are concatenated along the first axis
+ROW_KEYS = ['data', 'time_points', 'fva', 'timing', 'lp_solved']
+
+
+def rr_state_path(path, step):
+    """ Path of the roadrunner state of the checkpoint at the step. """
+    return '{}.{}.rr'.format(path, step)
+
+
+def checkpoint_seed(seed, step):
+    """ Seed of the random numbers after the checkpoint at the step.
+
+    :param seed: seed of the simulation
+    :param step: step of the checkpoint
+    :return: int
+    """
+    return int(np.random.RandomState([int(seed), int(step)]).randint(0, 2**31 - 1))
+
+
+def rows_path(path):
+    """ Path of the rows of the checkpoint. """
+    return path + '.rows'
+
+
+def save_checkpoint(path, state, rr, rows, rows_offset=0):
+    """ Writes a checkpoint.
+
+    :param path: checkpoint file
+    :param state: dict of the simulation state, requires 'step'
+    :param rr: roadrunner instance
+    :param rows: dict of the arrays of the rows since the last checkpoint (ROW_KEYS)
+    :param rows_offset: size of the rows file of the last checkpoint, 0 for the first checkpoint
+    :return: size of the rows file after the checkpoint
+    """
+    rr_path = rr_state_path(path, state['step'])
+    state = dict(state)
+    state['version'] = CHECKPOINT_VERSION
+    state['rr_state'] = os.path.basename(rr_path)
+
+    # rows after the last checkpoint, e.g. from an interrupted write, are dropped
+    mode = 'r+b' if rows_offset > 0 else 'wb'
+    with open(rows_path(path), mode) as f:
+        f.truncate(rows_offset)
+        f.seek(rows_offset)
+        pickle.dump(rows, f, protocol=pickle.HIGHEST_PROTOCOL)
+        state['rows_size'] = f.tell()
+
+    rr.saveState(rr_path)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(path + '.tmp', path)
+
+    # roadrunner states of older checkpoints
+    for old_path in glob.glob(glob.escape(path) + '.*.rr'):
+        if old_path != rr_path:
+            os.remove(old_path)
+    return state['rows_size']
+
+
+def load_rows(path, size):
+    """ Reads the rows of a checkpoint.
+
+    :param path: checkpoint file
+    :param size: size of the rows file of the checkpoint
+    :return: dict of the arrays of all rows (ROW_KEYS)
+    """
+    chunks = []
+    with open(rows_path(path), 'rb') as f:
+        while f.tell() < size:
+            chunks.append(pickle.load(f))
+    rows = {}
+    for key in ROW_KEYS:
+        arrays = [chunk[key] for chunk in chunks if chunk[key] is not None]
+        rows[key] = np.concatenate(arrays) if arrays else None
+    return rows
+
+
+def load_checkpoint(path):
+    """ Reads the state of a checkpoint.
+
+    :param path: checkpoint file
+    :return: dict of the simulation state with the rows (ROW_KEYS),
+        'rr_state' is the path of the roadrunner state
+    """
+    with open(path, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported checkpoint version: {}".format(state.get('version')))
+    state['rr_state'] = os.path.join(os.path.dirname(os.path.abspath(path)), state['rr_state'])
+    state.update(load_rows(path, state['rows_size']))
+    return state
@@ -0,0 +1,269 @@
+"""
+Direct approach for DFBA simulations.
+
+The top model is integrated continuously with scipy's solve_ivp, the FBA
+fluxes are part of the right hand side. Between events the fluxes are
+calculated from a fixed optimal basis of the FBA (and pFBA) problem, i.e. they
+are a linear function of the bounds. An event function monitors the primal
+feasibility of the basis. When the basis becomes infeasible the integration
+is stopped at the event, the LP is solved for the state at the event and the
+integration is continued with the new optimal basis (LP feasible basis
+approach as in DFBAlab).
+The optimality of a fixed basis does not depend on the bounds, so
+trajectories are accurate with a few LP solves instead of one per step.
+
+Usage:
+    result = dfba_simulator.simulate_direct(tstart=0.0, tend=10.0, dt=0.1)
+"""
+import logging
+import timeit
+
+import numpy as np
+from cobra.util.array import create_stoichiometric_matrix
+
+from sbmlutils.dfba.lp import FastPath, PFBA_CONSTRAINT_ID
+from sbmlutils.dfba.results import ResultBuffer
+from sbmlutils.dfba.timing import PhaseTimer
+from sbmlutils.dfba.odestate import StateVector
+
+
+class DirectEngine(object):
+    """ Continuous integration of a DFBA model with basis change events. """
+
+    def __init__(self, dfba_simulator):
+        """ Create the engine.
+
+        :param dfba_simulator: DFBASimulator with a single FBA submodel without
+            constraints besides the steady state
+        """
+        sim = dfba_simulator
+        if sim.submodel_solvers:
+            raise ValueError("The direct approach supports only a single FBA submodel")
+        if sim.ode_integrator == "gillespie":
+            raise ValueError("The direct approach requires a deterministic model")
+        self.sim = sim
+
+        self.fast_path = sim.fast_path
+        if self.fast_path is None:
+            cobra_model = sim.cobra_model
+            constraints = [c for c in cobra_model.solver.constraints if c.name != PFBA_CONSTRAINT_ID]
+            if len(constraints) != len(cobra_model.metabolites):
+                raise ValueError("The direct approach supports only steady state constraints, "
+                                 "the FBA model has additional constraints.")
+            S = create_stoichiometric_matrix(cobra_model, array_type='dense')
+            self.fast_path = FastPath(S, sim.objective_coefficients, direction=sim.objective_direction,
+                                      pfba=sim.pfba)
+
+        self.n_events = 0  # basis changes
+        self.n_lp = 0  # LP solves
+        self._signs = None  # signs of the basic pfba fluxes of the current basis
+        self._row = None
+        self._state_vector = None  # state vector of the ode model
+
+    def simulate(self, tstart=0.0, tend=10.0, dt=0.1, method='LSODA', reset=True, max_events=10000):
+        """ Simulates the model.
+
+        :param tstart: start time
+        :param tend: end time
+        :param dt: interval of the output time points, also sets the dt parameter of the bounds
+        :param method: integration method of solve_ivp, e.g. 'LSODA', 'BDF', 'RK45'
+        :param reset: reset model to initial state
+        :param max_events: maximal number of basis changes
+        :return: DFBAResult
+        """
+        from scipy.integrate import solve_ivp
+
+        sim = self.sim
+        start_time = timeit.default_timer()
+        sim._set_timecourse_selections()
+        sim._setup_fba()
+        if reset:
+            sim.reset()
+        sim.dfba_model.set_dt(dt)
+        sim._flux_values = None
+        sim.n_lp = 0
+        sim.timer = PhaseTimer(capacity=1)
+        sim.timer.step(0)
+
+        points = int(np.round((tend - tstart) / dt)) + 1
+        t_eval = np.linspace(start=tstart, stop=tend, num=points)
+        buffer = ResultBuffer(columns=sim.ode_model.timeCourseSelections, capacity=points)
+        buffer.time[:] = t_eval
+        self._row = np.empty(len(buffer.columns), dtype=np.float64)
+
+        self._state_vector = StateVector(sim.ode_model)
+        t = tstart
+        sim.ode_model.model.setTime(t)
+        y = self._state_vector.get()
+        self.n_events = 0
+        self.n_lp = 0
+
+        # the fast path of the simulator holds the bases of the LP solutions
+        fast_path, sim.fast_path = sim.fast_path, self.fast_path
+        try:
+            self._bounds(t, y)
+            self._solve()
+            linear = self._feasible_basis()
+            while True:
+                # remaining output time points
+                t_points = t_eval[buffer.n:]
+                t_end = tend
+                if not linear:
+                    # without basis the LP is solved until the next output time point
+                    later = t_points[t_points > t]
+                    if len(later):
+                        t_end = later[0]
+                t_points = np.clip(t_points[t_points <= t_end], t, t_end)
+                sol = solve_ivp(self._rhs_linear if linear else self._rhs_lp, (t, t_end), y, method=method,
+                                t_eval=t_points, events=[self._event] if linear else None,
+                                rtol=sim.rel_tol, atol=sim.abs_tol)
+                if not sol.success:
+                    raise RuntimeError("Integration failed: {}".format(sol.message))
+                for k in range(len(sol.t)):
+                    self._store(buffer, sol.t[k], sol.y[:, k], linear)
+
+                if sol.status == 1:
+                    # basis change
+                    t_event = sol.t_events[0][0]
+                    stalled = t_event - t <= 1E-12 * (1.0 + abs(t))
+                    t, y = t_event, np.array(sol.y_events[0][0])
+                    self.n_events += 1
+                    if self.n_events > max_events:
+                        raise RuntimeError("More than {} basis changes".format(max_events))
+                    self._bounds(t, y)
+                    self._solve()
+                    # degenerate basis changes are integrated with LP solves
+                    linear = not stalled and self._feasible_basis()
+                    logging.debug("* basis change at t = {}".format(t))
+                elif buffer.n < points:
+                    t, y = sol.t[-1], np.array(sol.y[:, -1])
+                    self._bounds(t, y)
+                    self._solve()
+                    linear = self._feasible_basis()
+                else:
+                    break
+        finally:
+            sim.fast_path = fast_path
+            sim._restore_objective()
+
+        sim.n_events = self.n_events
+        sim.simulation_time = timeit.default_timer() - start_time
+        logging.info("Direct DFBA: {} basis changes, {} LPs".format(self.n_events, self.n_lp))
+        sim.result = buffer.result()
+        return sim.result
+
+    def _set_state(self, t, y):
+        self._state_vector.restore((t, y))
+
+    def _bounds(self, t, y):
+        """ Sets the FBA bounds for the state.
+
+        :return: (lower bounds, upper bounds) of all reactions
+        """
+        self._set_state(t, y)
+        sim = self.sim
+        sim._set_fba_bounds(sim._read_ode(self._row))
+        return sim.reaction_lb, sim.reaction_ub
+
+    def _solve(self):
+        """ Solves the LP for the current bounds, the bases are updated. """
+        sim = self.sim
+        sim._solve_lp()
+        sim.n_lp += 1
+        self.n_lp += 1
+        sim._set_fluxes()
+        basis = self.fast_path.pfba_basis
+        if basis is not None:
+            self._signs = np.sign(sim.fluxes[basis.free])
+
+    def _has_basis(self):
+        fast_path = self.fast_path
+        return fast_path.fba_basis is not None and (not self.sim.pfba or fast_path.pfba_basis is not None)
+
+    def _feasible_basis(self):
+        """ Checks if the bases of the last LP are feasible for the current bounds.
+
+        The event only detects a margin crossing zero from above. A basis with
+        a negative margin directly after the LP, e.g. at a degenerate optimum,
+        is not monitored, so the segment is integrated with LP solves instead.
+        """
+        if not self._has_basis():
+            return False
+        sim = self.sim
+        return self._margin(sim.reaction_lb, sim.reaction_ub) >= 0.0
+
+    def _basis_fluxes(self, lb, ub):
+        """ Fluxes of the current basis, linear in the bounds.
+
+        :return: (FBA fluxes, fluxes)
+        """
+        fast_path = self.fast_path
+        v = fast_path.fba_basis.fluxes(fast_path.S, lb, ub)
+        if not self.sim.pfba:
+            return v, v
+        z = fast_path.c.dot(v)
+        return v, fast_path.pfba_basis.fluxes(fast_path.S, lb, ub, c=fast_path.c, value=z)
+
+    def _margin(self, lb, ub):
+        """ Primal feasibility margin of the current basis.
+
+        Negative if a basic flux violates its bounds, a basic pfba flux changes
+        its sign or a flux fixed at zero is excluded by its bounds.
+        """
+        fast_path = self.fast_path
+        v, w = self._basis_fluxes(lb, ub)
+        free = fast_path.fba_basis.free
+        margins = [v[free] - lb[free], ub[free] - v[free]]
+        if self.sim.pfba:
+            basis = fast_path.pfba_basis
+            free = basis.free
+            margins.extend([w[free] - lb[free], ub[free] - w[free], self._signs * w[free],
+                            -lb[basis.at_zero], ub[basis.at_zero]])
+        margins = np.concatenate(margins)
+        margins = margins[np.isfinite(margins)]
+        return np.min(margins) if len(margins) else 1.0
+
+    def _event(self, t, y):
+        lb, ub = self._bounds(t, y)
+        return self._margin(lb, ub)
+    _event.terminal = True
+    _event.direction = -1
+
+    def _rhs_linear(self, t, y):
+        lb, ub = self._bounds(t, y)
+        sim = self.sim
+        _, sim.fluxes = self._basis_fluxes(lb, ub)
+        sim._set_fluxes()
+        return self._state_vector.rate(t, y)
+
+    def _rhs_lp(self, t, y):
+        self._bounds(t, y)
+        self._solve()
+        return self._state_vector.rate(t, y)
+
+    def _store(self, buffer, t, y, linear):
+        """ Stores the row of an output time point. """
+        sim = self.sim
+        lb, ub = self._bounds(t, y)
+        if linear:
+            _, sim.fluxes = self._basis_fluxes(lb, ub)
+            sim._set_fluxes()
+        else:
+            self._solve()
+        row = buffer.row(buffer.n)
+        sim._read_ode(row)
+        sim._store_fba_fluxes(row)
+        buffer.time[buffer.n] = t
+        buffer.advance()
+
+
+def simulate_direct(dfba_simulator, tstart=0.0, tend=10.0, dt=0.1, method='LSODA', reset=True,
+                    max_events=10000):
+    """ Simulates the model with the direct approach, see DirectEngine.
+
+    :param dfba_simulator: DFBASimulator
+    :return: DFBAResult
+    """
+    engine = DirectEngine(dfba_simulator)
+    return engine.simulate(tstart=tstart, tend=tend, dt=dt, method=method, reset=reset,
+                           max_events=max_events)
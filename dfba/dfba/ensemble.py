@@ -0,0 +1,190 @@
+"""
+Ensembles of stochastic DFBA simulations.
+
+Replicates are simulated with the gillespie integrator and seeds drawn
+from a base seed. The statistics per time point are accumulated while the
+replicates are streamed, i.e. the trajectories are never kept in memory:
+mean and variance with Welford's algorithm, quantiles with the P-square
+algorithm (Jain & Chlamtac, 1985).
+"""
+import logging
+import multiprocessing
+
+import numpy as np
+
+from sbmlutils.dfba import batch
+from sbmlutils.dfba.results import EnsembleResult
+
+
+class WelfordAccumulator(object):
+    """ Streaming mean and variance of arrays. """
+
+    def __init__(self, shape):
+        self.n = 0
+        self.mean = np.zeros(shape=shape, dtype=np.float64)
+        self.m2 = np.zeros(shape=shape, dtype=np.float64)
+
+    def add(self, x):
+        """ Adds an observation.
+
+        :param x: numpy array
+        """
+        self.n += 1
+        delta = x - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        """ Sample variance. """
+        if self.n < 2:
+            return np.full(shape=self.mean.shape, fill_value=np.nan)
+        return self.m2 / (self.n - 1)
+
+
+class P2Quantile(object):
+    """ Streaming estimate of a quantile of arrays with the P-square algorithm.
+
+    Five markers per array element track the minimum, the p/2, p, (1+p)/2
+    quantiles and the maximum; all elements are updated vectorized.
+    """
+
+    def __init__(self, p, shape):
+        self.p = p
+        self.n = 0
+        self.q = np.zeros(shape=(5,) + tuple(shape), dtype=np.float64)  # marker heights
+        self.pos = np.zeros(shape=(5,) + tuple(shape), dtype=np.float64)  # marker positions
+        self.desired = np.array([1.0, 1.0 + 2 * p, 1.0 + 4 * p, 3.0 + 2 * p, 5.0])
+        self.increment = np.array([0.0, p / 2.0, p, (1.0 + p) / 2.0, 1.0])
+
+    def add(self, x):
+        """ Adds an observation.
+
+        :param x: numpy array
+        """
+        if self.n < 5:
+            self.q[self.n] = x
+            self.n += 1
+            if self.n == 5:
+                self.q.sort(axis=0)
+                self.pos[:] = np.arange(1, 6).reshape((5,) + (1,) * x.ndim)
+            return
+        self.n += 1
+        q, pos = self.q, self.pos
+
+        # extreme values and cell k of the observation: q[k] <= x < q[k+1]
+        np.minimum(q[0], x, out=q[0])
+        np.maximum(q[4], x, out=q[4])
+        k = np.sum(x >= q[1:4], axis=0)
+        for i in range(1, 5):
+            pos[i] += (k < i)
+        self.desired += self.increment
+
+        # adjust the middle markers
+        for i in range(1, 4):
+            d = self.desired[i] - pos[i]
+            move = ((d >= 1.0) & (pos[i + 1] - pos[i] > 1.0)) | ((d <= -1.0) & (pos[i - 1] - pos[i] < -1.0))
+            if not np.any(move):
+                continue
+            s = np.sign(d)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                parabolic = q[i] + s / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + s) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i]) +
+                    (pos[i + 1] - pos[i] - s) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                q_next = np.where(s > 0, q[i + 1], q[i - 1])
+                pos_next = np.where(s > 0, pos[i + 1], pos[i - 1])
+                linear = q[i] + s * (q_next - q[i]) / (pos_next - pos[i])
+            value = np.where((q[i - 1] < parabolic) & (parabolic < q[i + 1]), parabolic, linear)
+            q[i] = np.where(move, value, q[i])
+            pos[i] = np.where(move, pos[i] + s, pos[i])
+
+    @property
+    def value(self):
+        """ Current estimate of the quantile. """
+        if self.n == 0:
+            return np.full(shape=self.q.shape[1:], fill_value=np.nan)
+        if self.n < 5:
+            return np.percentile(self.q[:self.n], 100.0 * self.p, axis=0)
+        return self.q[2].copy()
+
+
+def replicate_seeds(n, base_seed=0):
+    """ Seeds of the replicates.
+
+    :param n: number of replicates
+    :param base_seed: seed of the random generator for the seeds
+    :return: numpy array of seeds
+    """
+    return np.random.RandomState(base_seed).randint(0, 2**31 - 1, size=n)
+
+
+def _worker_replicate(task):
+    k, seed, kwargs = task
+    result = batch._simulator.simulate(seed=seed, **kwargs)
+    return k, np.array(result.data), np.array(result.time), result.columns
+
+
+def simulate_ensemble(dfba_simulator, n, base_seed=0, n_workers=1, quantiles=(0.05, 0.5, 0.95), **kwargs):
+    """ Simulates an ensemble of stochastic replicates.
+
+    The replicates are consumed in order of their seeds, so the statistics
+    are reproducible for a given base seed independent of the number of workers.
+
+    :param dfba_simulator: DFBASimulator with gillespie integrator
+    :param n: number of replicates
+    :param base_seed: seed for the seeds of the replicates
+    :param n_workers: number of worker processes
+    :param quantiles: quantiles to estimate
+    :param kwargs: arguments for DFBASimulator.simulate, requires fixed steps
+    :return: EnsembleResult
+    """
+    if dfba_simulator.ode_integrator != "gillespie":
+        raise ValueError("Ensembles require the 'gillespie' integrator, not '{}'".format(
+            dfba_simulator.ode_integrator))
+    if kwargs.get('adaptive', False):
+        raise ValueError("Ensembles require fixed step sizes")
+    kwargs['reset'] = True
+    kwargs.setdefault('show_settings', False)
+
+    seeds = replicate_seeds(n, base_seed=base_seed)
+    tasks = ((k, seed, kwargs) for k, seed in enumerate(seeds))
+
+    pool = None
+    if n_workers is None or n_workers <= 1:
+        def replicates():
+            for k, seed, task_kwargs in tasks:
+                result = dfba_simulator.simulate(seed=seed, **task_kwargs)
+                yield k, result.data, result.time, result.columns
+        results = replicates()
+    else:
+        simulator_kwargs = dict(dfba_simulator.simulator_kwargs)
+        simulator_kwargs['fva_processes'] = 1
+        simulator_kwargs['lp_processes'] = 1
+        pool = multiprocessing.Pool(processes=n_workers, initializer=batch._init_worker,
+                                    initargs=(dfba_simulator.dfba_model.sbml_top, simulator_kwargs))
+        results = pool.imap(_worker_replicate, tasks)
+
+    welford, p2 = None, None
+    time, columns = None, None
+    try:
+        for k, data, t, cols in results:
+            if welford is None:
+                time, columns = np.array(t), cols
+                welford = WelfordAccumulator(data.shape)
+                p2 = [P2Quantile(p, data.shape) for p in quantiles]
+            elif data.shape != welford.mean.shape:
+                raise ValueError("Replicate {} has shape {}, expected {}".format(k, data.shape, welford.mean.shape))
+            welford.add(data)
+            for estimator in p2:
+                estimator.add(data)
+            logging.debug("Replicate {} of {}".format(k + 1, n))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if welford is None:
+        return None
+    return EnsembleResult(mean=welford.mean, variance=welford.variance,
+                          quantiles={p: estimator.value for p, estimator in zip(quantiles, p2)},
+                          columns=columns, time=time, n=welford.n, base_seed=base_seed)
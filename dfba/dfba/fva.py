@@ -0,0 +1,159 @@
+"""
+Parallel flux variability analysis (FVA) for DFBA simulations.
+
+The worker processes are started once per simulation. Every worker holds
+its own copy of the FBA model with the optimum constraints, per time step
+only the flux bounds and the optimal values are sent to the workers and
+the min/max LPs of the reactions are split across the workers.
+"""
+import logging
+import pickle
+import multiprocessing
+
+import numpy as np
+from cobra.util.solver import check_solver_status
+from optlang.symbolics import Zero
+
+from sbmlutils.dfba.lp import PFBAProblem
+
+FVA_TOTAL_FLUX_ID = '_fva_total_flux'
+
+# state of the worker process
+_worker = None
+
+
+class _FVAWorker(object):
+    """ FVA on the model copy of a worker process. """
+
+    def __init__(self, cobra_model, objective_coefficients, direction, pfba, tol):
+        self.cobra_model = cobra_model
+        self.reactions = list(cobra_model.reactions)
+        self.index = {r.id: k for k, r in enumerate(self.reactions)}
+        self.tol = tol
+
+        # FBA optimum is fixed via the pfba constraint
+        self.problem = PFBAProblem(cobra_model, objective_coefficients=objective_coefficients,
+                                   direction=direction)
+        # total flux is fixed in addition for pfba solutions
+        self.total_flux = None
+        if pfba:
+            self.total_flux = cobra_model.problem.Constraint(Zero, name=FVA_TOTAL_FLUX_ID,
+                                                             lb=None, ub=None, sloppy=True)
+            cobra_model.add_cons_vars([self.total_flux], sloppy=True)
+            # the constraint is added lazily, coefficients require it in the solver
+            cobra_model.solver.update()
+            self.total_flux.set_linear_coefficients(self.problem.pfba_coefficients)
+        self.step = None
+
+    def set_step(self, step, lb, ub, optimum, total):
+        """ Bounds and optimal values of the time step. """
+        if step == self.step:
+            return
+        forward_lb = np.maximum(lb, 0.0).tolist()
+        forward_ub = np.maximum(ub, 0.0).tolist()
+        reverse_lb = np.maximum(-ub, 0.0).tolist()
+        reverse_ub = np.maximum(-lb, 0.0).tolist()
+        for k, r in enumerate(self.reactions):
+            r.forward_variable.set_bounds(forward_lb[k], forward_ub[k])
+            r.reverse_variable.set_bounds(reverse_lb[k], reverse_ub[k])
+
+        delta = self.tol * (1.0 + abs(optimum))
+        self.problem.fix_optimum(optimum - delta if self.problem.direction == 'max' else optimum + delta)
+        if self.total_flux is not None:
+            self.total_flux.ub = total + self.tol * (1.0 + abs(total))
+        self.step = step
+
+    def fva(self, rids):
+        """ Minimal and maximal flux of the reactions. """
+        solver = self.cobra_model.solver
+        objective = solver.objective
+        objective.set_linear_coefficients(dict.fromkeys(self.problem.pfba_coefficients, 0.0))
+
+        minimum = np.empty(len(rids))
+        maximum = np.empty(len(rids))
+        for k, rid in enumerate(rids):
+            r = self.reactions[self.index[rid]]
+            objective.set_linear_coefficients({r.forward_variable: 1.0, r.reverse_variable: -1.0})
+            for direction, out in (('min', minimum), ('max', maximum)):
+                objective.direction = direction
+                solver.optimize()
+                try:
+                    check_solver_status(solver.status)
+                    out[k] = objective.value
+                except Exception:
+                    logging.warning("FVA of '{}' is {}".format(rid, solver.status))
+                    out[k] = np.nan
+            objective.set_linear_coefficients({r.forward_variable: 0.0, r.reverse_variable: 0.0})
+        return minimum, maximum
+
+
+def _init_worker(model_pickle, objective_coefficients, direction, pfba, tol):
+    global _worker
+    cobra_model = pickle.loads(model_pickle)
+    _worker = _FVAWorker(cobra_model, objective_coefficients, direction, pfba, tol)
+
+
+def _worker_fva(task):
+    step, lb, ub, optimum, total, rids = task
+    _worker.set_step(step, lb, ub, optimum, total)
+    return _worker.fva(rids)
+
+
+class FVAPool(object):
+    """ Pool of worker processes for flux variability analysis.
+
+    FVA is performed on the optimal face of the last solution, i.e. with the
+    FBA objective fixed at its optimum and for pfba in addition with the
+    total flux fixed at its minimum.
+    """
+
+    def __init__(self, cobra_model, processes, objective_coefficients, direction='max', pfba=True,
+                 tol=1E-9):
+        """ Starts the worker processes.
+
+        :param cobra_model: cobra model, copied to every worker
+        :param processes: number of worker processes
+        :param objective_coefficients: numpy array of FBA objective coefficients in
+            order of the model reactions
+        :param direction: direction of the FBA objective
+        :param pfba: solutions are pfba solutions
+        :param tol: relative tolerance of the fixed optimal values
+        """
+        self.reaction_ids = [r.id for r in cobra_model.reactions]
+        self.objective_coefficients = np.asarray(objective_coefficients, dtype=np.float64)
+        self.pfba = pfba
+        self.processes = processes
+        self.step = 0
+
+        coefficients = {rid: c for rid, c in zip(self.reaction_ids, self.objective_coefficients) if c != 0.0}
+        model_pickle = pickle.dumps(cobra_model)
+        self.pool = multiprocessing.Pool(processes=processes, initializer=_init_worker,
+                                         initargs=(model_pickle, coefficients, direction, pfba, tol))
+
+    def fva(self, rids, fluxes, lb, ub):
+        """ Minimal and maximal fluxes of reactions in all optimal solutions.
+
+        :param rids: reaction ids for FVA
+        :param fluxes: optimal fluxes in order of the model reactions
+        :param lb: lower bounds of the model reactions
+        :param ub: upper bounds of the model reactions
+        :return: (minimum, maximum) numpy arrays in order of rids
+        """
+        self.step += 1
+        optimum = self.objective_coefficients.dot(fluxes)
+        total = np.sum(np.abs(fluxes)) if self.pfba else None
+
+        chunks = [chunk.tolist() for chunk in np.array_split(np.array(rids, dtype=object), self.processes)
+                  if len(chunk)]
+        tasks = [(self.step, lb, ub, optimum, total, chunk) for chunk in chunks]
+        results = self.pool.map(_worker_fva, tasks)
+        minimum = np.concatenate([res[0] for res in results])
+        maximum = np.concatenate([res[1] for res in results])
+        return minimum, maximum
+
+    def close(self):
+        """ Stops the worker processes. """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
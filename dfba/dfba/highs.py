@@ -0,0 +1,180 @@
+"""
+Matrix-form LP backend for the FBA part on scipy's HiGHS solver.
+
+The stoichiometric matrix and the objective are extracted once from the
+cobra model. Per time step only the bound vectors change, the LPs are
+solved with scipy.optimize.linprog on arrays without going through the
+cobra and optlang objects.
+Reactions are split in forward and reverse variables as in cobra, so the
+reduced costs have the same meaning as for the cobra LP.
+The backend is not a speedup: linprog sets up the HiGHS model for every LP,
+on the example models it is slower than the warm started glpk LPs (see
+benchmark_lp). The simulator falls back to glpk for the uniqueness checks.
+
+Requires scipy >= 1.7.
+
+Usage:
+    simulator = DFBASimulator(dfba_model, lp_solver='highs')
+"""
+import logging
+
+import numpy as np
+from cobra.util.array import create_stoichiometric_matrix
+from cobra.util.solver import check_solver_status
+from optlang import interface
+
+from sbmlutils.dfba.lp import PFBA_CONSTRAINT_ID, pinned_fluxes
+
+HIGHS_SOLVER_ID = 'highs'
+
+# optlang status of the linprog status codes
+LINPROG_STATUS = {
+    0: interface.OPTIMAL,
+    1: interface.ITERATION_LIMIT,
+    2: interface.INFEASIBLE,
+    3: interface.UNBOUNDED,
+    4: interface.NUMERIC,
+}
+
+
+class HighsLP(object):
+    """ FBA and pFBA of a cobra model as array LPs solved with HiGHS.
+
+    The variables are the split fluxes x = [forward; reverse], v = forward - reverse.
+    FBA optimizes c.v subject to S.v = 0 and the bounds, pFBA minimizes the total
+    flux sum(x) with the FBA optimum as additional constraint.
+    """
+
+    def __init__(self, cobra_model, objective_coefficients, direction='max', pfba=True, tol=1E-9):
+        """ Extracts the LP arrays.
+
+        :param cobra_model: cobra model without constraints besides the steady state
+        :param objective_coefficients: numpy array of FBA objective coefficients in
+            order of the model reactions
+        :param direction: direction of the FBA objective
+        :param pfba: solve the pfba stage
+        :param tol: relative tolerance of the FBA optimum in the pfba stage
+        """
+        from scipy import sparse
+        from scipy.optimize import linprog
+
+        constraints = [c for c in cobra_model.solver.constraints if c.name != PFBA_CONSTRAINT_ID]
+        if len(constraints) != len(cobra_model.metabolites):
+            raise ValueError("The '{}' LP backend supports only steady state constraints, "
+                             "the FBA model has additional constraints.".format(HIGHS_SOLVER_ID))
+
+        self.reaction_ids = [r.id for r in cobra_model.reactions]
+        S = sparse.csr_matrix(create_stoichiometric_matrix(cobra_model, array_type='lil'))
+        self.A_eq = sparse.hstack([S, -S], format='csr')
+        self.b_eq = np.zeros(S.shape[0], dtype=np.float64)
+
+        c = np.asarray(objective_coefficients, dtype=np.float64)
+        self.direction = direction
+        # linprog minimizes
+        self.sign = -1.0 if direction == 'max' else 1.0
+        self.c_fba = self.sign * np.concatenate([c, -c])
+        self.c_pfba = np.ones(2 * len(c), dtype=np.float64)
+        self.A_optimum = sparse.csr_matrix(self.c_fba.reshape(1, -1))
+        self.pfba = pfba
+        self.tol = tol
+
+        self._linprog = linprog
+        self.optimum = None
+        self._bounds = np.empty(shape=(2 * len(c), 2), dtype=np.float64)
+        self._reduced_costs = None  # split variables of the last LP
+        self._fba_marginals = None  # marginals of the steady state constraints of the last FBA
+        self._pfba_marginals = None  # marginals of the steady state and the optimum constraint of the last pFBA
+
+    def _set_bounds(self, lb, ub):
+        """ Bounds of the split variables. """
+        n = len(self.reaction_ids)
+        bounds = self._bounds
+        bounds[:n, 0] = np.maximum(lb, 0.0)
+        bounds[:n, 1] = np.maximum(ub, 0.0)
+        bounds[n:, 0] = np.maximum(-ub, 0.0)
+        bounds[n:, 1] = np.maximum(-lb, 0.0)
+        return bounds
+
+    def _solve(self, c, bounds, A_ub=None, b_ub=None):
+        res = self._linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=self.A_eq, b_eq=self.b_eq,
+                            bounds=bounds, method='highs')
+        # as for the cobra solvers non-optimal solutions only warn, LPs without solution
+        # raise an OptimizationError
+        check_solver_status(LINPROG_STATUS.get(res.status, interface.UNDEFINED), raise_error=res.x is None)
+        self._reduced_costs = res.lower.marginals + res.upper.marginals
+        return res
+
+    def _fluxes(self, x):
+        n = len(self.reaction_ids)
+        return x[:n] - x[n:]
+
+    def solve_fba(self, lb, ub):
+        """ Optimizes the FBA objective.
+
+        :param lb: lower bounds in order of the model reactions
+        :param ub: upper bounds in order of the model reactions
+        :return: fluxes in order of the model reactions
+        """
+        res = self._solve(self.c_fba, self._set_bounds(lb, ub))
+        x = res.x
+        self._fba_marginals = res.eqlin.marginals
+        self.optimum = self.sign * self.c_fba.dot(x)
+        return self._fluxes(x)
+
+    def solve_pfba(self, lb, ub, optimum=None):
+        """ Minimizes the total flux at the FBA optimum.
+
+        :param lb: lower bounds in order of the model reactions
+        :param ub: upper bounds in order of the model reactions
+        :param optimum: FBA optimum, by default the optimum of the last FBA
+        :return: fluxes in order of the model reactions
+        """
+        if optimum is None:
+            optimum = self.optimum
+        b_ub = np.array([self.sign * optimum + self.tol * (1.0 + abs(optimum))])
+        res = self._solve(self.c_pfba, self._set_bounds(lb, ub), A_ub=self.A_optimum, b_ub=b_ub)
+        self._pfba_marginals = (res.eqlin.marginals, res.ineqlin.marginals[0])
+        return self._fluxes(res.x)
+
+    def solve(self, lb, ub):
+        """ Solves FBA and for pfba the pfba stage.
+
+        :param lb: lower bounds in order of the model reactions
+        :param ub: upper bounds in order of the model reactions
+        :return: (FBA fluxes, fluxes)
+        """
+        fba_fluxes = self.solve_fba(lb, ub)
+        if not self.pfba:
+            return fba_fluxes, fba_fluxes
+        fluxes = self.solve_pfba(lb, ub)
+        logging.debug("\tFBA optimum: {}".format(self.optimum))
+        return fba_fluxes, fluxes
+
+    def fba_duals(self):
+        """ Duals of the steady state constraints of the last FBA, see FluxExtractor.fba_duals.
+
+        :return: numpy array in order of the metabolites
+        """
+        return -self._fba_marginals
+
+    def pfba_duals(self):
+        """ Multipliers of the last pFBA, see FluxExtractor.pfba_duals.
+
+        :return: (numpy array in order of the metabolites, mu)
+        """
+        y, marginal = self._pfba_marginals
+        return y, -marginal
+
+    def pinned(self, lb, ub, tol=1E-9):
+        """ Fluxes which are identical in all optimal solutions of the last LP.
+
+        See FluxExtractor.pinned, the reduced costs are the marginals of the
+        variable bounds of the last LP.
+
+        :param lb: lower bounds in order of the model reactions
+        :param ub: upper bounds in order of the model reactions
+        :param tol: tolerance for nonzero reduced costs
+        :return: boolean numpy array in order of the model reactions
+        """
+        n = len(self.reaction_ids)
+        return pinned_fluxes(self._reduced_costs[:n], self._reduced_costs[n:], lb, ub, tol=tol)
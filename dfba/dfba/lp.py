@@ -0,0 +1,688 @@
+"""
+LP helpers for the FBA part of DFBA simulations.
+
+The LP of the FBA submodel is created once and only updated in place
+between the time steps of the simulation.
+"""
+import logging
+from itertools import chain
+from collections import OrderedDict
+
+import numpy as np
+from cobra.util.solver import check_solver_status, interface_to_str
+from optlang.symbolics import Zero
+
+
+PFBA_CONSTRAINT_ID = '_pfba_optimum'
+
+
+class PFBAProblem(object):
+    """ Persistent parsimonious FBA (pFBA) formulation of a cobra model.
+
+    pFBA is solved in two stages on the same LP. First the FBA objective is
+    optimized, then the optimum is fixed via a constraint on the objective
+    expression and the total flux is minimized.
+    Between the stages only the objective coefficients, the objective direction
+    and the bound of the optimum constraint are changed, so the LP is
+    never rebuilt. The cobra model is shared by all simulators of a DFBAModel,
+    restore sets the FBA objective again after a simulation.
+    """
+
+    def __init__(self, cobra_model, objective_coefficients=None, direction=None):
+        """ Adds the pFBA formulation to the cobra model.
+
+        :param cobra_model: cobra model
+        :param objective_coefficients: optional dict {rid: coefficient} of the FBA
+            objective, by default the current objective of the model is used
+        :param direction: optional direction of the FBA objective ('max', 'min')
+        """
+        self.cobra_model = cobra_model
+        objective = cobra_model.solver.objective
+        if direction is None:
+            direction = objective.direction
+        self.direction = direction
+
+        variables = list(chain.from_iterable(
+            (r.forward_variable, r.reverse_variable) for r in cobra_model.reactions))
+
+        # coefficients of the FBA objective
+        if objective_coefficients is None:
+            fba_coefficients = objective.get_linear_coefficients(objective.variables)
+        else:
+            fba_coefficients = {}
+            for rid, coefficient in objective_coefficients.items():
+                reaction = cobra_model.reactions.get_by_id(rid)
+                fba_coefficients[reaction.forward_variable] = coefficient
+                fba_coefficients[reaction.reverse_variable] = -coefficient
+
+        self.fba_coefficients = dict.fromkeys(variables, 0.0)
+        self.fba_coefficients.update(fba_coefficients)
+
+        # coefficients of the total flux (split reactions)
+        self.pfba_coefficients = dict.fromkeys(variables, 1.0)
+
+        # constraint fixing the FBA optimum in the second stage (relaxed in first stage)
+        constraints = cobra_model.solver.constraints
+        if PFBA_CONSTRAINT_ID in constraints:
+            self.constraint = constraints[PFBA_CONSTRAINT_ID]
+        else:
+            self.constraint = cobra_model.problem.Constraint(Zero, name=PFBA_CONSTRAINT_ID,
+                                                             lb=None, ub=None, sloppy=True)
+            cobra_model.add_cons_vars([self.constraint], sloppy=True)
+            # constraints are added lazily, the coefficients require the constraint in the problem
+            cobra_model.solver.update()
+        self.constraint.set_linear_coefficients(fba_coefficients)
+        self.constraint.ub = None
+        self.constraint.lb = None
+
+        self.optimum = None
+
+    def optimize_fba(self):
+        """ First stage: optimize the FBA objective.
+
+        The optimum constraint is relaxed, so the FBA problem is solved
+        on the original flux cone.
+
+        :return: optimal value of the FBA objective
+        """
+        solver = self.cobra_model.solver
+        self.constraint.ub = None
+        self.constraint.lb = None
+
+        objective = solver.objective
+        objective.set_linear_coefficients(self.fba_coefficients)
+        objective.direction = self.direction
+
+        solver.optimize()
+        check_solver_status(solver.status)
+        self.optimum = objective.value
+        return self.optimum
+
+    def optimize_pfba(self, optimum=None):
+        """ Second stage: minimize the total flux at the FBA optimum.
+
+        :param optimum: optimal value of the FBA objective, by default the
+            value of the last first stage optimization.
+        :return: minimal total flux
+        """
+        self.fix_optimum(optimum)
+        solver = self.cobra_model.solver
+        solver.optimize()
+        check_solver_status(solver.status)
+        return solver.objective.value
+
+    def fix_optimum(self, optimum=None):
+        """ Sets up the second stage without solving it.
+
+        Fixes the FBA optimum via the optimum constraint and sets the
+        total flux objective.
+
+        :param optimum: optimal value of the FBA objective, by default the
+            value of the last first stage optimization.
+        """
+        if optimum is None:
+            optimum = self.optimum
+        self.optimum = optimum
+
+        if self.direction == 'max':
+            self.constraint.lb = optimum
+        else:
+            self.constraint.ub = optimum
+
+        objective = self.cobra_model.solver.objective
+        objective.set_linear_coefficients(self.pfba_coefficients)
+        objective.direction = 'min'
+
+    def optimize(self):
+        """ Runs both pFBA stages.
+
+        :return: minimal total flux
+        """
+        self.optimize_fba()
+        logging.debug("\tFBA optimum: {}".format(self.optimum))
+        return self.optimize_pfba()
+
+    def restore(self):
+        """ Restores the FBA objective and relaxes the optimum constraint.
+
+        The solution of the last LP is not changed.
+        """
+        self.constraint.ub = None
+        self.constraint.lb = None
+        objective = self.cobra_model.solver.objective
+        objective.set_linear_coefficients(self.fba_coefficients)
+        objective.direction = self.direction
+
+
+def set_fba_objective(cobra_model, objective_coefficients, direction):
+    """ Sets the FBA objective of the cobra model.
+
+    Removes the total flux objective and relaxes the optimum constraint of a
+    previous pFBA on the model.
+
+    :param cobra_model: cobra model
+    :param objective_coefficients: dict {rid: coefficient} of the FBA objective
+    :param direction: direction of the FBA objective ('max', 'min')
+    """
+    coefficients = {}
+    for reaction in cobra_model.reactions:
+        coefficient = objective_coefficients.get(reaction.id, 0.0)
+        coefficients[reaction.forward_variable] = coefficient
+        coefficients[reaction.reverse_variable] = -coefficient
+    objective = cobra_model.solver.objective
+    objective.set_linear_coefficients(coefficients)
+    objective.direction = direction
+
+    constraints = cobra_model.solver.constraints
+    if PFBA_CONSTRAINT_ID in constraints:
+        constraint = constraints[PFBA_CONSTRAINT_ID]
+        constraint.ub = None
+        constraint.lb = None
+
+
+class VariableBounds(object):
+    """ Bulk update of the bounds of solver variables.
+
+    Setting the bounds via the optlang variables looks up every variable in
+    the solver problem. For glpk the column indices are resolved once and the
+    bounds are set directly on the problem (glpk has no vector bound setter).
+    Other interfaces receive all bounds in a single call of their bound update.
+    The bounds of the optlang variables are kept in sync with the problem.
+    """
+
+    def __init__(self, cobra_model, variables):
+        """ Resolves the variables in the solver problem.
+
+        :param cobra_model: cobra model
+        :param variables: solver variables
+        """
+        self.cobra_model = cobra_model
+        self.variables = list(variables)
+        self.interface = interface_to_str(cobra_model.solver.interface)
+        self._columns = None
+        if self.interface == 'glpk':
+            self._columns = [variable._index for variable in self.variables]
+
+    def set_bounds(self, lower, upper):
+        """ Sets the bounds of all variables.
+
+        :param lower: list of lower bounds in order of the variables
+        :param upper: list of upper bounds in order of the variables
+        """
+        variables = self.variables
+        for variable, lb, ub in zip(variables, lower, upper):
+            variable._lb = lb
+            variable._ub = ub
+
+        solver = self.cobra_model.solver
+        if self._columns is not None:
+            import swiglpk
+            problem = solver.problem
+            for j, lb, ub in zip(self._columns, lower, upper):
+                if lb == ub:
+                    swiglpk.glp_set_col_bnds(problem, j, swiglpk.GLP_FX, lb, ub)
+                elif np.isinf(ub):
+                    swiglpk.glp_set_col_bnds(problem, j, swiglpk.GLP_LO, lb, 0.0)
+                else:
+                    swiglpk.glp_set_col_bnds(problem, j, swiglpk.GLP_DB, lb, ub)
+        else:
+            solver._set_variable_bounds_on_problem(list(zip(variables, lower)), list(zip(variables, upper)))
+
+
+class FluxExtractor(object):
+    """ Fast extraction of the reaction fluxes from the solver primals.
+
+    The reaction order and the positions of the forward and reverse
+    variables in the solver are computed once, the fluxes are then
+    calculated with NumPy from the primal values of the solver.
+    """
+
+    def __init__(self, cobra_model, reactions=None):
+        """ Create the extractor.
+
+        :param cobra_model: cobra model
+        :param reactions: reactions to extract, by default all reactions of the model
+        """
+        self.cobra_model = cobra_model
+        if reactions is None:
+            reactions = cobra_model.reactions
+
+        self.reaction_ids = [r.id for r in reactions]
+        self.index = {rid: k for k, rid in enumerate(self.reaction_ids)}
+
+        names = cobra_model.solver._get_variables_names()
+        variable_index = {name: k for k, name in enumerate(names)}
+        self.forward_index = np.array([variable_index[r.forward_variable.name] for r in reactions],
+                                      dtype=np.intp)
+        self.reverse_index = np.array([variable_index[r.reverse_variable.name] for r in reactions],
+                                      dtype=np.intp)
+        self._rows = None  # rows of the steady state constraints and the pfba optimum constraint
+
+    def _shadow_prices(self):
+        """ Duals of the steady state constraints and of the pfba optimum constraint.
+
+        The rows are looked up on first use, the optimum constraint is added
+        by PFBAProblem after the extractor may have been created.
+        """
+        solver = self.cobra_model.solver
+        check_solver_status(solver.status)
+        if self._rows is None:
+            index = {c.name: k for k, c in enumerate(solver.constraints)}
+            self._rows = (np.array([index[m.id] for m in self.cobra_model.metabolites], dtype=np.intp),
+                          index.get(PFBA_CONSTRAINT_ID))
+        prices = np.asarray(solver._get_shadow_prices(), dtype=np.float64)
+        rows, optimum_row = self._rows
+        return prices[rows], prices[optimum_row] if optimum_row is not None else 0.0
+
+    def fba_duals(self, direction):
+        """ Duals of the steady state constraints of the FBA solution.
+
+        The duals y belong to the FBA objective in max form, i.e. the reduced
+        costs of the reactions are c - S^T y (see FastPath).
+
+        :param direction: direction of the FBA objective, 'max' or 'min'
+        :return: numpy array in order of the metabolites
+        """
+        y, _ = self._shadow_prices()
+        return y if direction == 'max' else -y
+
+    def pfba_duals(self, direction):
+        """ Multipliers of the pfba solution (see PFBAProblem).
+
+        The multipliers (y, mu) belong to the steady state constraints and to
+        the optimum constraint in max form (see FastPath).
+
+        :param direction: direction of the FBA objective, 'max' or 'min'
+        :return: (numpy array in order of the metabolites, mu)
+        """
+        y, mu = self._shadow_prices()
+        return y, mu if direction == 'max' else -mu
+
+    def primals(self):
+        """ Primal values of all solver variables.
+
+        :return: numpy array
+        """
+        solver = self.cobra_model.solver
+        check_solver_status(solver.status)
+        return np.asarray(solver._get_primal_values(), dtype=np.float64)
+
+    def fluxes(self):
+        """ Fluxes of the current solver state.
+
+        :return: numpy array of fluxes in order of reaction_ids
+        """
+        primals = self.primals()
+        return primals[self.forward_index] - primals[self.reverse_index]
+
+    def reduced_costs(self):
+        """ Reduced costs of the forward and reverse variables.
+
+        :return: (forward, reverse) numpy arrays in order of reaction_ids
+        """
+        solver = self.cobra_model.solver
+        check_solver_status(solver.status)
+        reduced_costs = np.asarray(solver._get_reduced_costs(), dtype=np.float64)
+        return reduced_costs[self.forward_index], reduced_costs[self.reverse_index]
+
+    def pinned(self, lb, ub, tol=1E-9):
+        """ Fluxes which are identical in all optimal solutions of the last LP.
+
+        By complementary slackness a variable with nonzero reduced cost is at
+        the same bound in every optimal solution. A reaction flux is pinned if
+        its forward and reverse variable are pinned.
+
+        :param lb: lower bounds of reactions
+        :param ub: upper bounds of reactions
+        :param tol: tolerance for nonzero reduced costs
+        :return: boolean numpy array in order of reaction_ids
+        """
+        rc_forward, rc_reverse = self.reduced_costs()
+        return pinned_fluxes(rc_forward, rc_reverse, lb, ub, tol=tol)
+
+
+def pinned_fluxes(rc_forward, rc_reverse, lb, ub, tol=1E-9):
+    """ Fluxes which are identical in all optimal solutions of a LP with split reactions.
+
+    By complementary slackness a variable with nonzero reduced cost is at
+    the same bound in every optimal solution. A reaction flux is pinned if
+    its forward and reverse variable are pinned, i.e. fixed by their bounds
+    or with nonzero reduced cost.
+
+    :param rc_forward: reduced costs of the forward variables
+    :param rc_reverse: reduced costs of the reverse variables
+    :param lb: lower bounds of reactions
+    :param ub: upper bounds of reactions
+    :param tol: tolerance for nonzero reduced costs
+    :return: boolean numpy array
+    """
+    # bounds of the split variables
+    forward_fixed = np.maximum(ub, 0.0) - np.maximum(lb, 0.0) <= tol
+    reverse_fixed = np.maximum(-lb, 0.0) - np.maximum(-ub, 0.0) <= tol
+    forward = forward_fixed | (np.abs(rc_forward) > tol)
+    reverse = reverse_fixed | (np.abs(rc_reverse) > tol)
+    return forward & reverse
+
+
+def get_glpk_basis(cobra_model):
+    """ Status of the rows and columns in the current glpk basis.
+
+    :param cobra_model: cobra model
+    :return: (row status, column status) or None if the solver is not glpk
+    """
+    solver = cobra_model.solver
+    if interface_to_str(solver.interface) != 'glpk':
+        return None
+    import swiglpk
+    problem = solver.problem
+    rows = [swiglpk.glp_get_row_stat(problem, i)
+            for i in range(1, swiglpk.glp_get_num_rows(problem) + 1)]
+    cols = [swiglpk.glp_get_col_stat(problem, j)
+            for j in range(1, swiglpk.glp_get_num_cols(problem) + 1)]
+    return rows, cols
+
+
+def set_glpk_basis(cobra_model, basis):
+    """ Restores a glpk basis, the next solve is warm started from it.
+
+    :param cobra_model: cobra model
+    :param basis: basis from get_glpk_basis
+    :return: True if the basis was set
+    """
+    if basis is None:
+        return False
+    solver = cobra_model.solver
+    if interface_to_str(solver.interface) != 'glpk':
+        return False
+    import swiglpk
+    problem = solver.problem
+    rows, cols = basis
+    if len(rows) != swiglpk.glp_get_num_rows(problem) or len(cols) != swiglpk.glp_get_num_cols(problem):
+        return False
+    for i, stat in enumerate(rows, 1):
+        swiglpk.glp_set_row_stat(problem, i, stat)
+    for j, stat in enumerate(cols, 1):
+        swiglpk.glp_set_col_stat(problem, j, stat)
+    return True
+
+
+def _pinv(A):
+    """ Pseudo-inverse which handles empty matrices. """
+    if A.size == 0:
+        return np.zeros(shape=(A.shape[1], A.shape[0]), dtype=np.float64)
+    return np.linalg.pinv(A)
+
+
+class _Basis(object):
+    """ Basis of an optimal FBA solution in reaction space.
+
+    Nonbasic fluxes are fixed at their lower bound, upper bound or zero,
+    the basic (free) fluxes are calculated from the cached pseudo-inverse
+    of the basis matrix.
+    """
+
+    def __init__(self, at_lb, at_ub, at_zero, free, pinv, reduced_costs, mu=0.0):
+        self.at_lb = at_lb
+        self.at_ub = at_ub
+        self.at_zero = at_zero
+        self.free = free
+        self.fixed = ~free
+        self.pinv = pinv
+        self.reduced_costs = reduced_costs
+        self.mu = mu
+
+    def fluxes(self, S, lb, ub, c=None, value=None):
+        """ Basic solution for the given bounds.
+
+        :param S: stoichiometric matrix
+        :param lb: lower bounds
+        :param ub: upper bounds
+        :param c: coefficients of additional equality constraint c*v = value
+        :param value: value of additional equality constraint
+        :return: fluxes
+        """
+        v = np.zeros_like(lb)
+        v[self.at_lb] = lb[self.at_lb]
+        v[self.at_ub] = ub[self.at_ub]
+        fixed = self.fixed
+        rhs = -S[:, fixed].dot(v[fixed])
+        if c is not None:
+            rhs = np.append(rhs, value - c[fixed].dot(v[fixed]))
+        v[self.free] = self.pinv.dot(rhs)
+        return v
+
+
+class FastPath(object):
+    """ Fast path for the FBA problem if the optimal basis stays optimal.
+
+    Between the time steps of a DFBA simulation only flux bounds change. The
+    basis of the last optimal LP solution is kept: nonbasic fluxes are fixed at
+    their new bounds and the basic fluxes are solved with the cached factorisation
+    (pseudo-inverse) of the basis matrix, i.e. without simplex iterations.
+
+    The new fluxes are only used if they are primal feasible and optimal.
+    Optimality is certified via weak duality with the dual values of the basis,
+    which do not depend on the bounds. Otherwise the LP has to be solved and
+    the basis is updated from the new solution. The pseudo-inverses depend only
+    on the basic fluxes, they are cached and only computed for new bases.
+
+    The FBA problem is
+        max/min c*v, S*v = 0, lb <= v <= ub
+    and the pFBA problem at the FBA optimum z
+        min sum |v|, S*v = 0, lb <= v <= ub, c*v >= z (max) or c*v <= z (min).
+    """
+
+    def __init__(self, S, c, direction='max', pfba=True, tol=1E-7, cache_size=32):
+        """ Create the fast path.
+
+        :param S: stoichiometric matrix (metabolites x reactions)
+        :param c: objective coefficients of reactions
+        :param direction: direction of the FBA objective
+        :param pfba: pfba problem is solved in a second stage
+        :param tol: tolerance for bounds, feasibility and the duality gap
+        :param cache_size: number of cached pseudo-inverses of basis matrices
+        """
+        self.S = np.asarray(S, dtype=np.float64)
+        # objective in max form
+        self.sense = 1.0 if direction == 'max' else -1.0
+        self.c = self.sense * np.asarray(c, dtype=np.float64)
+        self.pfba = pfba
+        self.tol = tol
+
+        self.fba_basis = None
+        self.pfba_basis = None
+
+        self.cache_size = cache_size
+        self._pinv_cache = OrderedDict()
+        self.n_factorizations = 0  # computed pseudo-inverses
+
+    def reset(self):
+        """ Removes the cached bases. """
+        self.fba_basis = None
+        self.pfba_basis = None
+
+    def update(self, lb, ub, fba_fluxes, pfba_fluxes=None, fba_duals=None, pfba_duals=None):
+        """ Sets the bases from optimal LP solutions.
+
+        The duals of the LP solver certify degenerate bases, for which the
+        duals of the basis are not unique. Without duals (or if they do not
+        match the basis) the minimal norm duals of the basis are used.
+
+        :param lb: lower bounds of reactions
+        :param ub: upper bounds of reactions
+        :param fba_fluxes: optimal fluxes of the FBA problem
+        :param pfba_fluxes: optimal fluxes of the pFBA problem
+        :param fba_duals: optional duals y of the FBA solution, reduced costs c - S^T y
+        :param pfba_duals: optional multipliers (y, mu) of the pFBA solution
+        """
+        self.fba_basis = self._fba_basis(lb, ub, fba_fluxes, duals=fba_duals)
+        if self.pfba and pfba_fluxes is not None:
+            self.pfba_basis = self._pfba_basis(lb, ub, pfba_fluxes, duals=pfba_duals)
+        else:
+            self.pfba_basis = None
+
+    def pinned(self, lb, ub):
+        """ Fluxes which are identical in all optimal solutions.
+
+        Uses the certificate of the last successful fast path solution. Every
+        optimal solution maximizes each term d_j*v_j (FBA), respectively minimizes
+        each term |v_j| - g_j*v_j (pFBA), over the flux bounds. The flux is pinned
+        if the term has a unique optimum.
+
+        :param lb: lower bounds of reactions
+        :param ub: upper bounds of reactions
+        :return: boolean numpy array
+        """
+        fixed = ub - lb <= self.tol
+        if self.pfba:
+            g = self.pfba_basis.reduced_costs
+            # flat pieces of |t| - g*t for t > 0 and t < 0 within the bounds
+            flat_positive = (np.abs(1.0 - g) <= self.tol) & (ub > np.maximum(lb, 0.0) + self.tol)
+            flat_negative = (np.abs(1.0 + g) <= self.tol) & (lb < np.minimum(ub, 0.0) - self.tol)
+            return fixed | ~(flat_positive | flat_negative)
+        d = self.fba_basis.reduced_costs
+        return fixed | (np.abs(d) > self.tol)
+
+    def _basis_pinv(self, stage, free, A):
+        """ Pseudo-inverse of the basis matrix, cached by the stage and the basic fluxes.
+
+        :param stage: 'fba' or 'pfba'
+        :param free: boolean numpy array of basic fluxes
+        :param A: basis matrix
+        :return: pseudo-inverse of A
+        """
+        key = (stage, np.packbits(free).tobytes())
+        pinv = self._pinv_cache.pop(key, None)
+        if pinv is None:
+            pinv = _pinv(A)
+            self.n_factorizations += 1
+        self._pinv_cache[key] = pinv
+        if len(self._pinv_cache) > self.cache_size:
+            self._pinv_cache.popitem(last=False)
+        return pinv
+
+    def _active(self, lb, ub, v):
+        """ Fluxes at lower bound, upper bound and zero. """
+        at_lb = np.abs(v - lb) <= self.tol
+        at_ub = ~at_lb & (np.abs(v - ub) <= self.tol)
+        at_zero = ~(at_lb | at_ub) & (np.abs(v) <= self.tol)
+        return at_lb, at_ub, at_zero
+
+    def _fba_basis(self, lb, ub, v, duals=None):
+        """ Basis and reduced costs of the FBA solution.
+
+        The duals y solve S_B^T y = c_B on the basic fluxes, the reduced costs
+        are d = c - S^T y.
+        """
+        at_lb, at_ub, _ = self._active(lb, ub, v)
+        free = ~(at_lb | at_ub)
+        at_zero = np.zeros_like(free)
+
+        pinv = self._basis_pinv('fba', free, self.S[:, free])
+        if duals is not None:
+            reduced_costs = self.c - self.S.T.dot(duals)
+            if not np.any(np.abs(reduced_costs[free]) > self.tol):
+                return _Basis(at_lb, at_ub, at_zero, free, pinv, reduced_costs)
+
+        y = pinv.T.dot(self.c[free])
+        reduced_costs = self.c - self.S.T.dot(y)
+        if np.any(np.abs(reduced_costs[free]) > self.tol):
+            # no consistent duals for the basis
+            return None
+        return _Basis(at_lb, at_ub, at_zero, free, pinv, reduced_costs)
+
+    def _pfba_basis(self, lb, ub, v, duals=None):
+        """ Basis and multipliers of the pFBA solution.
+
+        The multipliers (y, mu) of S*v = 0 and the optimum constraint solve
+        S_B^T y + mu*c_B = sign(v_B) on the basic fluxes.
+        """
+        at_lb, at_ub, at_zero = self._active(lb, ub, v)
+        free = ~(at_lb | at_ub | at_zero)
+
+        A = np.vstack([self.S[:, free], self.c[free]])
+        pinv = self._basis_pinv('pfba', free, A)
+        sign = np.sign(v[free])
+        if duals is not None:
+            y, mu = duals
+            g = self.S.T.dot(y) + mu * self.c
+            if mu >= -self.tol and not np.any(np.abs(g[free] - sign) > self.tol):
+                return _Basis(at_lb, at_ub, at_zero, free, pinv, g, mu=max(mu, 0.0))
+
+        w = pinv.T.dot(sign)
+        if np.any(np.abs(A.T.dot(w) - sign) > self.tol):
+            return None
+        y, mu = w[:-1], w[-1]
+        if mu < -self.tol:
+            return None
+        mu = max(mu, 0.0)
+        g = self.S.T.dot(y) + mu * self.c
+        return _Basis(at_lb, at_ub, at_zero, free, pinv, g, mu=mu)
+
+    def _feasible(self, v, lb, ub):
+        """ Checks bounds and steady state of fluxes. """
+        scale = 1.0 + np.max(np.abs(v)) if len(v) else 1.0
+        if np.any(v < lb - self.tol * scale) or np.any(v > ub + self.tol * scale):
+            return False
+        return not np.any(np.abs(self.S.dot(v)) > self.tol * scale)
+
+    def solve_fba(self, lb, ub):
+        """ FBA solution from the cached basis.
+
+        :param lb: lower bounds of reactions
+        :param ub: upper bounds of reactions
+        :return: (fluxes, optimum) or None if the basis is not optimal
+        """
+        basis = self.fba_basis
+        if basis is None:
+            return None
+        v = basis.fluxes(self.S, lb, ub)
+        if not self._feasible(v, lb, ub):
+            return None
+
+        # weak duality: c*v = d*v <= sum max(d*lb, d*ub) for all feasible v
+        d = basis.reduced_costs
+        with np.errstate(invalid='ignore'):
+            bound = np.where(d > 0, d * ub, np.where(d < 0, d * lb, 0.0))
+        value = self.c.dot(v)
+        gap = np.sum(bound) - value
+        if not np.isfinite(gap) or gap > self.tol * (1.0 + abs(value)):
+            return None
+        return v, self.sense * value
+
+    def solve_pfba(self, lb, ub, optimum):
+        """ pFBA solution from the cached basis.
+
+        :param lb: lower bounds of reactions
+        :param ub: upper bounds of reactions
+        :param optimum: optimal value of the FBA objective
+        :return: fluxes or None if the basis is not optimal
+        """
+        basis = self.pfba_basis
+        if basis is None:
+            return None
+        z = self.sense * optimum
+        v = basis.fluxes(self.S, lb, ub, c=self.c, value=z)
+        if not self._feasible(v, lb, ub):
+            return None
+        if self.c.dot(v) < z - self.tol * (1.0 + abs(z)):
+            return None
+
+        # weak duality with the Lagrangian of the multipliers (y, mu):
+        #   sum |v| >= mu*z + sum_j min_{lb_j <= t <= ub_j} (|t| - g_j*t)
+        # the convex terms are minimal at the bounds or at zero
+        g = basis.reduced_costs
+        with np.errstate(invalid='ignore', over='ignore'):
+            f_lb = np.where(lb < 0, -lb * (1.0 + g), lb * (1.0 - g))
+            f_ub = np.where(ub < 0, -ub * (1.0 + g), ub * (1.0 - g))
+        f_lb[np.isnan(f_lb)] = 0.0
+        f_ub[np.isnan(f_ub)] = 0.0
+        terms = np.minimum(f_lb, f_ub)
+        terms[(lb <= 0) & (ub >= 0)] = np.minimum(terms[(lb <= 0) & (ub >= 0)], 0.0)
+        bound = basis.mu * z + np.sum(terms)
+
+        value = np.sum(np.abs(v))
+        gap = value - bound
+        if not np.isfinite(gap) or gap > self.tol * (1.0 + value):
+            return None
+        return v
@@ -0,0 +1,83 @@
+"""
+Memo of FBA solutions for DFBA simulations.
+
+Many steps of a simulation see the same bound vector, e.g. bounds clamped
+to zero after the depletion of a substrate or saturated at their default
+values. The solutions are stored in a size-bounded LRU cache keyed by the
+quantized bound vector, a hit skips the LP.
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FluxMemo(object):
+    """ LRU cache of FBA solutions keyed by the quantized bounds. """
+
+    def __init__(self, max_size=1000, tol=1E-9):
+        """ Create the memo.
+
+        :param max_size: maximal number of stored solutions
+        :param tol: quantization of the bounds, bound vectors which agree
+            after rounding to multiples of tol share the solution
+        """
+        self.max_size = max_size
+        self.tol = tol
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    def key(self, lower_bounds, upper_bounds):
+        """ Key of the quantized bounds.
+
+        :param lower_bounds: numpy array of lower bounds
+        :param upper_bounds: numpy array of upper bounds
+        :return: bytes
+        """
+        bounds = np.concatenate([lower_bounds, upper_bounds])
+        # + 0.0 maps -0.0 to 0.0, infinite bounds are kept
+        return (np.round(bounds / self.tol) + 0.0).tobytes()
+
+    def get(self, key):
+        """ Stored solution of the key, the hit rate is updated.
+
+        :param key: key of the bounds
+        :return: stored solution or None
+        """
+        value = self._cache.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self._cache[key] = value
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Stores a solution, the least recently used solution is evicted if the memo is full.
+
+        :param key: key of the bounds
+        :param value: solution
+        """
+        self._cache.pop(key, None)
+        self._cache[key] = value
+        if len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        """ Fraction of lookups which were hits. """
+        n = self.hits + self.misses
+        return 1.0 * self.hits / n if n > 0 else 0.0
+
+    def reset_stats(self):
+        """ Resets the hit counters, the solutions are kept. """
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        """ Removes all solutions. """
+        self._cache.clear()
+        self.reset_stats()
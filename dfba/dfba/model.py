@@ -4,14 +4,15 @@ DFBA model structure.
 import os
 import logging
 import warnings
-import tempfile
 from collections import defaultdict
 
 import libsbml
 import roadrunner
 import cobra
+from cobra.util.solver import linear_reaction_coefficients
 
 from sbmlutils.dfba import builder
+from sbmlutils.dfba.cache import ModelCache, FBA_ATTRIBUTES
 
 
 #################################################
@@ -22,47 +23,50 @@ class DFBAModel(object):
      The representation is used in the validation and also for simulation.
      """
 
-    def __init__(self, sbml_path):
+    def __init__(self, sbml_path, cache=None):
         """ Create the simulator with the top level SBML file.
 
         The models are resolved to their respective simulation framework.
         The top level network must be an ode network.
 
         :param sbml_path: path to top level SBML file
+        :param cache: ModelCache for the compiled models, True for the default cache
         """
 
-        # necessary to change the working directory to the sbml file directory
-        # to resolve relative links to external model definitions.
-        working_dir = os.getcwd()
+        # relative links to external model definitions are resolved against the
+        # directory of the top level file, the working directory is not changed.
         sbml_path = os.path.abspath(sbml_path)
-        try:
-            sbml_dir = os.path.dirname(sbml_path)
-            os.chdir(sbml_dir)
-
-            self.sbml_top = sbml_path
-            self.sbml_dir = os.path.dirname(sbml_path)
-
-            # read top level model
-            self.doc_top = None
-            self.model_top = None
-            self.framework_top = None
-            self.submodels = defaultdict(list)
-            self.rr_comp = None
-            self.fba_models = []
-            self.flux_rules = {}
-            self.dt = None
-
-            self._process_top()
-            self._process_models()
-            self._process_dt()
-
-            # log model information
-            logging.info(self)
+        self.sbml_top = sbml_path
+        self.sbml_dir = os.path.dirname(sbml_path)
+
+        # read top level model
+        self.doc_top = None
+        self.model_top = None
+        self.framework_top = None
+        self.submodels = defaultdict(list)
+        self.rr_comp = None
+        self.fba_models = []
+        self.flux_rules = {}
+        self.dt = None
+
+        # compiled models from cache
+        if cache is True:
+            cache = ModelCache()
+        self._process_top()
+
+        cache_key, cached = None, None
+        if cache:
+            cache_key = cache.key(sbml_path, doc=self.doc_top)
+            cached = cache.load(cache_key)
+
+        self._process_models(cached=cached)
+        self._process_dt()
 
-        finally:
-            # change back the working dir
-            os.chdir(working_dir)
+        if cache and cached is None:
+            cache.store(cache_key, self)
 
+        # log model information
+        logging.info(self)
 
     @property
     def fba_model(self):
@@ -151,7 +155,7 @@ class DFBAModel(object):
             # store the submodel under the given framework
             self.submodels[framework].append(submodel)
 
-    def _process_models(self):
+    def _process_models(self, cached=None):
         """ Process and prepare models for simulation.
 
         Resolves the replacements and model couplings between the
@@ -160,6 +164,8 @@ class DFBAModel(object):
 
         An important step is finding the fba rules in the top model.
 
+        :param cached: cached artifacts from ModelCache.load, the compilation of
+            the roadrunner model and the reading of the cobra models are skipped
         :return:
         :rtype:
         """
@@ -168,7 +174,10 @@ class DFBAModel(object):
         # FBA rules
         ###########################
         # process FBA assignment rules of the top model
-        self.flux_rules = DFBAModel._process_flux_rules(self.model_top)
+        if cached is not None:
+            self.flux_rules = cached['flux_rules']
+        else:
+            self.flux_rules = DFBAModel._process_flux_rules(self.model_top)
 
         ###########################
         # ODE model
@@ -184,33 +193,56 @@ class DFBAModel(object):
         for variable in self.flux_rules.values():
             self.model_top.removeRuleByVariable(variable)
 
-        mixed_sbml_cleaned = tempfile.NamedTemporaryFile("w", suffix=".xml")
-        libsbml.writeSBMLToFile(self.doc_top, mixed_sbml_cleaned.name)
-        self.rr_comp = roadrunner.RoadRunner(mixed_sbml_cleaned.name)
+        if cached is not None:
+            self.rr_comp = roadrunner.RoadRunner()
+            self.rr_comp.loadState(cached['rr_state'])
+        else:
+            # flattened model is passed as string, no temporary file
+            self.rr_comp = roadrunner.RoadRunner(self._flattened_sbml())
 
         ###########################
         # prepare FBA models
         ###########################
         # FBA models are found based on the FBA modeling framework
         mdoc = self.doc_top.getPlugin("comp")
-        for submodel in self.submodels[builder.MODEL_FRAMEWORK_FBA]:
+        for k, submodel in enumerate(self.submodels[builder.MODEL_FRAMEWORK_FBA]):
             mref = submodel.getModelRef()
             emd = mdoc.getExternalModelDefinition(mref)
             source = emd.getSource()
-            # check if relative path
+            # relative paths are resolved against the directory of the top model
+            if not os.path.isabs(source):
+                source = os.path.join(self.sbml_dir, source)
             if not os.path.exists(source):
-                s2 = os.path.join(self.sbml_dir, source)
-                if not os.path.exists(s2):
-                    warnings.warn('FBA source cannot be resolved:' + source)
-                else:
-                    source = s2
+                warnings.warn('FBA source cannot be resolved:' + source)
 
             # Create FBA model and process
             fba_model = FBAModel(submodel=submodel,
                                  source=source,
-                                 model_top=self.model_top)
+                                 model_top=self.model_top,
+                                 cached=cached['fba_models'][k] if cached is not None else None)
             self.fba_models.append(fba_model)
 
+    def _flattened_sbml(self):
+        """ SBML string of the flattened comp model.
+
+        The top document is flattened in memory, external model definitions
+        are resolved against the directory of the top model.
+
+        :return: SBML string
+        """
+        doc = self.doc_top.clone()
+        doc.setLocationURI('file:' + self.sbml_top)
+
+        props = libsbml.ConversionProperties()
+        props.addOption("flatten comp", True)
+        props.addOption("basePath", self.sbml_dir)
+        props.addOption("performValidation", False)
+        status = doc.convert(props)
+        if status != libsbml.LIBSBML_OPERATION_SUCCESS:
+            raise ValueError("Flattening of comp model failed: {}".format(
+                doc.getErrorLog().toString()))
+        return libsbml.writeSBMLToString(doc)
+
     def _process_dt(self):
         """ Read the dt parameter for the DFBA.
 
@@ -280,7 +312,7 @@ class FBAModel(object):
     Handles setting of FBA bounds & optimization.
     """
 
-    def __init__(self, submodel, source, model_top=None):
+    def __init__(self, submodel, source, model_top=None, cached=None):
         """ Creates the FBAModel.
         Processes the bounds for all reactions.
         Reads the sbml and cobra model.
@@ -288,15 +320,25 @@ class FBAModel(object):
 
         :param submodel:
         :param source:
-        :param flux_rules:
+        :param model_top: top SBML model
+        :param cached: cached cobra model and mappings from ModelCache.load
         """
         self.source = source
         self.submodel = submodel
 
-        # read sbml and cobra model
-        self.doc = libsbml.readSBMLFromFile(source)
-        self.model = self.doc.getModel()
-        self.cobra_model = cobra.io.read_sbml_model(source)
+        # read sbml and cobra model, the SBML file is parsed once and not at all
+        # for cached models (the mappings are cached)
+        self.doc = None
+        self.model = None
+        if cached is not None:
+            self.cobra_model = cached['cobra_model']
+        else:
+            self.doc = libsbml.readSBMLFromFile(source)
+            self.model = self.doc.getModel()
+            self.cobra_model = FBAModel._read_cobra_model(self.doc)
+
+        # FBA objective of the model, simulators change the solver objective (pfba)
+        self.objective_coefficients = {r.id: c for r, c in linear_reaction_coefficients(self.cobra_model).items()}
 
         # bounds are mappings from parameters to reactions
         #       parameter_id -> [rid1, rid2, ...]
@@ -309,18 +351,36 @@ class FBAModel(object):
         self.top2flat_reactions = None
 
         # objective sense
-        self._process_objective_direction()
+        self.objective_direction = None
 
         # bounds
         self.ub_pid2rid = None
         self.lb_pid2rid = None
 
+        if cached is not None:
+            for name in FBA_ATTRIBUTES:
+                setattr(self, name, cached[name])
+            return
+
+        self._process_objective_direction()
+
         # process the top (ode) <-> fba connections (bounds & reaction replacements)
         if model_top is not None:
             self._process_bound_replacements(model_top)
             self._process_fba2top_reactions(model_top)
             self._process_top2flat_reactions(model_top)
 
+    @staticmethod
+    def _read_cobra_model(doc):
+        """ Creates the cobra model from the parsed SBML document.
+
+        The document is passed as SBML string, so the file is not read again.
+
+        :param doc: SBMLDocument of the FBA model
+        :return: cobra model
+        """
+        return cobra.io.read_sbml_model(libsbml.writeSBMLToString(doc))
+
     def __str__(self):
         """ Information string. """
 
@@ -330,7 +390,7 @@ class FBAModel(object):
         s += "\t{:<22}: {}\n".format('cobra obj. direction', self.cobra_model.objective.direction)
         s += "\t{:<22}: {}\n".format('fba2top reactions', self.fba2top_reactions)
 
-        # s += "\t{:<22}: {}\n".format('fba2top bounds', self.fba2top_bounds)
+        s += "\t{:<22}: {}\n".format('fba2top bounds', self.fba2top_bounds)
         s += "\t{:<22}: {}\n".format('ub_pid2rid', self.ub_pid2rid)
         s += "\t{:<22}: {}\n".format('lb_pid2rid', self.lb_pid2rid)
 
@@ -338,6 +398,11 @@ class FBAModel(object):
 
         return s
 
+    @property
+    def cobra_objective_direction(self):
+        """ Direction of the FBA objective in cobra notation ('max', 'min'). """
+        return 'min' if self.objective_direction == 'minimize' else 'max'
+
     def _process_objective_direction(self):
         """ Read the objective sense from the fba model objective.
 
@@ -414,6 +479,8 @@ class FBAModel(object):
 
         self.ub_pid2rid = ub_pid2rid
         self.lb_pid2rid = lb_pid2rid
+        # bound parameters are read from the ode results via the top parameters
+        self.fba2top_bounds = {fba_pid: top_pid for top_pid, fba_pid in top_pid2fba_pid.items()}
 
     def _process_fba2top_reactions(self, model_top):
         """ Finds mapping between top reactions and fba reactions.
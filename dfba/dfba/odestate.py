@@ -0,0 +1,83 @@
+"""
+State vector of the roadrunner ODE model.
+
+The state vector consists of the values of the rate rule variables followed
+by the amounts of the floating species (the order of roadrunner). It is read
+and written via the floating species amounts and the ids of the rate rule
+variables, so only the basic ExecutableModel API is required.
+"""
+import numpy as np
+
+
+class StateVector(object):
+    """ Reads and writes the state vector of the model of a RoadRunner instance. """
+
+    def __init__(self, rr):
+        """ Create the state vector.
+
+        :param rr: RoadRunner instance, the model is looked up on every access
+            because loading a state replaces the model
+        """
+        self.rr = rr
+        model = rr.model
+        self.rule_ids = [model.getStateVectorId(k) for k in range(model.getNumRateRules())]
+        self.species_ids = list(model.getFloatingSpeciesIds())
+        # rates of change are selected with the "'" suffix, species rates are amount rates
+        self.rate_ids = ["{}'".format(sid) for sid in self.rule_ids + self.species_ids]
+
+    def __len__(self):
+        return len(self.rule_ids) + len(self.species_ids)
+
+    def get(self):
+        """ Current state vector.
+
+        :return: numpy array
+        """
+        model = self.rr.model
+        values = [model.getValue(sid) for sid in self.rule_ids]
+        return np.concatenate([np.array(values, dtype=np.float64),
+                               np.array(model.getFloatingSpeciesAmounts(), dtype=np.float64)])
+
+    def set(self, y):
+        """ Sets the state vector.
+
+        The integrator must be reinitialized before the next step.
+
+        :param y: state vector
+        """
+        model = self.rr.model
+        n = len(self.rule_ids)
+        for sid, value in zip(self.rule_ids, y[:n]):
+            model.setValue(sid, float(value))
+        if len(self.species_ids):
+            model.setFloatingSpeciesAmounts(np.array(y[n:], dtype=np.float64))
+
+    def save(self):
+        """ Current time and state vector.
+
+        :return: (time, state vector)
+        """
+        return self.rr.model.getTime(), self.get()
+
+    def restore(self, state):
+        """ Restores the time and state vector, see save.
+
+        :param state: (time, state vector)
+        """
+        time, y = state
+        self.rr.model.setTime(time)
+        self.set(y)
+
+    def rate(self, t, y):
+        """ Rate of change of the state vector for the time and state.
+
+        The model is set to the time and the state.
+
+        :param t: time
+        :param y: state vector
+        :return: numpy array
+        """
+        model = self.rr.model
+        model.setTime(t)
+        self.set(y)
+        return np.array([model.getValue(sid) for sid in self.rate_ids], dtype=np.float64)
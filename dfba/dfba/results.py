@@ -0,0 +1,390 @@
+"""
+Result containers for DFBA simulations.
+"""
+import numpy as np
+import pandas as pd
+
+# columns of the FVA results
+FVA_COLUMNS = ['minimum', 'maximum', 'flux']
+
+
+class DFBAResult(object):
+    """ Result of a DFBA simulation.
+
+    The values are stored in a NumPy array with one row per time point and one
+    column per timecourse selection. The DataFrame is only created on demand.
+    """
+
+    def __init__(self, data, columns, time=None, fva=None, reaction_ids=None, lp_solved=None, sink=None,
+                 offset=0):
+        """ Create the result.
+
+        :param data: 2D numpy array (points x columns)
+        :param columns: column names, i.e. the timecourse selections
+        :param time: time points of the rows
+        :param fva: 3D numpy array (points x reactions x FVA_COLUMNS) of the
+            flux variability analysis
+        :param reaction_ids: reaction ids of the FVA results
+        :param lp_solved: boolean numpy array, the LP was solved for the time point
+            (False if the fluxes were reused, memoized or from the fast path)
+        :param sink: ResultSink with all rows of the simulation
+        :param offset: number of rows in the sink before the first row of data
+        """
+        self.data = data
+        self.columns = list(columns)
+        self.time = time
+        self.fva = fva
+        self.reaction_ids = reaction_ids
+        self.lp_solved = lp_solved
+        self.sink = sink
+        self.offset = offset
+        self.error = None  # error which stopped the simulation, the result is partial
+        self._df = None
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def complete(self):
+        """ The simulation reached the end time. """
+        return self.error is None
+
+    def to_dataframe(self):
+        """ DataFrame representation of the result.
+
+        The DataFrame is created once and shares the memory with the result array
+        when possible.
+
+        :return: pandas DataFrame
+        """
+        if self._df is None:
+            df = pd.DataFrame(data=self.data, columns=self.columns, index=self.time, copy=False)
+            if self.time is not None and 'time' in df.columns:
+                df['time'] = self.time
+            self._df = df
+        return self._df
+
+    def read_sink(self):
+        """ DataFrame of all rows of the simulation from the sink.
+
+        :return: pandas DataFrame or None without sink
+        """
+        if self.sink is None:
+            return None
+        return self.sink.read()
+
+    def fva_dataframe(self, k):
+        """ DataFrame of the flux variability analysis at time point k.
+
+        :param k: index of time point
+        :return: pandas DataFrame with columns FVA_COLUMNS
+        """
+        if self.fva is None:
+            return None
+        return pd.DataFrame(data=self.fva[k], index=self.reaction_ids, columns=FVA_COLUMNS)
+
+    def variability(self):
+        """ Flux ranges (maximum - minimum) of the FVA.
+
+        :return: 2D numpy array (points x reactions)
+        """
+        if self.fva is None:
+            return None
+        return self.fva[:, :, 1] - self.fva[:, :, 0]
+
+    def unique(self, tol=1E-6):
+        """ Uniqueness of the FBA solutions of the time points.
+
+        The solution is unique if the mean flux range of the reactions is below tol.
+
+        :param tol: tolerance
+        :return: boolean numpy array
+        """
+        if self.fva is None:
+            return None
+        return np.mean(self.variability(), axis=1) < tol
+
+
+class ResultBuffer(object):
+    """ Preallocated buffer for the rows of a running DFBA simulation.
+
+    The buffer is allocated for the expected number of time points and
+    grows only if more rows are written, e.g. for adaptive step sizes.
+
+    With a sink the rows are streamed to the sink every flush_interval rows
+    and only the rows which are not yet flushed are kept in memory.
+    """
+
+    def __init__(self, columns, capacity, reaction_ids=None, fva_path=None, sink=None, flush_interval=1000):
+        """ Create the buffer.
+
+        :param columns: column names, i.e. the timecourse selections
+        :param capacity: initial number of rows
+        :param reaction_ids: reaction ids for storing FVA results, no FVA results
+            are stored if None
+        :param fva_path: optional file for a memory-mapped FVA array, for long
+            simulations with large models
+        :param sink: optional ResultSink for streaming the rows
+        :param flush_interval: number of rows after which the rows are written to the sink
+        """
+        self.columns = list(columns)
+        capacity = max(int(capacity), 1)
+        self.sink = sink
+        self.flush_interval = max(int(flush_interval), 1)
+        rows = min(capacity, self.flush_interval) if sink is not None else capacity
+        self.data = np.empty(shape=(rows, len(self.columns)), dtype=np.float64)
+        self.time = np.empty(shape=(capacity,), dtype=np.float64)
+        self.lp_solved = np.zeros(shape=(capacity,), dtype=bool)
+        self.reaction_ids = reaction_ids
+        self.fva_path = fva_path
+        self.fva = None
+        if reaction_ids is not None:
+            self.fva = self._allocate_fva(capacity)
+        self.n = 0  # number of stored rows
+        self.offset = 0  # number of rows flushed to the sink
+        if sink is not None:
+            sink.open(self.columns)
+
+    def _allocate_fva(self, capacity, extend=False):
+        """ Allocates the FVA array, the memory-mapped file is resized.
+
+        :param capacity: number of rows
+        :param extend: extend the existing memory-mapped file
+        """
+        shape = (capacity, len(self.reaction_ids), len(FVA_COLUMNS))
+        if self.fva_path is None:
+            return np.full(shape=shape, fill_value=np.nan, dtype=np.float64)
+
+        nbytes = int(np.prod(shape)) * np.dtype(np.float64).itemsize
+        mode = 'r+b' if extend else 'w+b'
+        with open(self.fva_path, mode) as f:
+            f.truncate(nbytes)
+        fva = np.memmap(self.fva_path, dtype=np.float64, mode='r+', shape=shape)
+        if not extend:
+            fva[:] = np.nan
+        return fva
+
+    def _grow(self, k):
+        """ Grows the buffer to hold row k. """
+        i = k - self.offset
+        if i >= self.data.shape[0]:
+            data = np.empty(shape=(max(2 * self.data.shape[0], i + 1), len(self.columns)), dtype=np.float64)
+            data[:self.n - self.offset] = self.data[:self.n - self.offset]
+            self.data = data
+
+        capacity = self.time.shape[0]
+        if k < capacity:
+            return
+        capacity = max(2 * capacity, k + 1)
+        time = np.empty(shape=(capacity,), dtype=np.float64)
+        time[:self.n] = self.time[:self.n]
+        self.time = time
+        lp_solved = np.zeros(shape=(capacity,), dtype=bool)
+        lp_solved[:self.n] = self.lp_solved[:self.n]
+        self.lp_solved = lp_solved
+
+        if self.fva is not None:
+            if self.fva_path is None:
+                fva = self._allocate_fva(capacity)
+                fva[:self.n] = self.fva[:self.n]
+            else:
+                # file is extended in place, the stored rows are kept
+                self.fva.flush()
+                self.fva = None
+                fva = self._allocate_fva(capacity, extend=True)
+                fva[self.n:] = np.nan
+            self.fva = fva
+
+    def row(self, k):
+        """ Row k of the buffer, the buffer is grown if necessary.
+
+        :param k: row index
+        :return: view on the row
+        """
+        self._grow(k)
+        return self.data[k - self.offset, :]
+
+    def fva_row(self, k):
+        """ FVA results of row k, the buffer is grown if necessary.
+
+        :param k: row index
+        :return: view (reactions x FVA_COLUMNS)
+        """
+        self._grow(k)
+        return self.fva[k]
+
+    def advance(self):
+        """ Completes the current row, rows are flushed to the sink every flush_interval rows. """
+        self.n += 1
+        if self.sink is not None and self.n - self.offset >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """ Writes the completed rows to the sink. """
+        if self.sink is not None and self.n > self.offset:
+            self.sink.write(self.data[:self.n - self.offset])
+            self.offset = self.n
+
+    def close(self):
+        """ Flushes the remaining rows and closes the sink.
+
+        Results are created before closing, flushing removes the rows from the buffer.
+        """
+        if self.sink is not None:
+            self.flush()
+            self.sink.close()
+
+    def result(self):
+        """ Result of the stored rows.
+
+        With a sink the data contains only the rows which are not flushed,
+        the complete data is read from the sink (DFBAResult.read_sink).
+
+        :return: DFBAResult
+        """
+        fva = None
+        if self.fva is not None:
+            fva = self.fva[self.offset:self.n]
+            if isinstance(self.fva, np.memmap):
+                self.fva.flush()
+        time = self.time[self.offset:self.n]
+        return DFBAResult(data=self.data[:self.n - self.offset], columns=self.columns, time=time,
+                          fva=fva, reaction_ids=self.reaction_ids,
+                          lp_solved=self.lp_solved[self.offset:self.n], sink=self.sink, offset=self.offset)
+
+
+class BatchResult(object):
+    """ Stacked results of batch simulations.
+
+    The values are stored in a 3D NumPy array (scenarios x time points x columns).
+    Scenarios with fewer time points (e.g. adaptive steps) or failed scenarios
+    are padded with NaN, the number of stored time points is in lengths.
+    Scenarios which stopped with an error keep the time points until the
+    error, they are marked as failed.
+    """
+
+    def __init__(self, data, columns, time, lengths, conditions=None, complete=None):
+        """ Create the result.
+
+        :param data: 3D numpy array (scenarios x points x columns)
+        :param columns: column names, i.e. the timecourse selections
+        :param time: 2D numpy array of time points (scenarios x points)
+        :param lengths: number of time points of the scenarios
+        :param conditions: pandas DataFrame of the scenarios
+        :param complete: boolean numpy array, the scenario reached the end time,
+            by default all scenarios with time points
+        """
+        self.data = data
+        self.columns = list(columns)
+        self.time = time
+        self.lengths = lengths
+        self.conditions = conditions
+        if complete is None:
+            complete = lengths > 0
+        self.complete = complete
+
+    @classmethod
+    def from_results(cls, results, conditions=None):
+        """ Stacks the results of the scenarios.
+
+        :param results: list of (data, time, columns, complete) per scenario, None for
+            scenarios without result
+        :param conditions: pandas DataFrame of the scenarios
+        :return: BatchResult
+        """
+        columns = []
+        points = 0
+        for res in results:
+            if res is not None:
+                columns = res[2]
+                points = max(points, res[0].shape[0])
+
+        data = np.full(shape=(len(results), points, len(columns)), fill_value=np.nan, dtype=np.float64)
+        time = np.full(shape=(len(results), points), fill_value=np.nan, dtype=np.float64)
+        lengths = np.zeros(shape=(len(results),), dtype=np.intp)
+        complete = np.zeros(shape=(len(results),), dtype=bool)
+        for k, res in enumerate(results):
+            if res is not None:
+                n = res[0].shape[0]
+                data[k, :n] = res[0]
+                time[k, :n] = res[1]
+                lengths[k] = n
+                complete[k] = res[3]
+        return cls(data=data, columns=columns, time=time, lengths=lengths, conditions=conditions,
+                   complete=complete)
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    @property
+    def shape(self):
+        return self.data.shape
+
+    @property
+    def failed(self):
+        """ Boolean numpy array of failed scenarios, including partial results. """
+        return ~self.complete
+
+    def scenario(self, k):
+        """ Result of scenario k.
+
+        :param k: index of scenario
+        :return: DFBAResult
+        """
+        n = self.lengths[k]
+        return DFBAResult(data=self.data[k, :n], columns=self.columns, time=self.time[k, :n])
+
+    def to_dataframe(self):
+        """ DataFrame of all scenarios with (scenario, time point) rows.
+
+        :return: pandas DataFrame
+        """
+        frames = [self.scenario(k).to_dataframe().reset_index(drop=True) for k in range(len(self))]
+        return pd.concat(frames, keys=range(len(self)), names=['scenario', 'point'])
+
+
+class EnsembleResult(object):
+    """ Statistics of an ensemble of stochastic DFBA simulations.
+
+    Mean, variance and quantiles are 2D NumPy arrays (time points x columns).
+    """
+
+    def __init__(self, mean, variance, quantiles, columns, time, n, base_seed=None):
+        """ Create the result.
+
+        :param mean: mean values
+        :param variance: sample variances
+        :param quantiles: dict {p: quantile values}
+        :param columns: column names, i.e. the timecourse selections
+        :param time: time points
+        :param n: number of replicates
+        :param base_seed: base seed of the replicates
+        """
+        self.mean = mean
+        self.variance = variance
+        self.quantiles = quantiles
+        self.columns = list(columns)
+        self.time = time
+        self.n = n
+        self.base_seed = base_seed
+
+    @property
+    def std(self):
+        """ Sample standard deviations. """
+        return np.sqrt(self.variance)
+
+    def to_dataframe(self, statistic='mean'):
+        """ DataFrame of a statistic.
+
+        :param statistic: 'mean', 'variance', 'std' or a quantile p
+        :return: pandas DataFrame
+        """
+        if statistic in ('mean', 'variance', 'std'):
+            data = getattr(self, statistic)
+        else:
+            data = self.quantiles[statistic]
+        return DFBAResult(data=data, columns=self.columns, time=self.time).to_dataframe()
@@ -12,7 +12,6 @@ Usage:
 # FIXME: handle submodels directly defined in model
 # TODO: setting of initial conditions, parameters and values.
 # TODO: FVA, i.e. flux variability analysis with cobrapy
-# TODO: store directly in numpy arrays for speed improvements
 # TODO: set tolerances for the ode integration
 
 
@@ -20,30 +19,52 @@ import logging
 import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
-import cobra
-from cobra.flux_analysis import parsimonious
+from cobra.util.array import create_stoichiometric_matrix
+from cobra.exceptions import OptimizationError
 import timeit
+import warnings
 
 from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.lp import FluxExtractor, FastPath, get_glpk_basis, set_glpk_basis, PFBA_CONSTRAINT_ID
+from sbmlutils.dfba.results import ResultBuffer
+from sbmlutils.dfba.sinks import create_sink
+from sbmlutils.dfba.checkpoint import save_checkpoint, load_checkpoint, checkpoint_seed
+from sbmlutils.dfba.uniqueness import UniquenessChecker
+from sbmlutils.dfba.fva import FVAPool
+from sbmlutils.dfba.memo import FluxMemo
+from sbmlutils.dfba.submodels import SubmodelSolver, SubmodelPool
+from sbmlutils.dfba.timing import PhaseTimer
+from sbmlutils.dfba.odestate import StateVector
+from sbmlutils.dfba import builder
+from sbmlutils.dfba import batch
+from sbmlutils.dfba import ensemble
+from sbmlutils.dfba import direct
 from sbmlutils import fbc
 
+# coupling schemes of ODE and FBA
+COUPLINGS = ['explicit', 'midpoint']
+
 
 def simulate_dfba(sbml_path, tstart=0.0, tend=10.0, dt=0.1, pfba=True,
-                  abs_tol=1E-6, rel_tol=1E-6, lp_solver='glpk', ode_integrator="cvode", **kwargs):
+                  abs_tol=1E-6, rel_tol=1E-6, lp_solver='glpk', ode_integrator="cvode",
+                  fast_path=False, fva_processes=1, lp_processes=1, memo_size=0, cache=None, **kwargs):
     """ Simulates given model with DFBA.
 
     Utility function which sets up the model object, a simulator and 
     executes the given simulation.
+    With cache (True or a ModelCache) the compiled models are reused between calls.
 
     :return: list of result DataFrame, DFBAModel, DFBASimulator
     """
     start_time = timeit.default_timer()
     # Load model
-    dfba_model = DFBAModel(sbml_path=sbml_path)
+    dfba_model = DFBAModel(sbml_path=sbml_path, cache=cache)
 
     # simulation
     dfba_simulator = DFBASimulator(dfba_model, pfba=pfba,
-                                   abs_tol=abs_tol, rel_tol=rel_tol, lp_solver=lp_solver, ode_integrator=ode_integrator)
+                                   abs_tol=abs_tol, rel_tol=rel_tol, lp_solver=lp_solver, ode_integrator=ode_integrator,
+                                   fast_path=fast_path, fva_processes=fva_processes,
+                                   lp_processes=lp_processes, memo_size=memo_size)
     dfba_simulator.simulate(tstart=tstart, tend=tend, dt=dt, **kwargs)
     df = dfba_simulator.solution
 
@@ -53,55 +74,164 @@ def simulate_dfba(sbml_path, tstart=0.0, tend=10.0, dt=0.1, pfba=True,
     print("\n{:<20}: {:4.3f} [s]".format('Simulation time', sim_time))
     print("{:<20}: {:4.3f} [s]".format('Total time', tot_time))
     print("{:<20}: {:4.3f} [s] ({:2.1f} %)\n".format('Overhead time', overhead_time, overhead_time/tot_time*100))
+    if dfba_simulator.fast_path is not None:
+        n_fba = dfba_simulator.n_fast_path + dfba_simulator.n_lp
+        print("{:<20}: {}/{} steps\n".format('LP fast path', dfba_simulator.n_fast_path, n_fba))
+    if dfba_simulator.reuse_solution:
+        print("{:<20}: {} steps\n".format('Reused solutions', dfba_simulator.n_reused))
+    memo = dfba_simulator.flux_memo
+    if memo is not None:
+        print("{:<20}: {}/{} steps ({:2.1f} %)\n".format('FBA memo hits', memo.hits, memo.hits + memo.misses,
+                                                          100 * memo.hit_rate))
+    checker = dfba_simulator.uniqueness_checker
+    if dfba_simulator.check_uniqueness and checker.n_checked > 0:
+        print("{:<20}: {}/{} reactions\n".format('FVA', checker.n_fva, checker.n_checked))
+    print(dfba_simulator.timer.summary())
     return df, dfba_model, dfba_simulator
 
 
 class DFBASimulator(object):
     """ Simulator class to dynamic flux balance models (DFBA). """
-    # FIXME: add the pfba objective once and only update the coeffient depending on the actual optimum
 
-    def __init__(self, dfba_model, abs_tol=1E-6, rel_tol=1E-6, lp_solver='glpk', ode_integrator="cvode", pfba=True, check_uniqueness=True):
+    def __init__(self, dfba_model, abs_tol=1E-6, rel_tol=1E-6, lp_solver='glpk', ode_integrator="cvode", pfba=True,
+                 check_uniqueness=True, fast_path=False, fva_processes=1, lp_processes=1,
+                 memo_size=0, memo_tol=1E-9, reuse_solution=False):
         """ Create the simulator with the processed dfba model.
 
+        All FBA submodels of the model are coupled. Fast path and uniqueness
+        checks are performed for the first FBA submodel.
+
 
         :param dfba_model: DFBAModel
         :param abs_tol: absolute tolerance of integration
         :param rel_tol: relative tolerance of integration
-        :param lp_solver: solver to use for the lp problem (glpk, cplex, gurobi)
+        :param lp_solver: solver to use for the lp problem (glpk, cplex, gurobi), or 'highs'
+            for array LPs solved with scipy's HiGHS without the cobra model
         :param pfba: perform minimal flux simulation
+        :param check_uniqueness: check uniqueness of FBA solutions, via optimality certificates
+            and flux variability analysis of the remaining reactions
+        :param fast_path: reuse the last optimal basis, the LP is only solved if the
+            basis is no longer optimal for the new bounds
+        :param fva_processes: number of worker processes for flux variability analysis
+        :param lp_processes: number of worker processes for the LPs of further FBA submodels
+        :param memo_size: number of FBA solutions of the first submodel stored by their
+            bounds, steps with stored bounds skip the LP (0 disables the memo)
+        :param memo_tol: quantization of the bounds for the memo
+        :param reuse_solution: reuse the last fluxes without solving the LP if all changed
+            bounds are non-binding at the last solution and the fluxes stay feasible
         """
         self.dfba_model = dfba_model
+        # arguments for creating equivalent simulators, e.g. in worker processes
+        self.simulator_kwargs = {
+            'abs_tol': abs_tol, 'rel_tol': rel_tol, 'lp_solver': lp_solver, 'ode_integrator': ode_integrator,
+            'pfba': pfba, 'check_uniqueness': check_uniqueness, 'fast_path': fast_path,
+            'fva_processes': fva_processes, 'lp_processes': lp_processes,
+            'memo_size': memo_size, 'memo_tol': memo_tol, 'reuse_solution': reuse_solution,
+        }
         self.ode_integrator = ode_integrator
         self.abs_tol = abs_tol
         self.rel_tol = rel_tol
-        self.solution = None
+        self.result = None  # DFBAResult of last simulation
 
-        self.fba_solution = None  # last LP solution
-        self.fluxes = None  # last LP fluxes dict
+        self._flux_values = None  # flux parameter values set in ode model
 
         self.simulation_time = None  # duration of last simulation
+        self.n_rejected = 0  # rejected steps of last adaptive simulation
+        self.n_events = 0  # basis changes of last direct simulation
+        self.timer = PhaseTimer()  # wall time per step and phase of last simulation
+        self._simulate_args = None  # arguments of the last simulation (checkpoints)
+        self._resume_state = None  # checkpoint state for resume
+        self._checkpoint_rows = (0, 0)  # step and size of the rows file of the last checkpoint
+        self._state_vector = None  # state vector of the ode model for repeated steps
+        self._integrator_started = False  # persistent integrator advanced in last simulation
+        self._debug = logging.getLogger().isEnabledFor(logging.DEBUG)
 
-        # set solver
-        self.cobra_model.solver = lp_solver
         self.pfba = pfba
         self.check_uniqueness = check_uniqueness
+        self.fva_processes = fva_processes
 
         # uniqueness of FBA solution
-        self.all_fva = None
+        self.fva = None  # FVA of current step (reactions x FVA_COLUMNS)
+        self.all_fva = None  # FVA of all steps (steps x reactions x FVA_COLUMNS)
         self.unique = None
 
+        # bounds, fluxes and LP of every FBA submodel, the LP of the first submodel is solved
+        # by the simulator (fast path, uniqueness), the further submodels via the submodel pool
+        self.fba_solvers = [
+            SubmodelSolver(fba_model, self.dfba_model.flux_rules, lp_solver=lp_solver, pfba=pfba, abs_tol=abs_tol)
+            for fba_model in self.dfba_model.fba_models]
+        self.fba_solver = self.fba_solvers[0]
+        self.submodel_solvers = self.fba_solvers[1:]
+        self.lp_processes = lp_processes
+        self.submodel_pool = None
+
         # Check that the FBA model simulates with given FBA model bounds
         df_fbc = fbc.cobra_reaction_info(self.cobra_model)
         logging.info(df_fbc)
 
-        # flux replacements in ode model
-        parameter2flux = {}
-        for fba_rid, top_rid in self.fba_model.fba2top_reactions.items():
-            top_pid = self.dfba_model.flux_rules[top_rid]
-            parameter2flux[top_pid] = top_rid
-        self.parameter2flux = parameter2flux
+        # FBA objective of the model in order of the fluxes, the solver objective is changed by pfba
+        coefficients = self.fba_model.objective_coefficients
+        self.objective_direction = self.fba_model.cobra_objective_direction
+        self.objective_coefficients = np.array(
+            [coefficients.get(rid, 0.0) for rid in self.flux_extractor.reaction_ids], dtype=np.float64)
+
+        # last optimal basis (glpk warm start) and fast path
+        self.lp_basis = None
+        self.n_fast_path = 0  # steps solved via fast path in last simulation
+        self.n_lp = 0  # steps solved via LP in last simulation
+        self.fast_path = None
+        self._fast_path_solved = False
+
+        # reuse of the last solution if only non-binding bounds changed
+        self.reuse_solution = reuse_solution
+        self.n_reused = 0  # steps with reused solution in last simulation
+        self._solution_lb = None  # bounds of the last solution
+        self._solution_ub = None
+        self._pinned = None  # pinned fluxes of the last solution
+        self._lp_solved = False  # LP solved in the last FBA step
+
+        # solutions by bounds, kept between simulations
+        self.flux_memo = FluxMemo(max_size=memo_size, tol=memo_tol) if memo_size > 0 else None
+
+        # stoichiometric matrix, if the LP has no constraints besides the steady state
+        S = None
+        constraints = [c for c in self.cobra_model.solver.constraints if c.name != PFBA_CONSTRAINT_ID]
+        if len(constraints) == len(self.cobra_model.metabolites):
+            S = create_stoichiometric_matrix(self.cobra_model, array_type='dense')
+        if fast_path:
+            if S is None:
+                warnings.warn("FBA model has additional constraints, fast path is disabled.")
+            else:
+                self.fast_path = FastPath(S, self.objective_coefficients,
+                                          direction=self.objective_direction, pfba=self.pfba)
+
+        # uniqueness via certificates, FVA only for the remaining reactions
+        self.uniqueness_checker = UniquenessChecker(self.cobra_model, self.flux_extractor.reaction_ids, S=S)
+
+        # flux parameters of all submodels in the ode model, written with a single setter call
+        self._flux_parameters = [pid for solver in self.fba_solvers for pid in solver.flux_parameters]
+        # global parameter indices of flux parameters in roadrunner model
+        pid2index = {pid: k for k, pid in enumerate(self.ode_model.model.getGlobalParameterIds())}
+        self._flux_parameter_model_index = np.array(
+            [pid2index[pid] for pid in self._flux_parameters], dtype=np.int32)
 
 
+    @property
+    def solution(self):
+        """ DataFrame of the last simulation result, read from the sink for streamed results. """
+        if self.result is None:
+            return None
+        if self.result.sink is not None:
+            return self.result.read_sink()
+        return self.result.to_dataframe()
+
+    @property
+    def timing(self):
+        """ DataFrame of wall times [s] per step and phase of the last simulation. """
+        # streamed results only hold the time points of the unflushed rows
+        time = self.result.time if self.result is not None and self.result.offset == 0 else None
+        return self.timer.to_dataframe(index=time)
+
     @property
     def dt(self):
         """ Time step of simulation.
@@ -123,6 +253,50 @@ class DFBASimulator(object):
         """ Cobra model for the FBA model. """
         return self.fba_model.cobra_model
 
+    @property
+    def pfba_problem(self):
+        """ PFBAProblem of the first FBA submodel, None for fba. """
+        return self.fba_solver.pfba_problem
+
+    @property
+    def flux_extractor(self):
+        """ FluxExtractor of the first FBA submodel, defines the order of the fluxes. """
+        return self.fba_solver.flux_extractor
+
+    @property
+    def lp_backend(self):
+        """ HighsLP of the first FBA submodel, None for the cobra solvers. """
+        return self.fba_solver.lp_backend
+
+    @property
+    def fluxes(self):
+        """ Last fluxes of the first FBA submodel (numpy array in order of flux_extractor.reaction_ids). """
+        return self.fba_solver.fluxes
+
+    @fluxes.setter
+    def fluxes(self, fluxes):
+        self.fba_solver.fluxes = fluxes
+
+    @property
+    def lower_bounds(self):
+        """ Current lower bounds of the bound reactions of the first FBA submodel. """
+        return self.fba_solver.lower_bounds
+
+    @property
+    def upper_bounds(self):
+        """ Current upper bounds of the bound reactions of the first FBA submodel. """
+        return self.fba_solver.upper_bounds
+
+    @property
+    def reaction_lb(self):
+        """ Current lower bounds of all reactions of the first FBA submodel. """
+        return self.fba_solver.reaction_lb
+
+    @property
+    def reaction_ub(self):
+        """ Current upper bounds of all reactions of the first FBA submodel. """
+        return self.fba_solver.reaction_ub
+
     @property
     def lp_model(self):
         """ Cobra model for the FBA model. """
@@ -145,26 +319,92 @@ class DFBASimulator(object):
         self.ode_model.timeCourseSelections = sel
         self.columns = dict(zip(sel, range(len(sel))))
 
-    def simulate(self, tstart=0.0, tend=10.0, dt=0.1, absTol=1E-6, relTol=1E-6, reset=True, show_settings=True):
+    def simulate(self, tstart=0.0, tend=10.0, dt=0.1, absTol=1E-6, relTol=1E-6, reset=True, show_settings=True,
+                 stepping=True, adaptive=False, dt_min=None, dt_max=None, dt_grow=1.5, dt_shrink=0.5,
+                 active_tol=None, fva_path=None, seed=None, sink=None, flush_interval=1000,
+                 checkpoint=None, checkpoint_interval=100, coupling='explicit'):
         """ Perform model simulation.
 
         The simulator images out based on the SBO terms in the list of submodels, which
         simulation/modelling framework to use.
         The passing of information between FBA and SSA/ODE is based on the list of replacements.
 
+        With adaptive stepping the coupling step size is grown while the set of active
+        flux bounds of the FBA solution stays the same, and a step is repeated with a
+        smaller step size if the active set changes, e.g. when a lower exchange bound
+        hits zero on substrate depletion.
+
         :param tstart:
         :param tend:
-        :param dt:
+        :param dt: step size, initial step size for adaptive stepping
         :param absTol:
         :param relTol:
         :param reset:
         :param show_settings:
-        :return:
+        :param stepping: keep the ODE integrator alive between the steps and advance
+            it by dt. The integrator is only reinitialized when the flux parameters change.
+            If False every step is a separate roadrunner simulate call.
+        :param adaptive: adapt the coupling step size, requires stepping
+        :param dt_min: minimal step size for adaptive stepping (default dt/10)
+        :param dt_max: maximal step size for adaptive stepping (default 10*dt)
+        :param dt_grow: factor for growing the step size
+        :param dt_shrink: factor for shrinking the step size
+        :param active_tol: tolerance for fluxes at their bounds (default abs_tol)
+        :param fva_path: optional file for memory-mapping the FVA results of long simulations,
+            required for FVA results with a sink
+        :param seed: random seed of the gillespie integrator
+        :param sink: ResultSink or file path (.csv, .tsv, .h5, .parquet) for streaming the rows,
+            the returned result contains only the rows which are not flushed, all rows are
+            read with DFBAResult.read_sink
+        :param flush_interval: number of rows after which the rows are written to the sink
+        :param checkpoint: file for checkpoints of the simulation, see resume
+        :param checkpoint_interval: number of steps between checkpoints
+        :param coupling: coupling of ODE and FBA, 'explicit' holds the FBA fluxes of the
+            start of the step fixed, 'midpoint' re-solves the FBA at the predicted midpoint
+            of the step (second order in dt, requires fixed steps and stepping)
+        :return: DFBAResult
         """
+        if coupling not in COUPLINGS:
+            raise ValueError("Unsupported coupling '{}', use one of {}".format(coupling, COUPLINGS))
+        if coupling == 'midpoint' and (adaptive or not stepping):
+            raise ValueError("Midpoint coupling requires fixed step sizes and stepping=True")
+        if checkpoint is not None:
+            if adaptive:
+                raise ValueError("Checkpoints require fixed step sizes")
+            if sink is not None:
+                raise ValueError("Checkpoints can not be combined with a result sink")
+            if self.ode_integrator == "gillespie" and seed is None:
+                # the random numbers after a checkpoint are drawn from the seed
+                seed = np.random.randint(0, 2**31 - 1)
+        if sink is not None and self.check_uniqueness and fva_path is None:
+            # the FVA results are memory-mapped, so the memory stays bounded
+            raise ValueError("FVA results of a simulation with a result sink require a fva_path")
+        self._simulate_args = {
+            'tstart': tstart, 'tend': tend, 'dt': dt, 'absTol': absTol, 'relTol': relTol,
+            'stepping': stepping, 'fva_path': fva_path, 'seed': seed,
+            'checkpoint': checkpoint, 'checkpoint_interval': checkpoint_interval,
+            'coupling': coupling,
+        }
+        resume_state, self._resume_state = self._resume_state, None
+        self._checkpoint_rows = (0, 0)
 
         start_time = timeit.default_timer()
+        self._debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        self._flux_values = None
+        self.n_fast_path = 0
+        self.n_lp = 0
+        self.n_reused = 0
+        self._solution_lb = None
+        self._solution_ub = None
+        self._pinned = None
+        self.uniqueness_checker.reset()
+        if self.flux_memo is not None:
+            self.flux_memo.reset_stats()
         # set the columns in output
         self._set_timecourse_selections()
+        self._setup_fba()
+        self._state_vector = StateVector(self.ode_model)
+        self._integrator_started = False
 
         # reset model to initial state
         if reset:
@@ -173,9 +413,11 @@ class DFBASimulator(object):
         # set tolerances on ODE solver
         self.ode_model.setIntegrator(self.ode_integrator)
         integrator = self.ode_model.integrator
-        if integrator != "gillespie":
+        if self.ode_integrator != "gillespie":
             integrator.absolute_tolerance = self.abs_tol
             integrator.relative_tolerance = self.rel_tol
+        elif seed is not None:
+            integrator.setValue('seed', int(seed))
 
         if show_settings:
             print("-" * 80)
@@ -187,97 +429,493 @@ class DFBASimulator(object):
         # FIXME: set tolerances on cobra solver
         # model.solver.configuration.tolerances.feasibility = 1e-8 (absolute tolerances)
 
-        # number of steps
-        steps = int(np.round(1.0 * tend / dt))
-        if np.abs(steps * dt - tend) > absTol:
-            raise ValueError("Stepsize dt={} not compatible to simulation time tend={}".format(dt, tend))
+        if adaptive:
+            if not stepping:
+                raise ValueError("Adaptive step sizes require stepping=True")
+            if dt_min is None:
+                dt_min = 0.1 * dt
+            if dt_max is None:
+                dt_max = 10.0 * dt
+            if not 0 < dt_min <= dt_max:
+                raise ValueError("Invalid step sizes: dt_min={}, dt_max={}".format(dt_min, dt_max))
+            if active_tol is None:
+                active_tol = self.abs_tol
+            points = int(np.ceil((tend - tstart) / dt)) + 1
+        else:
+            # number of steps
+            steps = int(np.round(1.0 * tend / dt))
+            if np.abs(steps * dt - tend) > absTol:
+                raise ValueError("Stepsize dt={} not compatible to simulation time tend={}".format(dt, tend))
+            points = steps + 1
 
         # set the dt value
         self.dfba_model.set_dt(dt)
 
+        # preallocated result matrix
+        if isinstance(sink, str):
+            sink = create_sink(sink)
+        buffer = ResultBuffer(columns=self.ode_model.timeCourseSelections, capacity=points,
+                              reaction_ids=self.flux_extractor.reaction_ids if self.check_uniqueness else None,
+                              fva_path=fva_path, sink=sink, flush_interval=flush_interval)
+        if not adaptive:
+            buffer.time[:] = np.linspace(start=tstart, stop=tend, num=points)
+        self.n_rejected = 0
+        self.timer = PhaseTimer(capacity=points)
+        if resume_state is not None:
+            self._restore_state(resume_state, buffer)
+
+        # worker processes for flux variability analysis, alive for the whole simulation
+        if self.check_uniqueness and self.fva_processes > 1:
+            self.uniqueness_checker.fva_pool = FVAPool(
+                self.cobra_model, processes=self.fva_processes,
+                objective_coefficients=self.objective_coefficients,
+                direction=self.objective_direction, pfba=self.pfba)
+
+        # LPs of further FBA submodels are solved concurrently to the first submodel
+        if self.submodel_solvers:
+            self.submodel_pool = SubmodelPool(self.submodel_solvers, processes=self.lp_processes)
+
+        error = None
         try:
             logging.debug('###########################')
             logging.debug('# Start Simulation')
             logging.debug('###########################')
 
-            points = steps + 1
-            all_time = np.linspace(start=tstart, stop=tend, num=points)
-            all_results = []
-            all_fva = []
+            if adaptive:
+                self._run_adaptive(buffer, tstart=tstart, tend=tend, dt=dt, dt_min=dt_min, dt_max=dt_max,
+                                   dt_grow=dt_grow, dt_shrink=dt_shrink, active_tol=active_tol)
+            else:
+                self._run_fixed(buffer, points=points, dt=dt, stepping=stepping, state=resume_state,
+                                checkpoint=checkpoint, checkpoint_interval=checkpoint_interval,
+                                coupling=coupling)
 
-            # initial values
-            ode_res = self._simulate_ode(tstart=0.0, tend=0.0)
+            logging.debug('###########################')
+            logging.debug('# Stop Simulation')
+            logging.debug('###########################')
 
-            if self.ode_integrator == "gillespie":
-                row_next = ode_res[0, :]
-            else:
-                row_next = ode_res[1, :]
+        except (RuntimeError, OptimizationError) as e:
+            import traceback
+            traceback.print_exc()
+            # the partial result until the error is returned
+            error = e
+        finally:
+            if self.uniqueness_checker.fva_pool is not None:
+                self.uniqueness_checker.fva_pool.close()
+                self.uniqueness_checker.fva_pool = None
+            if self.submodel_pool is not None:
+                self.submodel_pool.close()
+                self.submodel_pool = None
+            self._restore_objective()
+            # rows until an error are persisted in the sink, the result holds the unflushed rows
+            self.result = buffer.result()
+            buffer.close()
+
+        self.result.error = error
+        self.simulation_time = timeit.default_timer() - start_time
+        self.all_fva = self.result.fva
+        if self.all_fva is not None:
+            self.unique = pd.DataFrame(data=self.result.unique(tol=1E-6), index=self.result.time,
+                                       columns=["unique"])
+        else:
+            self.unique = pd.DataFrame(columns=["unique"])
+
+        return self.result
+
+    def simulate_batch(self, conditions, n_workers=1, chunksize=1, **kwargs):
+        """ Simulates many scenarios of initial concentrations and parameters.
 
+        Every scenario is a row of the conditions table with values for roadrunner
+        selections, e.g. 'init([glc__D_e])' for initial concentrations or parameter ids.
+        The model is reset before each scenario. With n_workers > 1 the scenarios
+        are simulated on a process pool, every worker loads the model once.
 
+        :param conditions: pandas DataFrame (scenarios x selections) or list of dicts
+        :param n_workers: number of worker processes
+        :param chunksize: number of scenarios sent to a worker at once
+        :param kwargs: arguments for simulate
+        :return: BatchResult (scenarios x time x variables)
+        """
+        return batch.simulate_batch(self, conditions, n_workers=n_workers, chunksize=chunksize, **kwargs)
+
+    def simulate_ensemble(self, n, base_seed=0, n_workers=1, quantiles=(0.05, 0.5, 0.95), **kwargs):
+        """ Simulates an ensemble of stochastic replicates.
+
+        Requires the gillespie integrator. Replicate k is simulated with the k-th seed
+        drawn from the base seed, so the ensemble is reproducible. Mean, variance and
+        quantiles per time point are accumulated while the replicates are streamed,
+        the trajectories are not stored.
+
+        :param n: number of replicates
+        :param base_seed: seed for the seeds of the replicates
+        :param n_workers: number of worker processes
+        :param quantiles: quantiles to estimate
+        :param kwargs: arguments for simulate
+        :return: EnsembleResult
+        """
+        return ensemble.simulate_ensemble(self, n, base_seed=base_seed, n_workers=n_workers,
+                                          quantiles=quantiles, **kwargs)
+
+    def simulate_direct(self, tstart=0.0, tend=10.0, dt=0.1, method='LSODA', reset=True, max_events=10000):
+        """ Simulates the model with the direct approach.
+
+        The model is integrated continuously with the fluxes of a fixed optimal
+        basis in the right hand side, the LP is only solved if the basis becomes
+        infeasible. Requires a single FBA submodel without constraints besides the
+        steady state. Uniqueness is not checked.
+
+        :param tstart: start time
+        :param tend: end time
+        :param dt: interval of the output time points
+        :param method: integration method of scipy's solve_ivp
+        :param reset: reset model to initial state
+        :param max_events: maximal number of basis changes
+        :return: DFBAResult
+        """
+        return direct.simulate_direct(self, tstart=tstart, tend=tend, dt=dt, method=method, reset=reset,
+                                      max_events=max_events)
+
+    def _run_fixed(self, buffer, points, dt, stepping, state=None, checkpoint=None, checkpoint_interval=100,
+                   coupling='explicit'):
+        """ Simulation loop with fixed step size.
+
+        At checkpoints the integrator is reinitialized, so a resumed simulation
+        continues identical to the checkpointed simulation.
+
+        :param buffer: ResultBuffer for the rows
+        :param points: number of time points
+        :param dt: step size
+        :param stepping: use the persistent integrator
+        :param state: restored checkpoint state to continue from
+        :param checkpoint: file for checkpoints
+        :param checkpoint_interval: number of steps between checkpoints
+        :param coupling: coupling of ODE and FBA ('explicit', 'midpoint')
+        :return:
+        """
+        columns = buffer.columns
+        midpoint = coupling == 'midpoint'
+        row_mid = np.empty(len(columns), dtype=np.float64)
+
+        # initial values
+        if state is not None:
+            row_next = np.array(state['row_next'])
+            time = state['time']
+        else:
+            # values of the initial state, a simulation of length zero is not supported by roadrunner
+            self.ode_model.model.setTime(0.0)
+            row_next = self._read_ode(np.empty(len(columns), dtype=np.float64))
             time = 0.0
-            kstep = 0
-            while kstep < points:
+
+        reinit = True
+        timer = self.timer
+        while buffer.n < points:
+            kstep = buffer.n
+            timer.step(kstep)
+            if self._debug:
                 logging.debug("-" * 80)
                 logging.debug("Time: {}".format(time))
-                logging.debug("* dt = {}".format(self.dt))
+                logging.debug("* dt = {}".format(dt))
                 step_time = timeit.default_timer()
 
-                # --------------------------------------
-                # FBA
-                # --------------------------------------
-                # update fba bounds from ode
-                self._set_fba_bounds(row_next)
-                # optimize fba
-                self._simulate_fba()
-                # set ode fluxes from fba
-                self._set_fluxes()
-
-                if self.check_uniqueness:
-                    # FIXME: probably not storing the correct values due to reference
-                    all_fva.append(self.fva)
-
-                # --------------------------------------
-                # ODE
-                # --------------------------------------
-                ode_res = self._simulate_ode(tstart=time, tend=time + self.dt)
-                row = ode_res[0, :]
+            # --------------------------------------
+            # FBA
+            # --------------------------------------
+            fluxes_changed = self._fba_step(row_next)
+
+            buffer.lp_solved[kstep] = self._lp_solved
+            if self.check_uniqueness:
+                buffer.fva_row(kstep)[:] = self.fva
+            timer.lap('store')
+
+            # --------------------------------------
+            # ODE
+            # --------------------------------------
+            row = buffer.row(kstep)
+            if stepping:
+                self._read_ode(row)
+                timer.lap('store')
+                if midpoint:
+                    # fluxes at the start of the step, the corrector changes the fluxes
+                    self._store_fba_fluxes(row)
+                    self._step_midpoint(tstart=time, dt=dt, row_mid=row_mid)
+                else:
+                    self._step_ode(tstart=time, dt=dt, reinit=(reinit or fluxes_changed))
+                reinit = False
+                self._read_ode(row_next)
+                timer.lap('ode')
+            else:
+                ode_res = self._simulate_ode(tstart=time, tend=time + dt)
+                timer.lap('ode')
+                row[:] = ode_res[0, :]
                 row_next = ode_res[1, :]
+            if not midpoint:
                 self._store_fba_fluxes(row)
+            timer.lap('store')
 
-                all_results.append(row)
+            # update time & step counter
+            time += dt
+            buffer.advance()
 
-                # update time & step counter
-                time += self.dt
-                kstep += 1
+            if checkpoint is not None and buffer.n % checkpoint_interval == 0 and buffer.n < points:
+                self._write_checkpoint(checkpoint, buffer, time=time, row_next=row_next)
+                reinit = True
 
-                logging.debug(pd.Series(row, index=self.ode_model.timeCourseSelections))
+            if self._debug:
+                logging.debug(pd.Series(row, index=columns))
                 logging.debug("Time for step: {:2.4}".format(timeit.default_timer() - step_time))
 
+    def _run_adaptive(self, buffer, tstart, tend, dt, dt_min, dt_max, dt_grow, dt_shrink, active_tol):
+        """ Simulation loop with adaptive step size.
 
-            # create result matrix
-            df_results = pd.DataFrame(index=all_time, columns=self.ode_model.timeCourseSelections,
-                                      data=all_results)
-            df_results.time = all_time
+        After every step the FBA problem is solved at the end of the interval
+        with the proposed next step size. If the active set of the FBA solution
+        changed within the interval the step is rejected and repeated from the
+        saved ode state with a smaller step size, otherwise the step size is grown.
 
-            self.simulation_time = timeit.default_timer() - start_time
-            logging.debug('###########################')
-            logging.debug('# Stop Simulation')
-            logging.debug('###########################')
+        :param buffer: ResultBuffer for the rows
+        :return:
+        """
+        columns = buffer.columns
+        eps = 1E-12 * max(1.0, abs(tend))
+
+        time = tstart
+        h = min(max(dt, dt_min), dt_max)
+        self.ode_model.model.setTime(time)
+        row_next = np.empty(len(columns), dtype=np.float64)
+
+        # FBA at start, bounds depend on the step size
+        self._set_ode_dt(h)
+        fluxes_changed = self._fba_step(self._read_ode(row_next))
+        reinit = True
+        timer = self.timer
+        while True:
+            kstep = buffer.n
+            timer.step(kstep)
+            if self._debug:
+                logging.debug("-" * 80)
+                logging.debug("Time: {}".format(time))
+                logging.debug("* dt = {}".format(h))
 
-        except RuntimeError as e:
-            import traceback
-            traceback.print_exc()
-            # return the partial result until the error
-            df_results = pd.DataFrame(columns=self.ode_model.timeCourseSelections,
-                                      data=all_results)
-            df_results.time = all_time[:len(all_results)]
+            row = buffer.row(kstep)
+            self._read_ode(row)
+            self._store_fba_fluxes(row)
+            buffer.time[kstep] = time
+            buffer.lp_solved[kstep] = self._lp_solved
+            if self.check_uniqueness:
+                buffer.fva_row(kstep)[:] = self.fva
+            timer.lap('store')
+
+            if time >= tend - eps:
+                buffer.advance()
+                break
+
+            h = min(h, tend - time)
+            active = self._active_set(active_tol)
+            state = self._save_ode_state()
+            self._step_ode(tstart=time, dt=h, reinit=(reinit or fluxes_changed))
+            reinit = False
+            timer.lap('ode')
+
+            # FBA at the end of the interval with the proposed step size
+            h_next = min(h * dt_grow, dt_max)
+            self._set_ode_dt(h_next)
+            fluxes_changed = self._fba_step(self._read_ode(row_next))
+
+            if not np.array_equal(active, self._active_set(active_tol)):
+                if h > dt_min * (1.0 + 1E-9):
+                    # reject step and repeat with smaller step size
+                    logging.debug("* step rejected: dt = {}".format(h))
+                    self.n_rejected += 1
+                    self._restore_ode_state(state)
+                    timer.lap('ode')
+                    h = max(h * dt_shrink, dt_min)
+                    self._set_ode_dt(h)
+                    fluxes_changed = self._fba_step(self._read_ode(row_next))
+                    reinit = True
+                    continue
+
+                # accept step at minimal step size and continue with minimal step size
+                h_next = dt_min
+                self._set_ode_dt(h_next)
+                fluxes_changed = self._fba_step(self._read_ode(row_next))
+
+            time += h
+            buffer.advance()
+            h = h_next
+
+    def resume(self, checkpoint, **kwargs):
+        """ Continues a simulation from its last checkpoint.
+
+        The simulator must be created for the same model and with the same settings
+        as the checkpointed simulation. The simulation is continued with the arguments
+        of the checkpointed simulation.
+
+        :param checkpoint: checkpoint file
+        :param kwargs: arguments for simulate overwriting the checkpointed arguments
+        :return: DFBAResult
+        """
+        state = load_checkpoint(checkpoint)
+        args = dict(state['args'])
+        args.update(kwargs)
+        args['reset'] = False
+        self._resume_state = state
+        return self.simulate(**args)
+
+    def _write_checkpoint(self, path, buffer, time, row_next):
+        """ Writes the state of the simulation after the last completed step.
+
+        Only the rows since the last checkpoint are written. The gillespie
+        integrator is reseeded from the seed and the step, so the random
+        numbers after the checkpoint are reproduced by a resumed simulation.
+
+        :param path: checkpoint file
+        :param buffer: ResultBuffer
+        :param time: current time
+        :param row_next: ode values at current time
+        """
+        n = buffer.n
+        start, rows_offset = self._checkpoint_rows
+        rng_seed = None
+        if self.ode_integrator == "gillespie":
+            rng_seed = checkpoint_seed(self._simulate_args['seed'], n)
+            self.ode_model.integrator.setValue('seed', rng_seed)
+        state = {
+            'step': n,
+            'time': time,
+            'row_next': np.array(row_next),
+            'args': self._simulate_args,
+            'fluxes': np.array(self.fluxes),
+            'flux_values': np.array(self._flux_values) if self._flux_values is not None else None,
+            'lower_bounds': np.array(self.lower_bounds),
+            'upper_bounds': np.array(self.upper_bounds),
+            'reaction_lb': np.array(self.reaction_lb),
+            'reaction_ub': np.array(self.reaction_ub),
+            'lp_basis': get_glpk_basis(self.cobra_model),
+            'fast_path': (self.fast_path.fba_basis, self.fast_path.pfba_basis) if self.fast_path else None,
+            'counters': (self.n_fast_path, self.n_lp,
+                         self.uniqueness_checker.n_checked, self.uniqueness_checker.n_fva),
+            'solution_bounds': (self._solution_lb, self._solution_ub, self._pinned, self.n_reused),
+            'submodels': [(solver.fluxes, solver.lower_bounds.copy(), solver.upper_bounds.copy())
+                          for solver in self.submodel_solvers],
+            'flux_memo': self.flux_memo,
+            'rng_seed': rng_seed,
+        }
+        rows = {
+            'data': np.array(buffer.data[start - buffer.offset:n - buffer.offset]),
+            'time_points': np.array(buffer.time[start:n]),
+            'fva': np.array(buffer.fva[start:n]) if buffer.fva is not None else None,
+            'timing': np.array(self.timer.times[start:n]),
+            'lp_solved': np.array(buffer.lp_solved[start:n]),
+        }
+        rows_size = save_checkpoint(path, state, self.ode_model, rows=rows, rows_offset=rows_offset)
+        self._checkpoint_rows = (n, rows_size)
+        logging.info("Checkpoint at step {}: {}".format(n, path))
+
+    def _restore_state(self, state, buffer):
+        """ Restores the simulation state of a checkpoint.
+
+        :param state: checkpoint state
+        :param buffer: ResultBuffer of the simulation
+        """
+        self.ode_model.loadState(state['rr_state'])
+        # the time of the model is not part of the roadrunner state
+        self.ode_model.model.setTime(state['time'])
+        self._set_timecourse_selections()
+        if state['rng_seed'] is not None:
+            self.ode_model.integrator.setValue('seed', state['rng_seed'])
+
+        n = state['step']
+        buffer.row(n - 1)
+        buffer.data[:n] = state['data']
+        buffer.time[:n] = state['time_points']
+        if buffer.fva is not None and state['fva'] is not None:
+            buffer.fva[:n] = state['fva']
+        buffer.lp_solved[:n] = state['lp_solved']
+        buffer.n = n
+        self.timer.step(n - 1)
+        self.timer.times[:n] = state['timing']
+        self._checkpoint_rows = (n, state['rows_size'])
+
+        self.fluxes = state['fluxes']
+        self._flux_values = state['flux_values']
+        self.lower_bounds[:] = state['lower_bounds']
+        self.upper_bounds[:] = state['upper_bounds']
+        self.reaction_lb[:] = state['reaction_lb']
+        self.reaction_ub[:] = state['reaction_ub']
+        self._solution_lb, self._solution_ub, self._pinned, self.n_reused = state['solution_bounds']
+        self.lp_basis = state['lp_basis']
+        set_glpk_basis(self.cobra_model, self.lp_basis)
+        if self.fast_path is not None and state['fast_path'] is not None:
+            self.fast_path.fba_basis, self.fast_path.pfba_basis = state['fast_path']
+        if self.flux_memo is not None and state['flux_memo'] is not None:
+            self.flux_memo = state['flux_memo']
+        (self.n_fast_path, self.n_lp,
+         self.uniqueness_checker.n_checked, self.uniqueness_checker.n_fva) = state['counters']
+        for solver, (fluxes, lower_bounds, upper_bounds) in zip(self.submodel_solvers, state['submodels']):
+            # warm start from the restored bounds, the checkpointed fluxes are kept
+            solver.solve(lower_bounds, upper_bounds)
+            solver.fluxes = fluxes
+
+    def _fba_step(self, row, check_uniqueness=True):
+        """ FBA part of a DFBA step.
+
+        Sets the FBA bounds from the ode row, optimizes the FBA model and sets the
+        resulting fluxes in the ode model.
+
+        :param row: ode row with bound values
+        :param check_uniqueness: check uniqueness of the solution, see _simulate_fba
+        :return: True if the flux parameters changed
+        """
+        # update fba bounds from ode
+        self._set_fba_bounds(row)
+        if self.submodel_pool is not None:
+            self.submodel_pool.submit(row)
+        self.timer.lap('bounds')
+        # optimize fba
+        self._simulate_fba(check_uniqueness=check_uniqueness)
+        if self.submodel_pool is not None:
+            self.submodel_pool.wait()
+            self.timer.lap('lp')
+        # set ode fluxes from fba
+        changed = self._set_fluxes()
+        self.timer.lap('fluxes')
+        return changed
+
+    def _active_set(self, tol):
+        """ Active set of the current FBA solutions of all submodels.
+
+        :param tol: tolerance for fluxes at bounds
+        :return: boolean numpy array
+        """
+        return np.concatenate([solver.active_set(tol) for solver in self.fba_solvers])
 
-        self.solution = df_results
-        self.simulation_time = timeit.default_timer() - start_time
-        self.all_fva = all_fva
-        self.unique = pd.DataFrame(data=[np.sum(df.maximum-df.minimum)/len(df)<1E-6 for df in all_fva], index=self.solution.time, columns=["unique"])
+    def _restore_objective(self):
+        """ Restores the FBA objectives of the cobra models.
+
+        The cobra models are shared by all simulators of the DFBAModel,
+        pfba leaves the total flux objective on the solver.
+        """
+        for solver in self.fba_solvers:
+            solver.restore_objective()
+
+    def _set_ode_dt(self, dt):
+        """ Sets the dt parameter in the ode model.
 
-        return self.solution
+        The dynamic bounds depend on dt, so the parameter must be set
+        when the step size changes.
+        """
+        if builder.DT_ID in self.columns:
+            self.ode_model[builder.DT_ID] = dt
+
+    def _save_ode_state(self):
+        """ Current time and state vector of the ode model. """
+        return self._state_vector.save()
+
+    def _restore_ode_state(self, state):
+        """ Restores the time and state vector of the ode model.
+
+        The integrator must be reinitialized before the next step.
+        """
+        self._state_vector.restore(state)
 
     def benchmark(self, n_repeat=10, **kwargs):
         """ Benchmark the simulate function with provided simulation parameters.
@@ -303,14 +941,21 @@ class DFBASimulator(object):
         print('-' * 40)
         return timings
 
+    def _setup_fba(self):
+        """ Precompute the lookups of the FBA bounds and fluxes in the ode results.
+
+        The bounds of the submodels are reset to the bounds of the cobra models.
+        Requires the timecourse selections to be set.
+        """
+        for solver in self.fba_solvers:
+            solver.setup(self.columns)
+
     def _store_fba_fluxes(self, row):
         """ Store FBA fluxes in ode solution. 
         :return: 
         """
-        for fba_rid, flat_rid in self.fba_model.top2flat_reactions.items():
-            index = self.columns[flat_rid]
-            row[index] = flux = self.fluxes[fba_rid]
-            logging.debug("\t{} = {}".format(fba_rid, flux))
+        for solver in self.fba_solvers:
+            solver.store_fluxes(row)
 
     def _is_fba_unique(self, tol=1E-6):
         """ Checks if the FBA solution is unique for the timepoint.
@@ -318,7 +963,7 @@ class DFBASimulator(object):
         :return:
         """
         # make sure that fva is run on the correct objective, i.e. fba/pfba model
-        diff = np.sum(self.fva.maximum-fva.minimum)
+        diff = np.sum(self.fva[:, 1] - self.fva[:, 0])
         unique = abs(diff) < tol
         return unique
 
@@ -336,134 +981,305 @@ class DFBASimulator(object):
         # store ode row, i.e. the end of the simulation
         return result
 
-    def _simulate_fba(self):
+    def _step_ode(self, tstart, dt, reinit=True):
+        """ Advances the persistent ODE integrator by a single timestep.
+
+        The integrator is only reinitialized if requested, i.e. at the start
+        of the simulation or if the flux parameters changed.
+
+        :param tstart: current time
+        :param dt: step size
+        :param reinit: reinitialize the integrator before the step
+        :return: time after step
+        """
+        logging.debug('* ODE step')
+        if not self._integrator_started:
+            self._integrator_started = True
+            if self.ode_integrator == "gillespie":
+                # the gillespie integrator of roadrunner is only initialized by simulate
+                self.ode_model.simulate(start=tstart, end=tstart + dt, steps=1)
+                return tstart + dt
+        return self.ode_model.oneStep(tstart, dt, reinit)
+
+    def _step_midpoint(self, tstart, dt, row_mid):
+        """ Predictor-corrector step of the ODE-FBA coupling (explicit midpoint rule).
+
+        The ode model is integrated for half the step with the fluxes of the start
+        of the step (predictor), the FBA problem is solved at the predicted midpoint
+        and the step is integrated from the start with the midpoint fluxes (corrector).
+        The coupling error is second order in dt, instead of first order for fluxes
+        held fixed over the step.
+
+        :param tstart: current time
+        :param dt: step size
+        :param row_mid: buffer for the ode values at the midpoint
+        :return: time after step
+        """
+        state = self._save_ode_state()
+        self._step_ode(tstart=tstart, dt=0.5 * dt, reinit=True)
+        self.timer.lap('ode')
+        self._fba_step(self._read_ode(row_mid), check_uniqueness=False)
+        self._restore_ode_state(state)
+        return self._step_ode(tstart=tstart, dt=dt, reinit=True)
+
+    def _read_ode(self, out):
+        """ Reads the current values of the timecourse selections.
+
+        :param out: buffer for the values
+        :return: buffer
+        """
+        out[:] = self.ode_model.getSelectedValues()
+        return out
+
+    def _simulate_fba(self, check_uniqueness=True):
         """ Optimize FBA model.
 
         Uses the objective sense from the fba model.
         Runs parsimonious FBA (often written pFBA) which finds a flux distribution
         which gives the optimal growth rate, but minimizes the total sum of flux.
+
+        :param check_uniqueness: check uniqueness if enabled for the simulator,
+            False for intermediate solutions which are not stored
         """
         logging.debug("* FBA optimize")
+        check = self.check_uniqueness and check_uniqueness
+
+        self._lp_solved = False
+        # the uniqueness check of a reused solution requires the pinned fluxes of the last solution
+        reusable = self.reuse_solution and (not check or self._pinned is not None)
+        if reusable and self._reuse_solution():
+            logging.debug("\tsolution reused")
+            self.n_reused += 1
+            self._fast_path_solved = False
+            self.timer.lap('lp')
+            if check:
+                self.fva = self._check_uniqueness(pinned=self._pinned)
+                self.timer.lap('fva')
+            self._set_solution_bounds()
+            return
+
+        memo_key = None
+        if self.flux_memo is not None:
+            memo_key = self.flux_memo.key(self.lower_bounds, self.upper_bounds)
+            solution = self.flux_memo.get(memo_key)
+            if solution is not None:
+                self.fluxes, fva = solution
+                # the FVA buffer is reused, the stored FVA is not overwritten
+                self.fva = fva.copy() if fva is not None else None
+                self._fast_path_solved = False
+                self._pinned = None
+                self._set_solution_bounds()
+                self.timer.lap('lp')
+                return
+
+        self._fast_path_solved = self.fast_path is not None and self._solve_fast_path()
+        if self._fast_path_solved:
+            self.n_fast_path += 1
+        else:
+            self._solve_lp()
+            self.n_lp += 1
+            self._lp_solved = True
+        self._set_solution_bounds()
+
+        if check:
+            self.fva = self._check_uniqueness()
+            self.timer.lap('fva')
+        else:
+            self.fva = None
+            self._pinned = None
 
-        def fva_analysis(model, solution):
-            """ Wrapper for flux variability analysis.
+        # stored solutions include the FVA if uniqueness is checked
+        if memo_key is not None and check == self.check_uniqueness:
+            self.flux_memo.put(memo_key, (self.fluxes.copy(), self.fva.copy() if self.fva is not None else None))
 
-            :param model: cobra model
-            :param solution:
-            :return:
-            """
-            fva = None
-            if self.check_uniqueness:
-                fva = cobra.flux_analysis.flux_variability_analysis(model)
-                fva['flux'] = pd.Series(solution.fluxes, index=fva.index)
-            return fva
+        if self._debug:
+            logging.debug(dict(zip(self.flux_extractor.reaction_ids, self.fluxes)))
 
-        if self.pfba:
-            # run pfba
-            # self.fba_solution = cobra.flux_analysis.pfba(self.cobra_model)
-            with self.cobra_model as m:
-                # add the pfba constraint
-                cobra.flux_analysis.parsimonious.add_pfba(m, objective=None, fraction_of_optimum=1.0)
-                m.solver.optimize()
-                solution = cobra.core.solution.get_solution(m, reactions=m.reactions)
-                fva = fva_analysis(m, solution)
+    def _check_uniqueness(self, pinned=None):
+        """ Flux variability of the current solution.
+
+        Fluxes are proven unique via the optimality certificate of the solution,
+        flux variability analysis is only run for the remaining reactions.
+
+        :param pinned: pinned fluxes of the solution, by default from the last LP
+        :return: numpy array (reactions x FVA_COLUMNS)
+        """
+        lb, ub = self.reaction_lb, self.reaction_ub
+        if pinned is None:
+            if self._fast_path_solved:
+                pinned = self.fast_path.pinned(lb, ub)
+            elif self.lp_backend is not None:
+                pinned = self.lp_backend.pinned(lb, ub, tol=self.uniqueness_checker.tol)
+            else:
+                pinned = self.flux_extractor.pinned(lb, ub, tol=self.uniqueness_checker.tol)
+        self._pinned = pinned
+
+        # flux variability analysis changes the basis, restore it afterwards
+        self.lp_basis = get_glpk_basis(self.cobra_model)
+        fva = self.uniqueness_checker.check(self.fluxes, pinned, lb=lb, ub=ub, out=self.fva)
+        set_glpk_basis(self.cobra_model, self.lp_basis)
+        return fva
+
+    def _set_solution_bounds(self):
+        """ Stores the bounds for which the current fluxes are optimal. """
+        if self.reuse_solution:
+            self._solution_lb = self.reaction_lb.copy()
+            self._solution_ub = self.reaction_ub.copy()
+
+    def _reuse_solution(self, tol=1E-9):
+        """ Checks if the last fluxes are optimal for the current bounds.
+
+        If every changed bound of the split variables is non-binding at the last
+        solution and the fluxes are feasible for the changed bounds, the optimal
+        dual solution is unchanged and the fluxes are still optimal
+        (for pfba in both stages).
+
+        :param tol: tolerance for binding bounds and feasibility
+        :return: True if the last fluxes can be reused
+        """
+        if self.fluxes is None or self._solution_lb is None:
+            return False
+        lb, ub = self.reaction_lb, self.reaction_ub
+        lb_old, ub_old = self._solution_lb, self._solution_ub
+        if np.array_equal(lb, lb_old) and np.array_equal(ub, ub_old):
+            return True
+
+        # split variables: forward [max(lb, 0), max(ub, 0)], reverse [max(-ub, 0), max(-lb, 0)]
+        forward = np.maximum(self.fluxes, 0.0)
+        reverse = np.maximum(-self.fluxes, 0.0)
+        for x, old, new, lower in (
+                (forward, np.maximum(lb_old, 0.0), np.maximum(lb, 0.0), True),
+                (forward, np.maximum(ub_old, 0.0), np.maximum(ub, 0.0), False),
+                (reverse, np.maximum(-ub_old, 0.0), np.maximum(-ub, 0.0), True),
+                (reverse, np.maximum(-lb_old, 0.0), np.maximum(-lb, 0.0), False)):
+            changed = old != new
+            if not np.any(changed):
+                continue
+            x, old, new = x[changed], old[changed], new[changed]
+            if np.any(np.abs(x - old) <= tol):
+                return False
+            infeasible = x < new - tol if lower else x > new + tol
+            if np.any(infeasible):
+                return False
+        return True
+
+    def _solve_lp(self):
+        """ Solves the FBA (and pFBA) problem with the LP solver.
+
+        The LP is warm started from the last basis. The bases of the solutions
+        are stored for the fast path.
+        """
+        fba_fluxes = None
+        fba_duals, pfba_duals = None, None
+        fast_path = self.fast_path is not None
+        if self.lp_backend is not None:
+            fba_fluxes, self.fluxes = self.lp_backend.solve(self.reaction_lb, self.reaction_ub)
+            if fast_path:
+                fba_duals = self.lp_backend.fba_duals()
+                if self.pfba:
+                    pfba_duals = self.lp_backend.pfba_duals()
+            self.timer.lap('lp')
+            if self.pfba and self.check_uniqueness:
+                # LP at the current optimum for the flux variability analysis
+                self.pfba_problem.fix_optimum(self.lp_backend.optimum)
+        elif self.pfba:
+            # run pfba on the persistent pfba formulation
+            self.pfba_problem.optimize_fba()
+            if fast_path:
+                fba_fluxes = self.flux_extractor.fluxes()
+                fba_duals = self.flux_extractor.fba_duals(self.objective_direction)
+            self.timer.lap('lp')
+            self.pfba_problem.optimize_pfba()
+            self.fluxes = self.flux_extractor.fluxes()
+            if fast_path:
+                pfba_duals = self.flux_extractor.pfba_duals(self.objective_direction)
+            self.timer.lap('pfba')
         else:
             # run fba
-            solution = self.cobra_model.optimize()
-            fva = fva_analysis(self.cobra_model, solution)
+            self.cobra_model.solver.optimize()
+            self.fluxes = self.flux_extractor.fluxes()
+            if fast_path:
+                fba_duals = self.flux_extractor.fba_duals(self.objective_direction)
+            self.timer.lap('lp')
+
+        if fast_path:
+            if fba_fluxes is None:
+                fba_fluxes = self.fluxes
+            self.fast_path.update(self.reaction_lb, self.reaction_ub, fba_fluxes, self.fluxes,
+                                  fba_duals=fba_duals, pfba_duals=pfba_duals)
+            self.timer.lap('lp')
+
+    def _solve_fast_path(self):
+        """ Solves the FBA (and pFBA) problem from the last optimal basis.
+
+        :return: True if the last basis is optimal for the current bounds
+        """
+        lb, ub = self.reaction_lb, self.reaction_ub
+        res = self.fast_path.solve_fba(lb, ub)
+        self.timer.lap('lp')
+        if res is None:
+            return False
+        fluxes, optimum = res
+        if self.pfba:
+            fluxes = self.fast_path.solve_pfba(lb, ub, optimum)
+            self.timer.lap('pfba')
+            if fluxes is None:
+                return False
             if self.check_uniqueness:
-                fva = cobra.flux_analysis.flux_variability_analysis(self.cobra_model)
-
-        self.fba_solution = solution
-        self.fluxes = solution.fluxes
-        self.fva = fva
-
-        logging.debug(solution.fluxes)
+                # LP at the current optimum for the flux variability analysis
+                self.pfba_problem.fix_optimum(optimum)
 
+        self.fluxes = fluxes
+        return True
 
     @staticmethod
     def get_fluxes_vector(model, reactions=None):
         """
         Generates fast solution representation of the current solver state.
 
-        """
-        cobra.core.model.check_solver_status(model.solver.status)
-        if reactions is None:
-            reactions = model.reactions
-
-        # FIXME: calculate order once and reuse it
-        rxn_index = [rxn.id for rxn in reactions]
-        var_primals = dict(zip(model.solver._get_variables_names(),
-                               model.solver._get_primal_values()))
-        fluxes = {}
-        for (i, rxn) in enumerate(reactions):
-            fluxes[rxn_index[i]] = var_primals[rxn.id] - var_primals[rxn.reverse_id]
+        For repeated calls create a FluxExtractor once and reuse it.
 
-        return fluxes
+        :return: dict of fluxes {rid: flux}
+        """
+        extractor = FluxExtractor(model, reactions=reactions)
+        return dict(zip(extractor.reaction_ids, extractor.fluxes()))
 
     def _set_fba_bounds(self, row):
         """ Set FBA bounds from kinetic model.
 
-        Uses the global bound replacements to update the bounds of the FBA reactions.
-        The parameters are read from the kinetic model.
+        Uses the global bound replacements to update the bounds of the FBA reactions
+        of the first submodel (see SubmodelSolver.read_bounds).
+        The parameters are read from the kinetic model results.
 
-        :param model:
-        :type model:
+        :param row: ode result row
         :return:
-        :rtype:
         """
         logging.debug('* FBA set bounds ')
-
-        # FIXME: unify in one inline function, set upper and lower bounds at once
-        # upper bounds
-        for top_pid, rid in self.fba_model.ub_pid2rid.items():
-            reaction = self.fba_model.cobra_model.reactions.get_by_id(rid)
-
-            # lookup from ode results
-            index = self.columns[top_pid]
-            ub = row[index]
-            # lookup from model
-            # ub = self.ode_model[top_pid]
-
-            if abs(ub) <= self.abs_tol:
-                ub = 0.0
-                logging.info('\tupper: {:<10} = {} set to 0.0'.format(top_pid, ub))
-            reaction.upper_bound = ub
-            logging.debug('\tupper: {:<10} = {}'.format(top_pid, ub))
-
-        # lower bounds
-        for top_pid, rid in self.fba_model.lb_pid2rid.items():
-            reaction = self.fba_model.cobra_model.reactions.get_by_id(rid)
-
-            # lookup from ode results
-            index = self.columns[top_pid]
-            lb = row[index]
-            # lookup from model
-            # lb = self.ode_model[top_pid]
-            if abs(lb) <= self.abs_tol:
-                lb = 0.0
-                logging.info('\tlower: {:<10} = {} set to 0.0'.format(top_pid, lb))
-
-            reaction.lower_bound = lb
-            logging.debug('\tlower: {:<10} = {}'.format(top_pid, lb))
-
+        self.fba_solver.read_bounds(row)
+        if self.lp_backend is not None and not self.check_uniqueness:
+            # the cobra model is not used
+            return
+        self.fba_solver.set_variable_bounds()
 
     def _set_fluxes(self):
         """ Set fluxes in ODE part.
 
         Based on replacements the FBA fluxes are written in the kinetic flattended model.
-        :param ode_model:
-        :type ode_model:
-        :return:
-        :rtype:
+        Reaction rates cannot be set directly in roadrunner, so the flux parameters
+        are set. All flux parameters are written with a single indexed setter call.
+
+        :return: True if the flux parameters changed
         """
         logging.debug("* ODE set FBA fluxes")
 
-        for top_pid, fba_rid in self.parameter2flux.items():
-            # reaction rates cannot be set directly in roadrunner
-            # parameters have to be set manually
-            self.ode_model[top_pid] = self.fluxes[fba_rid]
-            logging.debug('\t{:<10}: {:<10} = {}'.format(top_pid, fba_rid, self.fluxes[fba_rid]))
+        values = np.concatenate([solver.flux_values() for solver in self.fba_solvers])
+        changed = self._flux_values is None or not np.array_equal(values, self._flux_values)
+        if changed:
+            self.ode_model.model.setGlobalParameterValues(self._flux_parameter_model_index, values)
+            self._flux_values = values
+        if self._debug:
+            logging.debug('\t{}'.format(dict(zip(self._flux_parameters, values))))
+        return changed
 
 
 def analyse_uniqueness(dfba_simulator, filepath=None):
@@ -472,20 +1288,21 @@ def analyse_uniqueness(dfba_simulator, filepath=None):
     :param dfba_simulator:
     :return:
     """
-    # print(dfba_simulator.all_fva)
-    # print(dfba_simulator.unique.T)
     if not np.all(dfba_simulator.unique):
         print("* DFBA Solution is NOT UNIQUE *")
-        # print(dfba_simulator.all_fva)
     else:
         print("* DFBA Solution is UNIQUE *")
 
-    # create the uniqueness plots for the simulation
-
-    res = pd.concat(dfba_simulator.all_fva, axis=1, keys=dfba_simulator.solution.time)
-    # print(res)
-    # print(res.xs('R1', level='time'))
+    # reactions with flux variability in any time point
+    result = dfba_simulator.result
+    variability = result.variability()
+    if variability is not None:
+        variable = np.any(variability > 1E-6, axis=0)
+        rids = [rid for rid, v in zip(result.reaction_ids, variable) if v]
+        if rids:
+            print("Reactions with flux variability: {}".format(rids))
 
+    # create the uniqueness plots for the simulation
     if False:
         fig = plt.figure(1)
         fig, (ax1) = plt.subplots(nrows=1, ncols=1, figsize=(7, 7))
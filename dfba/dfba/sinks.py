@@ -0,0 +1,163 @@
+"""
+Sinks for streaming the results of long DFBA simulations.
+
+The simulator writes the rows to the sink in chunks while the simulation
+runs, so only the rows of one flush interval are kept in memory and the
+rows written before a crash are kept.
+"""
+import abc
+
+import numpy as np
+import pandas as pd
+
+
+class ResultSink(abc.ABC):
+    """ Base class of result sinks.
+
+    Rows are written in chunks of 2D arrays (rows x columns), the columns are
+    the timecourse selections of the simulation.
+    """
+
+    def __init__(self, path):
+        """ Create the sink.
+
+        :param path: output file
+        """
+        self.path = path
+        self.columns = None
+        self.n = 0  # number of written rows
+
+    def open(self, columns):
+        """ Opens the sink for a simulation.
+
+        :param columns: column names, i.e. the timecourse selections
+        """
+        self.columns = list(columns)
+        self.n = 0
+
+    def write(self, data):
+        """ Writes a chunk of rows.
+
+        :param data: 2D numpy array (rows x columns)
+        """
+        self._write(data)
+        self.n += data.shape[0]
+
+    @abc.abstractmethod
+    def _write(self, data):
+        """ Writes the rows to the file. """
+
+    def close(self):
+        """ Closes the sink, all written rows are persisted. """
+        pass
+
+    @abc.abstractmethod
+    def read(self):
+        """ Reads the written results.
+
+        :return: pandas DataFrame
+        """
+
+
+class CSVSink(ResultSink):
+    """ Chunked CSV file, same format as DFBAAnalysis.save_csv. """
+
+    def __init__(self, path, sep="\t"):
+        ResultSink.__init__(self, path)
+        self.sep = sep
+        self._f = None
+
+    def open(self, columns):
+        ResultSink.open(self, columns)
+        self._f = open(self.path, 'w')
+        self._f.write(self.sep.join(self.columns) + '\n')
+        self._f.flush()
+
+    def _write(self, data):
+        np.savetxt(self._f, data, delimiter=self.sep, fmt='%.17g')
+        self._f.flush()
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+
+    def read(self):
+        return pd.read_csv(self.path, sep=self.sep)
+
+
+class HDF5Sink(ResultSink):
+    """ HDF5 table, appended per chunk. Requires pytables. """
+
+    def __init__(self, path, key='dfba'):
+        ResultSink.__init__(self, path)
+        self.key = key
+        self._store = None
+
+    def open(self, columns):
+        ResultSink.open(self, columns)
+        self._store = pd.HDFStore(self.path, mode='w')
+
+    def _write(self, data):
+        df = pd.DataFrame(data, columns=self.columns, index=np.arange(self.n, self.n + data.shape[0]))
+        self._store.append(self.key, df, format='table')
+        self._store.flush()
+
+    def close(self):
+        if self._store is not None:
+            self._store.close()
+            self._store = None
+
+    def read(self):
+        return pd.read_hdf(self.path, key=self.key)
+
+
+class ParquetSink(ResultSink):
+    """ Parquet file with one row group per chunk. Requires pyarrow. """
+
+    def __init__(self, path, compression='snappy'):
+        ResultSink.__init__(self, path)
+        self.compression = compression
+        self._writer = None
+        self._schema = None
+
+    def open(self, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        ResultSink.open(self, columns)
+        self._schema = pa.schema([(c, pa.float64()) for c in self.columns])
+        self._writer = pq.ParquetWriter(self.path, self._schema, compression=self.compression)
+
+    def _write(self, data):
+        import pyarrow as pa
+
+        arrays = [pa.array(data[:, k]) for k in range(data.shape[1])]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def read(self):
+        return pd.read_parquet(self.path)
+
+
+def create_sink(path, **kwargs):
+    """ Sink for the file extension of the path (.csv, .tsv, .h5, .hdf5, .parquet).
+
+    :param path: output file
+    :return: ResultSink
+    """
+    ext = path.rsplit('.', 1)[-1].lower()
+    if ext == 'csv':
+        kwargs.setdefault('sep', ',')
+        return CSVSink(path, **kwargs)
+    elif ext == 'tsv':
+        return CSVSink(path, **kwargs)
+    elif ext in ('h5', 'hdf5', 'hdf'):
+        return HDF5Sink(path, **kwargs)
+    elif ext in ('parquet', 'pq'):
+        return ParquetSink(path, **kwargs)
+    raise ValueError("No result sink for file: {}".format(path))
@@ -0,0 +1,317 @@
+"""
+FBA submodels of DFBA simulations.
+
+Every FBA submodel, e.g. the organisms of a community or the tissues of a
+multi-tissue model, is coupled via its own bound parameters and flux
+parameters. The bounds, fluxes and active sets of all submodels are handled
+by a SubmodelSolver. The simulator solves the LP of the first submodel itself
+(fast path, uniqueness checks). Within a time step the LPs of the submodels are
+independent, so the further submodels are solved on a pool of worker processes
+while the simulator solves the LP of the first submodel.
+"""
+import pickle
+import logging
+import multiprocessing
+
+import numpy as np
+
+from sbmlutils.dfba.lp import PFBAProblem, FluxExtractor, VariableBounds, set_fba_objective
+from sbmlutils.dfba.highs import HighsLP, HIGHS_SOLVER_ID
+
+# state of the worker process
+_solvers = None
+
+
+class SubmodelSolver(object):
+    """ Bounds, LP and flux write-back of a single FBA submodel.
+
+    Only the cobra model and the mappings of the FBAModel are kept, so the
+    solver can be pickled for the worker processes.
+    """
+
+    def __init__(self, fba_model, flux_rules, lp_solver='glpk', pfba=True, abs_tol=1E-6):
+        """ Create the solver.
+
+        :param fba_model: FBAModel
+        :param flux_rules: flux rules of the DFBAModel {top rid: flux parameter}
+        :param lp_solver: solver to use for the lp problem (glpk, cplex, gurobi, highs)
+        :param pfba: perform minimal flux simulation
+        :param abs_tol: bound values below are set to zero
+        """
+        self.cobra_model = fba_model.cobra_model
+        # with the HiGHS backend the cobra model is only used for the uniqueness checks
+        self.cobra_model.solver = 'glpk' if lp_solver == HIGHS_SOLVER_ID else lp_solver
+        self.pfba = pfba
+        self.abs_tol = abs_tol
+        self.fluxes = None  # last LP fluxes (numpy array in order of flux_extractor.reaction_ids)
+
+        # FBA objective of the model, the solver objective is changed by pfba
+        self.objective_coefficients = fba_model.objective_coefficients
+        self.objective_direction = fba_model.cobra_objective_direction
+        self.pfba_problem = None
+        if pfba:
+            self.pfba_problem = PFBAProblem(self.cobra_model, objective_coefficients=self.objective_coefficients,
+                                            direction=self.objective_direction)
+        else:
+            set_fba_objective(self.cobra_model, self.objective_coefficients, self.objective_direction)
+        self.flux_extractor = FluxExtractor(self.cobra_model)
+        self.lp_backend = None
+        if lp_solver == HIGHS_SOLVER_ID:
+            coefficients = np.array([self.objective_coefficients.get(rid, 0.0)
+                                     for rid in self.flux_extractor.reaction_ids], dtype=np.float64)
+            self.lp_backend = HighsLP(self.cobra_model, coefficients, direction=self.objective_direction, pfba=pfba)
+
+        # flux parameters in the ode model, the fluxes are indexed by the FBA reaction ids
+        rids = sorted(fba_model.fba2top_reactions.keys())
+        self.flux_parameters = [flux_rules[fba_model.fba2top_reactions[rid]] for rid in rids]
+        self._flux_parameter_index = np.array([self.flux_extractor.index[rid] for rid in rids],
+                                              dtype=np.intp)
+
+        # bound reactions
+        self.ub_pid2rid = fba_model.ub_pid2rid
+        self.lb_pid2rid = fba_model.lb_pid2rid
+        self.bound_rids = sorted(set(self.ub_pid2rid.values()) | set(self.lb_pid2rid.values()))
+        # bound parameters are read from the ode results via the top parameters
+        self.fba2top_bounds = fba_model.fba2top_bounds
+        self.top2flat_reactions = fba_model.top2flat_reactions
+        self.store_rids = list(self.top2flat_reactions.keys())
+        self._ub_pids = list(self.ub_pid2rid.keys())
+        self._lb_pids = list(self.lb_pid2rid.keys())
+        self._ub_columns = None
+        self._lb_columns = None
+        self._store_columns = None
+        self._store_flux_index = None
+        self._debug = False
+        self._bound_flux_index = np.array([self.flux_extractor.index[rid] for rid in self.bound_rids],
+                                          dtype=np.intp)
+        self._init_bounds()
+
+        # solver variables of the split reactions
+        self._variable_bounds = self._create_variable_bounds()
+
+    def _init_bounds(self):
+        """ Bounds of the cobra model for the bound reactions and all reactions.
+
+        The cobra reaction bounds are not changed by the simulation (the bounds are
+        set on the solver variables), so these are the static bounds.
+        """
+        rid2index = {rid: k for k, rid in enumerate(self.bound_rids)}
+        reactions = [self.cobra_model.reactions.get_by_id(rid) for rid in self.bound_rids]
+        # current bounds of the bound reactions (static bounds are kept)
+        self.lower_bounds = np.array([r.lower_bound for r in reactions], dtype=np.float64)
+        self.upper_bounds = np.array([r.upper_bound for r in reactions], dtype=np.float64)
+        self._ub_reactions = np.array([rid2index[self.ub_pid2rid[pid]] for pid in self._ub_pids], dtype=np.intp)
+        self._lb_reactions = np.array([rid2index[self.lb_pid2rid[pid]] for pid in self._lb_pids], dtype=np.intp)
+        self._ub_zero = np.zeros(len(self._ub_pids), dtype=bool)
+        self._lb_zero = np.zeros(len(self._lb_pids), dtype=bool)
+
+        # current bounds of all reactions in order of the fluxes
+        all_reactions = [self.cobra_model.reactions.get_by_id(rid) for rid in self.flux_extractor.reaction_ids]
+        self.reaction_lb = np.array([r.lower_bound for r in all_reactions], dtype=np.float64)
+        self.reaction_ub = np.array([r.upper_bound for r in all_reactions], dtype=np.float64)
+
+    def _create_variable_bounds(self):
+        reactions = [self.cobra_model.reactions.get_by_id(rid) for rid in self.bound_rids]
+        return VariableBounds(self.cobra_model,
+                              [r.forward_variable for r in reactions] + [r.reverse_variable for r in reactions])
+
+    def __getstate__(self):
+        # solver objects are created again for the unpickled cobra model
+        state = self.__dict__.copy()
+        for key in ('pfba_problem', 'flux_extractor', '_variable_bounds'):
+            del state[key]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.pfba_problem = None
+        if self.pfba:
+            self.pfba_problem = PFBAProblem(self.cobra_model, objective_coefficients=self.objective_coefficients,
+                                            direction=self.objective_direction)
+        self.flux_extractor = FluxExtractor(self.cobra_model)
+        self._variable_bounds = self._create_variable_bounds()
+
+    def restore_objective(self):
+        """ Restores the FBA objective of the shared cobra model, see PFBAProblem.restore. """
+        if self.pfba_problem is not None:
+            self.pfba_problem.restore()
+
+    def setup(self, columns):
+        """ Precompute the lookups of bound parameters and stored fluxes in the ode results.
+
+        The bounds are reset to the static bounds of the cobra model.
+
+        :param columns: dict {selection: column} of the timecourse selections
+        """
+        self._init_bounds()
+        fba2top = self.fba2top_bounds
+        self._ub_columns = np.array([columns[fba2top[pid]] for pid in self._ub_pids], dtype=np.intp)
+        self._lb_columns = np.array([columns[fba2top[pid]] for pid in self._lb_pids], dtype=np.intp)
+        top2flat = self.top2flat_reactions
+        self._store_columns = np.array([columns[top2flat[rid]] for rid in self.store_rids], dtype=np.intp)
+        self._store_flux_index = np.array([self.flux_extractor.index[rid] for rid in self.store_rids],
+                                          dtype=np.intp)
+        self._debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+
+    def read_bounds(self, row):
+        """ Reads the bounds of the bound reactions from the ode row.
+
+        Values close to zero are set to zero. The bounds of all reactions
+        (reaction_lb, reaction_ub) are updated, the solver is not changed.
+
+        :param row: ode result row
+        :return: (lower bounds, upper bounds) of the bound reactions
+        """
+        ub = row[self._ub_columns]
+        ub_zero = np.abs(ub) <= self.abs_tol
+        ub[ub_zero] = 0.0
+        lb = row[self._lb_columns]
+        lb_zero = np.abs(lb) <= self.abs_tol
+        lb[lb_zero] = 0.0
+
+        if np.any(ub_zero) or np.any(lb_zero):
+            logging.info('\tbounds set to 0.0: {}'.format(
+                [pid for pid, zero in zip(self._ub_pids, ub_zero) if zero] +
+                [pid for pid, zero in zip(self._lb_pids, lb_zero) if zero]))
+        if self._debug:
+            logging.debug('\tupper: {}'.format(dict(zip(self._ub_pids, ub))))
+            logging.debug('\tlower: {}'.format(dict(zip(self._lb_pids, lb))))
+
+        self.upper_bounds[self._ub_reactions] = ub
+        self.lower_bounds[self._lb_reactions] = lb
+        self.reaction_ub[self._bound_flux_index] = self.upper_bounds
+        self.reaction_lb[self._bound_flux_index] = self.lower_bounds
+        self._ub_zero = ub_zero
+        self._lb_zero = lb_zero
+        return self.lower_bounds.copy(), self.upper_bounds.copy()
+
+    def set_variable_bounds(self):
+        """ Sets the current bounds on the solver variables of the split reactions.
+
+        Bounds are written directly on the forward and reverse variables of the
+        solver and are not synchronized with the cobra reaction bounds.
+        """
+        #   forward: [max(lb, 0), max(ub, 0)], reverse: [max(-ub, 0), max(-lb, 0)]
+        lower = np.concatenate([np.maximum(self.lower_bounds, 0.0), np.maximum(-self.upper_bounds, 0.0)])
+        upper = np.concatenate([np.maximum(self.upper_bounds, 0.0), np.maximum(-self.lower_bounds, 0.0)])
+        self._variable_bounds.set_bounds(lower.tolist(), upper.tolist())
+
+    def solve(self, lower_bounds, upper_bounds):
+        """ Sets the bounds of the bound reactions and optimizes the submodel.
+
+        :param lower_bounds: lower bounds of the bound reactions
+        :param upper_bounds: upper bounds of the bound reactions
+        :return: fluxes in order of flux_extractor.reaction_ids
+        """
+        self.lower_bounds[:] = lower_bounds
+        self.upper_bounds[:] = upper_bounds
+        self.reaction_lb[self._bound_flux_index] = lower_bounds
+        self.reaction_ub[self._bound_flux_index] = upper_bounds
+        if self.lp_backend is not None:
+            _, self.fluxes = self.lp_backend.solve(self.reaction_lb, self.reaction_ub)
+            return self.fluxes
+
+        self.set_variable_bounds()
+        if self.pfba:
+            self.pfba_problem.optimize_fba()
+            self.pfba_problem.optimize_pfba()
+        else:
+            self.cobra_model.solver.optimize()
+        self.fluxes = self.flux_extractor.fluxes()
+        return self.fluxes
+
+    def flux_values(self):
+        """ Values of the flux parameters for the last fluxes. """
+        return self.fluxes[self._flux_parameter_index]
+
+    def store_fluxes(self, row):
+        """ Stores the last fluxes in the ode row. """
+        row[self._store_columns] = self.fluxes[self._store_flux_index]
+        if self._debug:
+            logging.debug("\t{}".format(dict(zip(self.store_rids, row[self._store_columns]))))
+
+    def active_set(self, tol):
+        """ Active set of the last solution.
+
+        Fluxes at their lower or upper bounds, bound parameters set to zero and
+        for pfba zero fluxes.
+
+        :param tol: tolerance for fluxes at bounds
+        :return: boolean numpy array
+        """
+        fluxes = self.fluxes
+        active = [
+            np.abs(fluxes - self.reaction_lb) <= tol,
+            np.abs(fluxes - self.reaction_ub) <= tol,
+            self._lb_zero,
+            self._ub_zero,
+        ]
+        if self.pfba:
+            active.append(np.abs(fluxes) <= tol)
+        return np.concatenate(active)
+
+
+def _init_worker(solvers_pickle):
+    global _solvers
+    _solvers = pickle.loads(solvers_pickle)
+
+
+def _worker_solve(task):
+    k, lower_bounds, upper_bounds = task
+    return k, _solvers[k].solve(lower_bounds, upper_bounds)
+
+
+class SubmodelPool(object):
+    """ Solves the LPs of the submodels of a time step concurrently.
+
+    Every worker process holds copies of all submodels, per time step only
+    the bounds are sent to the workers and the fluxes are returned.
+    Without worker processes the submodels are solved in the main process.
+    """
+
+    def __init__(self, solvers, processes=1):
+        """ Starts the worker processes.
+
+        :param solvers: list of SubmodelSolver
+        :param processes: number of worker processes
+        """
+        self.solvers = solvers
+        self.processes = processes
+        self.pool = None
+        self._pending = None
+        if processes > 1 and len(solvers) > 0:
+            self.pool = multiprocessing.Pool(processes=processes, initializer=_init_worker,
+                                             initargs=(pickle.dumps(solvers),))
+
+    def submit(self, row):
+        """ Starts solving the submodels with the bounds of the ode row.
+
+        :param row: ode result row
+        """
+        tasks = [(k, ) + solver.read_bounds(row) for k, solver in enumerate(self.solvers)]
+        if self.pool is not None:
+            self._pending = self.pool.map_async(_worker_solve, tasks)
+        else:
+            self._pending = tasks
+
+    def wait(self):
+        """ Waits for the fluxes of the submitted submodels.
+
+        :return: list of fluxes in order of the solvers
+        """
+        if self.pool is not None:
+            results = self._pending.get()
+        else:
+            results = [(k, self.solvers[k].solve(lb, ub)) for k, lb, ub in self._pending]
+        self._pending = None
+        for k, fluxes in results:
+            self.solvers[k].fluxes = fluxes
+        logging.debug("* FBA submodels solved: {}".format(len(results)))
+        return [solver.fluxes for solver in self.solvers]
+
+    def close(self):
+        """ Stops the worker processes. """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
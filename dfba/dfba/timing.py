@@ -0,0 +1,86 @@
+"""
+Timing of the phases of DFBA simulations.
+
+The wall time of every phase is accumulated per step in a NumPy array,
+which gives an overview where a simulation spends its time without a profiler.
+"""
+from timeit import default_timer
+
+import numpy as np
+import pandas as pd
+
+# phases of a DFBA step
+PHASES = ['bounds', 'lp', 'pfba', 'fva', 'fluxes', 'ode', 'store']
+
+
+class PhaseTimer(object):
+    """ Wall time per step and phase.
+
+    The time since the last lap is added to the given phase of the current step.
+    """
+
+    def __init__(self, capacity=1, phases=PHASES):
+        """ Create the timer.
+
+        :param capacity: initial number of steps
+        :param phases: names of the phases
+        """
+        self.phases = list(phases)
+        self.index = {phase: k for k, phase in enumerate(self.phases)}
+        self.times = np.zeros(shape=(max(int(capacity), 1), len(self.phases)), dtype=np.float64)
+        self.k = 0  # current step
+        self.n = 0  # number of steps
+        self._t = default_timer()
+
+    def step(self, k):
+        """ Starts timing of step k.
+
+        :param k: step index
+        """
+        capacity = self.times.shape[0]
+        if k >= capacity:
+            times = np.zeros(shape=(max(2 * capacity, k + 1), len(self.phases)), dtype=np.float64)
+            times[:capacity] = self.times
+            self.times = times
+        self.k = k
+        self.n = max(self.n, k + 1)
+        self._t = default_timer()
+
+    def lap(self, phase):
+        """ Adds the time since the last lap to the phase.
+
+        :param phase: name of the phase
+        """
+        t = default_timer()
+        self.times[self.k, self.index[phase]] += t - self._t
+        self._t = t
+
+    def reset(self):
+        """ Restarts the lap without adding the time to a phase. """
+        self._t = default_timer()
+
+    def to_dataframe(self, index=None):
+        """ Times of the steps.
+
+        :param index: optional index, e.g. time points of the steps
+        :return: pandas DataFrame (steps x phases)
+        """
+        times = self.times[:self.n]
+        if index is not None:
+            index = index[:self.n]
+        return pd.DataFrame(data=times, columns=self.phases, index=index)
+
+    def summary(self):
+        """ Summary statistics of the phases.
+
+        :return: pandas DataFrame with total, mean, max [s] and percent of the phases
+        """
+        times = self.times[:self.n]
+        total = times.sum(axis=0)
+        tot_time = total.sum()
+        return pd.DataFrame({
+            'total': total,
+            'mean': times.mean(axis=0) if self.n else total,
+            'max': times.max(axis=0) if self.n else total,
+            'percent': 100.0 * total / tot_time if tot_time > 0 else total,
+        }, index=self.phases, columns=['total', 'mean', 'max', 'percent'])
@@ -0,0 +1,122 @@
+"""
+Uniqueness of FBA solutions in DFBA simulations.
+
+A full flux variability analysis (FVA) requires two LPs per reaction
+and time step. Most fluxes can be proven unique from the optimality
+certificate of the solution (reduced costs), only the remaining
+reactions are checked with FVA.
+"""
+import logging
+
+import numpy as np
+import cobra
+
+from sbmlutils.dfba.results import FVA_COLUMNS
+
+
+class UniquenessChecker(object):
+    """ Uniqueness test for the fluxes of an optimal FBA solution.
+
+    1. Pinned fluxes: fluxes with a nonzero reduced cost are identical in all
+       optimal solutions (complementary slackness).
+    2. Null space: the remaining fluxes are determined by the pinned fluxes and
+       the steady state S*v = 0. A flux is unique if it does not vary in the
+       null space of the stoichiometric columns of the remaining reactions.
+    3. FVA on the reactions which could not be proven unique.
+
+    The result is an array with the columns FVA_COLUMNS, i.e. the minimum and
+    maximum of cobra.flux_analysis.flux_variability_analysis and the flux.
+    """
+
+    def __init__(self, cobra_model, reaction_ids, S=None, tol=1E-9):
+        """ Create the checker.
+
+        :param cobra_model: cobra model with the LP of the last solution
+        :param reaction_ids: reaction ids in order of the flux vectors
+        :param S: dense stoichiometric matrix in order of the reaction ids,
+            if None the null space test is skipped
+        :param tol: tolerance of the certificates
+        """
+        self.cobra_model = cobra_model
+        self.reaction_ids = list(reaction_ids)
+        self.S = S
+        self.tol = tol
+        self.fva_pool = None  # FVAPool for parallel FVA
+        self._free_key = None  # reactions of the last null space test
+        self._unique_free = None
+
+        self.n_checked = 0  # reactions checked
+        self.n_fva = 0  # reactions checked with FVA
+
+    def reset(self):
+        """ Resets the counters. """
+        self.n_checked = 0
+        self.n_fva = 0
+
+    def unique_fluxes(self, pinned):
+        """ Fluxes which are proven to be unique.
+
+        :param pinned: boolean numpy array of pinned fluxes
+        :return: boolean numpy array
+        """
+        unique = pinned.copy()
+        if self.S is None or np.all(pinned):
+            return unique
+
+        free = ~pinned
+        key = np.packbits(free).tobytes()
+        if key != self._free_key:
+            self._free_key = key
+            self._unique_free = self._null_space_unique(self.S[:, free])
+        unique[free] = self._unique_free
+        return unique
+
+    def _null_space_unique(self, S_free):
+        """ Columns which do not vary in the null space of S_free.
+
+        The flux of column j is unique if the unit vector e_j lies in the row
+        space of S_free, i.e. the squared norm of column j of the right singular
+        vectors V_r of the rank r is one. The thin SVD suffices for V_r.
+
+        :param S_free: stoichiometric columns of the reactions which are not pinned
+        :return: boolean numpy array
+        """
+        _, s, vh = np.linalg.svd(S_free, full_matrices=False)
+        rank = np.sum(s > self.tol * max(S_free.shape) * (s[0] if len(s) else 1.0))
+        row_space = vh[:rank]
+        return 1.0 - np.sum(row_space * row_space, axis=0) <= self.tol
+
+    def check(self, fluxes, pinned, lb=None, ub=None, out=None):
+        """ Minimal and maximal fluxes of all optimal solutions.
+
+        FVA is only performed for reactions which are not proven unique,
+        it uses the current objective of the cobra model or the FVAPool.
+
+        :param fluxes: fluxes of the optimal solution
+        :param pinned: boolean numpy array of pinned fluxes
+        :param lb: lower bounds of reactions, required for the FVAPool
+        :param ub: upper bounds of reactions, required for the FVAPool
+        :param out: optional array (reactions x FVA_COLUMNS) for the results
+        :return: numpy array (reactions x FVA_COLUMNS)
+        """
+        if out is None:
+            out = np.empty(shape=(len(self.reaction_ids), len(FVA_COLUMNS)), dtype=np.float64)
+        out[:, 0] = fluxes
+        out[:, 1] = fluxes
+        out[:, 2] = fluxes
+
+        unique = self.unique_fluxes(pinned)
+        indices = np.flatnonzero(~unique)
+        rids = [self.reaction_ids[k] for k in indices]
+        self.n_checked += len(self.reaction_ids)
+        self.n_fva += len(rids)
+        if rids:
+            logging.debug("FVA for {} reactions".format(len(rids)))
+            if self.fva_pool is not None:
+                minimum, maximum = self.fva_pool.fva(rids, fluxes, lb, ub)
+            else:
+                res = cobra.flux_analysis.flux_variability_analysis(self.cobra_model, reaction_list=rids)
+                minimum, maximum = res.loc[rids, 'minimum'].values, res.loc[rids, 'maximum'].values
+            out[indices, 0] = minimum
+            out[indices, 1] = maximum
+        return out
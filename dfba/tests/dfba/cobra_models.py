@@ -0,0 +1,40 @@
+"""
+Small cobra models for the tests of the LP helpers.
+"""
+import cobra
+
+
+def create_reaction(model, rid, stoichiometry, lower_bound=0.0, upper_bound=1000.0):
+    """ Adds a reaction to the model.
+
+    :param model: cobra model
+    :param rid: reaction id
+    :param stoichiometry: dict {metabolite id: coefficient}
+    :return: reaction
+    """
+    reaction = cobra.Reaction(rid)
+    reaction.lower_bound = lower_bound
+    reaction.upper_bound = upper_bound
+    model.add_reactions([reaction])
+    reaction.add_metabolites({model.metabolites.get_by_id(mid): value for mid, value in stoichiometry.items()})
+    return reaction
+
+
+def create_branched_model(uptake=10.0):
+    """ Model with two pathways from the substrate A to the precursor B of the biomass.
+
+    A -> B (R1) and A -> C <-> B (R2, R3), the biomass flux is maximized.
+    FBA has alternative optima, pFBA uses the shorter pathway R1.
+
+    :param uptake: upper bound of the uptake EX_A
+    :return: cobra model
+    """
+    model = cobra.Model('branched')
+    model.add_metabolites([cobra.Metabolite(mid, compartment='c') for mid in ('A', 'B', 'C')])
+    create_reaction(model, 'EX_A', {'A': 1}, upper_bound=uptake)
+    create_reaction(model, 'R1', {'A': -1, 'B': 1})
+    create_reaction(model, 'R2', {'A': -1, 'C': 1})
+    create_reaction(model, 'R3', {'C': -1, 'B': 1}, lower_bound=-1000.0)
+    create_reaction(model, 'BIO', {'B': -1})
+    model.objective = 'BIO'
+    return model
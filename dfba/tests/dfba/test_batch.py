@@ -0,0 +1,45 @@
+"""
+Tests for the batch simulations of the toy model.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.simulator import DFBASimulator
+from sbmlutils.dfba.toy_wholecell import settings
+
+TOY_SBML = os.path.join(settings.OUT_DIR, 'v16', settings.TOP_LOCATION)
+
+CONDITIONS = [
+    {'init([A])': 10.0, 'k_R4': 0.1},
+    {'init([A])': 5.0, 'k_R4': 0.2},
+    {'init([A])': 2.0, 'k_R4': 0.05},
+    # unknown selection, the scenario fails
+    {'init([A])': 5.0, 'no_such_parameter': 1.0},
+]
+
+
+def create_simulator(**kwargs):
+    return DFBASimulator(DFBAModel(sbml_path=TOY_SBML), **kwargs)
+
+
+@pytest.mark.parametrize('n_workers', [1, 2])
+def test_simulate_batch(n_workers):
+    simulator = create_simulator()
+    batch = simulator.simulate_batch(CONDITIONS, n_workers=n_workers, tstart=0.0, tend=10.0, dt=0.5)
+    assert len(batch) == len(CONDITIONS)
+    assert np.array_equal(batch.failed, [False, False, False, True])
+    assert batch.lengths[3] == 0
+
+    # every scenario equals a single simulation with the values of the scenario
+    for k, condition in enumerate(CONDITIONS[:3]):
+        reference = create_simulator()
+        for key, value in condition.items():
+            reference.ode_model.setValue(key, value)
+        df = reference.simulate(tstart=0.0, tend=10.0, dt=0.5, show_settings=False).to_dataframe()
+        scenario = batch.scenario(k).to_dataframe()
+        assert list(scenario.columns) == list(df.columns)
+        assert np.allclose(scenario.values, df.values, equal_nan=True)
+    assert not np.allclose(batch.scenario(0).data, batch.scenario(1).data)
@@ -0,0 +1,52 @@
+"""
+Tests for the model cache.
+"""
+import os
+
+import libsbml
+
+from sbmlutils.dfba.cache import ModelCache, referenced_files
+
+
+def create_files(directory):
+    """ Top model with an external model definition of a second model. """
+    sbmlns = libsbml.SBMLNamespaces(3, 1, 'comp', 1)
+    doc = libsbml.SBMLDocument(sbmlns)
+    doc.setPackageRequired('comp', True)
+    doc.createModel().setId('top')
+    emd = doc.getPlugin('comp').createExternalModelDefinition()
+    emd.setId('fba_emd')
+    emd.setSource('fba.xml')
+    emd.setModelRef('fba')
+    top_path = os.path.join(str(directory), 'top.xml')
+    libsbml.writeSBMLToFile(doc, top_path)
+
+    fba_doc = libsbml.SBMLDocument(3, 1)
+    fba_doc.createModel().setId('fba')
+    fba_path = os.path.join(str(directory), 'fba.xml')
+    libsbml.writeSBMLToFile(fba_doc, fba_path)
+    return top_path, fba_path
+
+
+def test_referenced_files(tmpdir):
+    top_path, fba_path = create_files(tmpdir)
+    files = referenced_files(top_path)
+    assert [path for path, _ in files] == [top_path, fba_path]
+    with open(fba_path, 'rb') as f:
+        assert files[1][1] == f.read()
+
+    doc = libsbml.readSBMLFromFile(top_path)
+    assert referenced_files(top_path, doc=doc) == files
+
+
+def test_cache_key(tmpdir):
+    top_path, fba_path = create_files(tmpdir)
+    cache = ModelCache(cache_dir=os.path.join(str(tmpdir), 'cache'))
+    key = cache.key(top_path)
+    assert cache.key(top_path, doc=libsbml.readSBMLFromFile(top_path)) == key
+
+    # changes of referenced models change the key
+    with open(fba_path, 'ab') as f:
+        f.write(b'\n')
+    assert cache.key(top_path) != key
+    assert cache.load(key) is None
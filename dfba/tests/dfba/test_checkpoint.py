@@ -0,0 +1,64 @@
+"""
+Tests for the checkpoint files.
+"""
+import os
+
+import numpy as np
+
+from sbmlutils.dfba.checkpoint import save_checkpoint, load_checkpoint, checkpoint_seed, rows_path
+
+
+class StateWriter(object):
+    """ Writes a roadrunner state file. """
+
+    def saveState(self, path):
+        with open(path, 'w') as f:
+            f.write('state')
+
+
+def create_rows(start, stop):
+    k = np.arange(start, stop, dtype=np.float64)
+    return {
+        'data': np.column_stack([k, k ** 2]),
+        'time_points': k,
+        'fva': None,
+        'timing': np.ones(shape=(len(k), 2)),
+        'lp_solved': np.ones(shape=(len(k),), dtype=bool),
+    }
+
+
+def test_checkpoint_rows(tmpdir):
+    path = os.path.join(str(tmpdir), 'checkpoint.pickle')
+    rr = StateWriter()
+    size = save_checkpoint(path, {'step': 5}, rr, rows=create_rows(0, 5))
+    size_10 = save_checkpoint(path, {'step': 10}, rr, rows=create_rows(5, 10), rows_offset=size)
+    # the rows file only grows by the new rows
+    assert size_10 < 2.5 * size
+
+    state = load_checkpoint(path)
+    assert state['step'] == 10
+    assert np.allclose(state['data'], create_rows(0, 10)['data'])
+    assert np.allclose(state['time_points'], np.arange(10))
+    assert state['fva'] is None
+    assert os.path.exists(state['rr_state'])
+    assert not os.path.exists(path + '.5.rr')
+
+
+def test_checkpoint_interrupted(tmpdir):
+    path = os.path.join(str(tmpdir), 'checkpoint.pickle')
+    rr = StateWriter()
+    size = save_checkpoint(path, {'step': 5}, rr, rows=create_rows(0, 5))
+    # rows of an interrupted checkpoint are not part of the last checkpoint
+    with open(rows_path(path), 'ab') as f:
+        f.write(b'partial')
+    assert np.allclose(load_checkpoint(path)['time_points'], np.arange(5))
+
+    # and are overwritten by the next checkpoint
+    save_checkpoint(path, {'step': 10}, rr, rows=create_rows(5, 10), rows_offset=size)
+    assert np.allclose(load_checkpoint(path)['time_points'], np.arange(10))
+
+
+def test_checkpoint_seed():
+    assert checkpoint_seed(1, 100) == checkpoint_seed(1, 100)
+    assert checkpoint_seed(1, 100) != checkpoint_seed(1, 200)
+    assert checkpoint_seed(1, 100) != checkpoint_seed(2, 100)
@@ -0,0 +1,101 @@
+"""
+Tests for the streaming statistics of ensembles.
+"""
+import os
+import shutil
+
+import libsbml
+import numpy as np
+
+from sbmlutils.dfba.ensemble import WelfordAccumulator, P2Quantile, replicate_seeds
+from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.simulator import DFBASimulator
+from sbmlutils.dfba.toy_wholecell import settings
+
+TOY_SBML = os.path.join(settings.OUT_DIR, 'v16', settings.TOP_LOCATION)
+
+
+def test_welford():
+    samples = np.random.RandomState(1).normal(loc=2.0, scale=3.0, size=(200, 4, 3))
+    welford = WelfordAccumulator(samples.shape[1:])
+    assert np.all(np.isnan(welford.variance))
+    for x in samples:
+        welford.add(x)
+    assert welford.n == 200
+    assert np.allclose(welford.mean, samples.mean(axis=0))
+    assert np.allclose(welford.variance, samples.var(axis=0, ddof=1))
+
+
+def test_p2_quantile():
+    samples = np.random.RandomState(2).normal(size=(5000, 3, 2))
+    for p in (0.05, 0.5, 0.95):
+        p2 = P2Quantile(p, samples.shape[1:])
+        for x in samples:
+            p2.add(x)
+        assert np.allclose(p2.value, np.percentile(samples, 100.0 * p, axis=0), atol=0.05)
+
+
+def test_p2_quantile_few_samples():
+    samples = np.random.RandomState(3).uniform(size=(4, 2))
+    p2 = P2Quantile(0.5, (2,))
+    assert np.all(np.isnan(p2.value))
+    for x in samples:
+        p2.add(x)
+    assert np.allclose(p2.value, np.median(samples, axis=0))
+
+
+def test_replicate_seeds():
+    assert np.array_equal(replicate_seeds(5, base_seed=7), replicate_seeds(5, base_seed=7))
+    assert len(set(replicate_seeds(100))) == 100
+
+
+def stochastic_sbml(directory):
+    """ Toy model which can be simulated with the gillespie integrator.
+
+    The gillespie integrator does not support rate rules and reactions
+    without kinetic law, so the rate rule of ub_R1 is removed and the
+    FBA reactions get a zero kinetic law (not used by the FBA).
+
+    :param directory: directory for the model files
+    :return: path of the top model
+    """
+    model_dir = os.path.dirname(TOY_SBML)
+    for name in os.listdir(model_dir):
+        if name.endswith('.xml'):
+            shutil.copy(os.path.join(model_dir, name), directory)
+    bounds_path = os.path.join(directory, 'toy_wholecell_bounds.xml')
+    doc = libsbml.readSBMLFromFile(bounds_path)
+    doc.getModel().removeRuleByVariable('ub_R1')
+    libsbml.writeSBMLToFile(doc, bounds_path)
+    fba_path = os.path.join(directory, 'toy_wholecell_fba.xml')
+    doc = libsbml.readSBMLFromFile(fba_path)
+    for reaction in doc.getModel().getListOfReactions():
+        if not reaction.isSetKineticLaw():
+            reaction.createKineticLaw().setMath(libsbml.parseL3Formula('0'))
+    libsbml.writeSBMLToFile(doc, fba_path)
+    return os.path.join(directory, os.path.basename(TOY_SBML))
+
+
+def test_simulate_ensemble(tmpdir):
+    sbml_path = stochastic_sbml(str(tmpdir))
+    simulator = DFBASimulator(DFBAModel(sbml_path=sbml_path), ode_integrator='gillespie')
+    kwargs = dict(tstart=0.0, tend=5.0, dt=0.5)
+    ensemble = simulator.simulate_ensemble(8, base_seed=5, **kwargs)
+    assert ensemble.n == 8
+    assert ensemble.mean.shape == (11, len(ensemble.columns))
+
+    # reproducible for the base seed, independent of the number of workers
+    for n_workers in (1, 2):
+        other = simulator.simulate_ensemble(8, base_seed=5, n_workers=n_workers, **kwargs)
+        assert np.array_equal(other.mean, ensemble.mean)
+        assert np.array_equal(other.variance, ensemble.variance)
+        for p in ensemble.quantiles:
+            assert np.array_equal(other.quantiles[p], ensemble.quantiles[p])
+
+    # statistics of the individual replicates
+    replicates = np.array([simulator.simulate(seed=seed, show_settings=False, **kwargs).data
+                           for seed in replicate_seeds(8, base_seed=5)])
+    assert np.allclose(ensemble.mean, replicates.mean(axis=0))
+    assert np.allclose(ensemble.variance, replicates.var(axis=0, ddof=1))
+    k = ensemble.columns.index('[A]')
+    assert np.any(ensemble.variance[:, k] > 0)
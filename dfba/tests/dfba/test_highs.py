@@ -0,0 +1,55 @@
+"""
+Tests for the HiGHS LP backend.
+"""
+import numpy as np
+import pytest
+from cobra.exceptions import OptimizationError
+
+from sbmlutils.dfba.lp import PFBAProblem, FluxExtractor
+from sbmlutils.dfba.highs import HighsLP
+
+from .cobra_models import create_branched_model
+from .test_lp import solve_lp
+
+
+def create_highs_lp(model, pfba=True):
+    c = np.array([1.0 if r.id == 'BIO' else 0.0 for r in model.reactions])
+    return HighsLP(model, c, direction='max', pfba=pfba)
+
+
+def test_highs_glpk_fluxes():
+    model = create_branched_model()
+    model.solver = 'glpk'
+    pfba_problem = PFBAProblem(model)
+    extractor = FluxExtractor(model)
+    highs_lp = create_highs_lp(create_branched_model())
+
+    lb = np.array([r.lower_bound for r in model.reactions])
+    ub = np.array([r.upper_bound for r in model.reactions])
+    for uptake in (10.0, 8.0, 2.5, 0.0):
+        ub[0] = uptake
+        fba_fluxes, fluxes = solve_lp(model, pfba_problem, extractor, lb, ub)
+        highs_fba_fluxes, highs_fluxes = highs_lp.solve(lb, ub)
+
+        assert abs(highs_lp.optimum - uptake) < 1E-6
+        assert abs(highs_fba_fluxes[-1] - fba_fluxes[-1]) < 1E-6
+        # the pfba solution is unique
+        assert np.allclose(highs_fluxes, fluxes, atol=1E-6)
+        if uptake > 0.0:
+            # without uptake all fluxes are zero and the duals are not unique
+            y, mu = highs_lp.pfba_duals()
+            y_glpk, mu_glpk = extractor.pfba_duals('max')
+            assert np.allclose(y, y_glpk, atol=1E-6)
+            assert abs(mu - mu_glpk) < 1E-6
+
+
+def test_highs_not_optimal():
+    model = create_branched_model()
+    highs_lp = create_highs_lp(model, pfba=False)
+    lb = np.array([r.lower_bound for r in model.reactions])
+    ub = np.array([r.upper_bound for r in model.reactions])
+
+    # minimal biomass flux above the maximal uptake
+    lb[-1] = 20.0
+    with pytest.raises(OptimizationError):
+        highs_lp.solve(lb, ub)
@@ -0,0 +1,143 @@
+"""
+Tests for the LP helpers.
+"""
+import numpy as np
+import cobra
+from cobra.util.array import create_stoichiometric_matrix
+from cobra.util.solver import linear_reaction_coefficients
+
+from sbmlutils.dfba.lp import (PFBAProblem, FluxExtractor, FastPath, VariableBounds, set_fba_objective,
+                               PFBA_CONSTRAINT_ID)
+
+from .cobra_models import create_branched_model
+
+
+def test_pfba_problem():
+    model = create_branched_model()
+    reference = cobra.flux_analysis.pfba(create_branched_model())
+
+    pfba_problem = PFBAProblem(model)
+    total_flux = pfba_problem.optimize()
+    fluxes = FluxExtractor(model).fluxes()
+
+    assert abs(pfba_problem.optimum - 10.0) < 1E-6
+    assert abs(total_flux - reference.objective_value) < 1E-6
+    rids = [r.id for r in model.reactions]
+    assert np.allclose(fluxes, reference.fluxes[rids].values, atol=1E-6)
+
+
+def test_pfba_problem_restore():
+    model = create_branched_model()
+    pfba_problem = PFBAProblem(model, objective_coefficients={'BIO': 1.0}, direction='max')
+    pfba_problem.optimize()
+    pfba_problem.restore()
+
+    coefficients = {r.id: c for r, c in linear_reaction_coefficients(model).items()}
+    assert coefficients == {'BIO': 1.0}
+    assert model.solver.objective.direction == 'max'
+    constraint = model.solver.constraints[PFBA_CONSTRAINT_ID]
+    assert constraint.lb is None and constraint.ub is None
+    assert abs(model.slim_optimize() - 10.0) < 1E-6
+
+    # a second pfba formulation on the restored model
+    pfba_problem = PFBAProblem(model)
+    pfba_problem.optimize()
+    assert abs(pfba_problem.optimum - 10.0) < 1E-6
+
+
+def test_set_fba_objective():
+    model = create_branched_model()
+    PFBAProblem(model).optimize()
+    set_fba_objective(model, {'BIO': 1.0}, 'max')
+
+    coefficients = {r.id: c for r, c in linear_reaction_coefficients(model).items()}
+    assert coefficients == {'BIO': 1.0}
+    assert abs(model.slim_optimize() - 10.0) < 1E-6
+
+
+def test_variable_bounds():
+    model = create_branched_model()
+    reactions = [model.reactions.get_by_id(rid) for rid in ('EX_A', 'R3')]
+    variables = [r.forward_variable for r in reactions] + [r.reverse_variable for r in reactions]
+    variable_bounds = VariableBounds(model, variables)
+
+    # EX_A in [0, 5], R3 in [-2, 3]
+    variable_bounds.set_bounds([0.0, 0.0, 0.0, 0.0], [5.0, 3.0, 0.0, 2.0])
+    assert abs(model.slim_optimize() - 5.0) < 1E-6
+    assert [(v.lb, v.ub) for v in variables] == [(0.0, 5.0), (0.0, 3.0), (0.0, 0.0), (0.0, 2.0)]
+
+    # fixed bounds
+    variable_bounds.set_bounds([4.0, 0.0, 0.0, 0.0], [4.0, 3.0, 0.0, 2.0])
+    assert abs(model.slim_optimize() - 4.0) < 1E-6
+
+
+def solve_lp(model, pfba_problem, extractor, lb, ub):
+    """ FBA and pFBA fluxes of the model for the bounds. """
+    for r, lower, upper in zip(model.reactions, lb, ub):
+        r.bounds = (lower, upper)
+    pfba_problem.optimize_fba()
+    fba_fluxes = extractor.fluxes()
+    pfba_problem.optimize_pfba()
+    return fba_fluxes, extractor.fluxes()
+
+
+def test_fast_path_fba():
+    model = create_branched_model()
+    S = create_stoichiometric_matrix(model, array_type='dense')
+    c = np.array([1.0 if r.id == 'BIO' else 0.0 for r in model.reactions])
+    lb = np.array([r.lower_bound for r in model.reactions])
+    ub = np.array([r.upper_bound for r in model.reactions])
+    pfba_problem = PFBAProblem(model)
+    extractor = FluxExtractor(model)
+
+    fast_path = FastPath(S, c, direction='max', pfba=False)
+    fba_fluxes, _ = solve_lp(model, pfba_problem, extractor, lb, ub)
+    fast_path.update(lb, ub, fba_fluxes)
+    assert fast_path.n_factorizations == 1
+
+    # smaller uptake: the basis stays optimal
+    ub[0] = 8.0
+    v, optimum = fast_path.solve_fba(lb, ub)
+    fba_fluxes, _ = solve_lp(model, pfba_problem, extractor, lb, ub)
+    assert abs(optimum - 8.0) < 1E-6
+    assert np.allclose(v, fba_fluxes, atol=1E-6)
+
+    # the uptake is identical in all optima, the pathways are not
+    pinned = fast_path.pinned(lb, ub)
+    assert pinned[0]
+    assert not pinned[1] and not pinned[2]
+
+    # same basis, the pseudo-inverse is reused
+    fast_path.update(lb, ub, fba_fluxes)
+    assert fast_path.n_factorizations == 1
+
+    # the pathway of the basis is limited: the basis is infeasible
+    basic = [k for k in (1, 2) if fast_path.fba_basis.free[k]][0]
+    ub[basic] = 4.0
+    assert fast_path.solve_fba(lb, ub) is None
+
+
+def test_fast_path_pfba():
+    model = create_branched_model()
+    S = create_stoichiometric_matrix(model, array_type='dense')
+    c = np.array([1.0 if r.id == 'BIO' else 0.0 for r in model.reactions])
+    lb = np.array([r.lower_bound for r in model.reactions])
+    ub = np.array([r.upper_bound for r in model.reactions])
+    pfba_problem = PFBAProblem(model)
+    extractor = FluxExtractor(model)
+
+    # bases certified with the duals of the LP solver
+    fast_path = FastPath(S, c, direction='max', pfba=True)
+    fba_fluxes, fluxes = solve_lp(model, pfba_problem, extractor, lb, ub)
+    fast_path.update(lb, ub, fba_fluxes, fluxes, fba_duals=extractor.fba_duals('max'),
+                     pfba_duals=extractor.pfba_duals('max'))
+    assert fast_path.fba_basis is not None
+    assert fast_path.pfba_basis is not None
+    assert abs(fast_path.pfba_basis.mu - 3.0) < 1E-6
+
+    ub[0] = 8.0
+    v, optimum = fast_path.solve_fba(lb, ub)
+    w = fast_path.solve_pfba(lb, ub, optimum)
+    fba_fluxes, fluxes = solve_lp(model, pfba_problem, extractor, lb, ub)
+    assert abs(optimum - 8.0) < 1E-6
+    assert np.allclose(w, fluxes, atol=1E-6)
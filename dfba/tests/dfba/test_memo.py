@@ -0,0 +1,62 @@
+"""
+Tests for the memo of FBA solutions.
+"""
+import numpy as np
+
+from sbmlutils.dfba.memo import FluxMemo
+
+
+def test_memo_quantization():
+    memo = FluxMemo(tol=1E-3)
+    lb = np.array([-10.0, 0.0, -np.inf])
+    ub = np.array([10.0, 5.0, np.inf])
+    key = memo.key(lb, ub)
+
+    # bounds within the quantization and signed zeros share the key
+    assert memo.key(lb + 4E-4, ub - 4E-4) == key
+    assert memo.key(np.array([-10.0, -0.0, -np.inf]), ub) == key
+    assert memo.key(np.array([-10.0, -1E-4, -np.inf]), ub) == key
+
+    # different bounds
+    assert memo.key(lb + 2E-3, ub) != key
+    assert memo.key(ub, lb) != key
+    assert memo.key(np.array([-10.0, 0.0, 0.0]), ub) != key
+
+
+def test_memo_lru():
+    memo = FluxMemo(max_size=2, tol=1E-3)
+    keys = [memo.key(np.array([float(k)]), np.array([10.0])) for k in range(3)]
+
+    memo.put(keys[0], 'a')
+    memo.put(keys[1], 'b')
+    # the lookup makes keys[0] the most recently used solution
+    assert memo.get(keys[0]) == 'a'
+    memo.put(keys[2], 'c')
+    assert len(memo) == 2
+    assert memo.get(keys[1]) is None
+    assert memo.get(keys[0]) == 'a'
+    assert memo.get(keys[2]) == 'c'
+
+    # storing an existing key updates the solution without eviction
+    memo.put(keys[0], 'd')
+    assert len(memo) == 2
+    assert memo.get(keys[0]) == 'd'
+    assert memo.get(keys[2]) == 'c'
+
+
+def test_memo_hit_rate():
+    memo = FluxMemo(max_size=10)
+    assert memo.hit_rate == 0.0
+    key = memo.key(np.zeros(2), np.ones(2))
+    assert memo.get(key) is None
+    memo.put(key, 'a')
+    assert memo.get(key) == 'a'
+    assert memo.get(key) == 'a'
+    assert memo.hits == 2 and memo.misses == 1
+    assert abs(memo.hit_rate - 2.0 / 3.0) < 1E-12
+
+    memo.reset_stats()
+    assert memo.hits == 0 and memo.misses == 0
+    assert len(memo) == 1
+    memo.clear()
+    assert len(memo) == 0
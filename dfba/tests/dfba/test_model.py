@@ -0,0 +1,58 @@
+"""
+Tests for the loading of the DFBA model.
+"""
+import os
+
+import cobra
+import libsbml
+import numpy as np
+import roadrunner
+
+from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.toy_wholecell import settings
+
+TOY_SBML = os.path.join(settings.OUT_DIR, 'v16', settings.TOP_LOCATION)
+
+
+def test_flattened_sbml(tmpdir, monkeypatch):
+    # external model definitions are not resolved against the working directory
+    monkeypatch.chdir(str(tmpdir))
+    cwd = os.getcwd()
+    dfba_model = DFBAModel(sbml_path=TOY_SBML)
+    assert os.getcwd() == cwd
+    assert os.listdir(cwd) == []
+
+    # flattened model file of the top model without the flux rules
+    doc = libsbml.readSBMLFromFile(TOY_SBML)
+    for variable in DFBAModel._process_flux_rules(doc.getModel()).values():
+        doc.getModel().removeRuleByVariable(variable)
+    props = libsbml.ConversionProperties()
+    props.addOption("flatten comp", True)
+    assert doc.convert(props) == libsbml.LIBSBML_OPERATION_SUCCESS
+    path = os.path.join(cwd, 'flattened.xml')
+    libsbml.writeSBMLToFile(doc, path)
+    rr_file = roadrunner.RoadRunner(path)
+
+    rr = dfba_model.rr_comp
+    assert list(rr.model.getFloatingSpeciesIds()) == list(rr_file.model.getFloatingSpeciesIds())
+    assert list(rr.model.getGlobalParameterIds()) == list(rr_file.model.getGlobalParameterIds())
+    assert list(rr.model.getReactionIds()) == list(rr_file.model.getReactionIds())
+    selections = ['time'] + ['[{}]'.format(sid) for sid in rr.model.getFloatingSpeciesIds()]
+    for r in (rr, rr_file):
+        r.timeCourseSelections = selections
+        r.reset()
+    assert np.allclose(rr.simulate(0, 10, steps=10), rr_file.simulate(0, 10, steps=10))
+
+
+def test_cobra_model():
+    dfba_model = DFBAModel(sbml_path=TOY_SBML)
+    fba_model = dfba_model.fba_model
+    reference = cobra.io.read_sbml_model(fba_model.source)
+
+    cobra_model = fba_model.cobra_model
+    assert [r.id for r in cobra_model.reactions] == [r.id for r in reference.reactions]
+    assert [m.id for m in cobra_model.metabolites] == [m.id for m in reference.metabolites]
+    for r, r_ref in zip(cobra_model.reactions, reference.reactions):
+        assert r.bounds == r_ref.bounds
+        assert {m.id: c for m, c in r.metabolites.items()} == {m.id: c for m, c in r_ref.metabolites.items()}
+    assert np.isclose(cobra_model.slim_optimize(), reference.slim_optimize())
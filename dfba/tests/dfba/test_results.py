@@ -0,0 +1,75 @@
+"""
+Tests for the result containers.
+"""
+import os
+
+import numpy as np
+import pytest
+
+from sbmlutils.dfba.results import BatchResult, ResultBuffer
+from sbmlutils.dfba.sinks import ResultSink, create_sink
+
+
+def test_batch_result_failed():
+    columns = ['time', '[A]']
+    complete = (np.array([[0.0, 1.0], [1.0, 2.0], [2.0, 3.0]]), np.array([0.0, 1.0, 2.0]), columns, True)
+    partial = (np.array([[0.0, 1.0]]), np.array([0.0]), columns, False)
+    batch_result = BatchResult.from_results([complete, partial, None])
+
+    assert batch_result.shape == (3, 3, 2)
+    assert list(batch_result.lengths) == [3, 1, 0]
+    assert list(batch_result.failed) == [False, True, True]
+    # the partial result is kept
+    assert np.allclose(batch_result.scenario(1).data, partial[0])
+    assert np.all(np.isnan(batch_result.data[1, 1:]))
+
+
+def fill_buffer(buffer, n):
+    """ Writes n rows with the values k and k**2 and the FVA values k. """
+    for k in range(n):
+        row = buffer.row(k)
+        row[:] = [k, k ** 2]
+        buffer.time[k] = k
+        if buffer.fva is not None:
+            buffer.fva_row(k)[:] = k
+        buffer.advance()
+
+
+def test_result_buffer_grow():
+    buffer = ResultBuffer(columns=['time', '[A]'], capacity=2, reaction_ids=['R1'])
+    fill_buffer(buffer, 5)
+    result = buffer.result()
+    assert result.shape == (5, 2)
+    assert np.allclose(result.data[:, 1], np.arange(5) ** 2)
+    assert np.allclose(result.fva[:, 0, 0], np.arange(5))
+
+
+@pytest.mark.parametrize('filename', ['result.csv', 'result.tsv', 'result.h5', 'result.parquet'])
+def test_sink_round_trip(tmpdir, filename):
+    if filename.endswith('.h5'):
+        pytest.importorskip('tables')
+    if filename.endswith('.parquet'):
+        pytest.importorskip('pyarrow')
+    columns = ['time', '[A]']
+    sink = create_sink(os.path.join(str(tmpdir), filename))
+    buffer = ResultBuffer(columns=columns, capacity=7, reaction_ids=['R1'],
+                          fva_path=os.path.join(str(tmpdir), 'fva.dat'), sink=sink, flush_interval=3)
+    fill_buffer(buffer, 7)
+    result = buffer.result()
+    buffer.close()
+
+    # the result holds the unflushed rows, the sink all rows
+    assert result.offset == 6
+    assert np.allclose(result.data, [[6.0, 36.0]])
+    assert np.allclose(result.time, [6.0])
+    assert result.fva.shape == (1, 1, 3)
+    assert np.allclose(result.fva[0], 6.0)
+    df = result.read_sink()
+    assert list(df.columns) == columns
+    assert np.allclose(df.values, np.column_stack([np.arange(7), np.arange(7) ** 2]))
+    assert sink.n == 7
+
+
+def test_result_sink_abstract():
+    with pytest.raises(TypeError):
+        ResultSink('result.csv')
@@ -0,0 +1,296 @@
+"""
+Tests for the DFBA simulations of the toy model.
+"""
+import os
+import pickle
+import shutil
+
+import libsbml
+import numpy as np
+import pytest
+from cobra.exceptions import OptimizationError
+
+from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.simulator import DFBASimulator
+from sbmlutils.dfba.submodels import SubmodelSolver
+from sbmlutils.dfba.toy_wholecell import settings
+
+TOY_SBML = os.path.join(settings.OUT_DIR, 'v16', settings.TOP_LOCATION)
+
+
+def create_simulator(**kwargs):
+    return DFBASimulator(DFBAModel(sbml_path=TOY_SBML), **kwargs)
+
+
+def test_checkpoint_resume(tmpdir):
+    checkpoint = os.path.join(str(tmpdir), 'checkpoint.pickle')
+    reference = create_simulator(memo_size=10).simulate(tstart=0.0, tend=20.0, dt=1.0, show_settings=False)
+
+    # simulation stopped by an error after the checkpoint at step 10
+    simulator = create_simulator(memo_size=10)
+    fba_step = simulator._fba_step
+    steps = []
+
+    def failing_fba_step(row, *args, **kwargs):
+        steps.append(row)
+        if len(steps) > 12:
+            raise RuntimeError("Simulation stopped")
+        return fba_step(row, *args, **kwargs)
+
+    simulator._fba_step = failing_fba_step
+    partial = simulator.simulate(tstart=0.0, tend=20.0, dt=1.0, show_settings=False,
+                                 checkpoint=checkpoint, checkpoint_interval=5)
+    assert not partial.complete
+    assert len(partial) == 12
+
+    simulator = create_simulator(memo_size=10)
+    result = simulator.resume(checkpoint, show_settings=False)
+    assert result.complete
+    assert result.columns == reference.columns
+    assert np.allclose(result.time, reference.time)
+    assert np.allclose(result.data, reference.data)
+    assert len(simulator.flux_memo) > 0
+
+
+def test_flux_memo():
+    reference = create_simulator().simulate(tstart=0.0, tend=300.0, dt=1.0, show_settings=False)
+    simulator = create_simulator(memo_size=10)
+    result = simulator.simulate(tstart=0.0, tend=300.0, dt=1.0, show_settings=False)
+    assert np.allclose(result.data, reference.data)
+    # the bounds are clamped to zero after the depletion of the substrates
+    assert simulator.flux_memo.hits > 0
+    assert len(simulator.flux_memo) <= 10
+
+
+def species_data(result, step=1):
+    """ Species columns of the result at every step-th time point. """
+    columns = [k for k, column in enumerate(result.columns) if column.startswith('[')]
+    return np.array(result.data)[::step, columns]
+
+
+def test_stepping():
+    # persistent integrator vs. a roadrunner simulate call per step
+    stepping = create_simulator().simulate(tstart=0.0, tend=40.0, dt=0.5, show_settings=False, stepping=True)
+    simulate = create_simulator().simulate(tstart=0.0, tend=40.0, dt=0.5, show_settings=False, stepping=False)
+    assert stepping.columns == simulate.columns
+    assert np.allclose(stepping.time, simulate.time)
+    assert np.allclose(stepping.data, simulate.data, rtol=1E-4, atol=1E-6)
+
+
+@pytest.fixture(scope='module')
+def fine_reference():
+    """ Explicit coupling with a small step size, including the basis change of the FBA. """
+    return create_simulator().simulate(tstart=0.0, tend=80.0, dt=0.02, show_settings=False)
+
+
+def test_direct(fine_reference):
+    simulator = create_simulator()
+    result = simulator.simulate_direct(tstart=0.0, tend=80.0, dt=1.0)
+    assert result.complete
+    assert simulator.n_events > 0
+    assert simulator.n_lp < 10
+    assert np.allclose(result.time, fine_reference.time[::50])
+    # the explicit coupling converges with the step size, the bounds depend on dt
+    assert np.allclose(species_data(result), species_data(fine_reference, step=50), atol=2E-2)
+
+
+def test_midpoint(fine_reference):
+    reference = species_data(fine_reference, step=50)
+    explicit = create_simulator().simulate(tstart=0.0, tend=80.0, dt=1.0, show_settings=False)
+    result = create_simulator().simulate(tstart=0.0, tend=80.0, dt=1.0, show_settings=False,
+                                         coupling='midpoint')
+    assert result.complete
+    assert np.allclose(result.time, fine_reference.time[::50])
+    # second order coupling, the deviation is dominated by the error of the reference
+    error = np.max(np.abs(species_data(result) - reference))
+    assert error < 5E-2
+    assert error < 0.1 * np.max(np.abs(species_data(explicit) - reference))
+
+
+def test_adaptive(fine_reference):
+    simulator = create_simulator()
+    result = simulator.simulate(tstart=0.0, tend=80.0, dt=0.1, dt_min=0.01, dt_max=0.5, adaptive=True,
+                                show_settings=False)
+    assert result.complete
+    time = np.array(result.time)
+    assert time[0] == 0.0 and abs(time[-1] - 80.0) < 1E-9
+
+    # step sizes within the limits, the last step ends at tend
+    steps = np.diff(time)
+    assert np.all(steps[:-1] >= 0.01 - 1E-9)
+    assert np.all(steps <= 0.5 + 1E-9)
+    # fewer steps than with the initial step size
+    assert len(result) < 0.5 * 80.0 / 0.1
+    assert simulator.n_rejected > 0
+
+    # fine reference at the time points of the adaptive run
+    reference = species_data(fine_reference)
+    reference = np.array([np.interp(time, fine_reference.time, reference[:, k])
+                          for k in range(reference.shape[1])]).T
+    assert np.allclose(species_data(result), reference, rtol=5E-2, atol=5E-2)
+
+
+def test_optimization_error():
+    simulator = create_simulator(lp_solver='highs')
+    solve = simulator.lp_backend.solve
+    calls = []
+
+    def failing_solve(lb, ub):
+        calls.append(lb)
+        if len(calls) > 5:
+            raise OptimizationError("Solver status is 'infeasible'.")
+        return solve(lb, ub)
+
+    simulator.lp_backend.solve = failing_solve
+    result = simulator.simulate(tstart=0.0, tend=10.0, dt=1.0, show_settings=False)
+    # the partial result until the failed LP is returned
+    assert not result.complete
+    assert isinstance(result.error, OptimizationError)
+    assert len(result) == 5
+
+
+def test_reuse_solution():
+    simulator = create_simulator(reuse_solution=True)
+    reference = create_simulator()
+    result = simulator.simulate(tstart=0.0, tend=100.0, dt=1.0, show_settings=False)
+    assert np.array_equal(result.data, reference.simulate(tstart=0.0, tend=100.0, dt=1.0,
+                                                          show_settings=False).data)
+    assert simulator.n_reused > 0
+    assert np.sum(~np.array(result.lp_solved)) == simulator.n_reused
+
+    columns = simulator.columns
+    row = np.array(result.data[0])
+    simulator._fba_step(row.copy())
+    assert simulator._lp_solved
+    fluxes = simulator.fluxes.copy()
+
+    # the uptake bound of A does not bind, the fluxes are reused
+    row[columns['lb_EX_A']] *= 0.5
+    simulator._fba_step(row.copy())
+    assert not simulator._lp_solved
+    assert np.array_equal(simulator.fluxes, fluxes)
+
+    # the bound of R1 binds, the LP is solved
+    row[columns['ub_R1']] *= 0.5
+    simulator._fba_step(row.copy())
+    reference._fba_step(row.copy())
+    assert simulator._lp_solved
+    assert not np.allclose(simulator.fluxes, fluxes)
+    assert np.allclose(simulator.fluxes, reference.fluxes)
+
+
+def test_bound_parameters():
+    dfba_model = DFBAModel(sbml_path=TOY_SBML)
+    fba_model = dfba_model.fba_models[0]
+    top_pids = set(p.getId() for p in dfba_model.model_top.getListOfParameters())
+    assert set(fba_model.fba2top_bounds) == set(fba_model.ub_pid2rid) | set(fba_model.lb_pid2rid)
+    assert set(fba_model.fba2top_bounds.values()) <= top_pids
+
+
+def test_submodel_solver_pickle():
+    simulator = create_simulator()
+    simulator.simulate(tstart=0.0, tend=2.0, dt=1.0, show_settings=False)
+    solver = simulator.fba_solver
+    assert isinstance(solver, SubmodelSolver)
+
+    copy = pickle.loads(pickle.dumps(solver))
+    assert not hasattr(copy, 'fba_model')
+    row = np.array(simulator.result.data[-1])
+    lower_bounds, upper_bounds = solver.read_bounds(row)
+    assert np.allclose(copy.solve(lower_bounds, upper_bounds), solver.solve(lower_bounds, upper_bounds))
+
+
+def two_submodel_sbml(directory):
+    """ Toy model with a second FBA submodel in front of the toy FBA submodel.
+
+    The second submodel has constant bounds and its own exchange reactions
+    and flux parameters, which update the species of the top model.
+
+    :param directory: directory for the model files
+    :return: path of the top model
+    """
+    model_dir = os.path.dirname(TOY_SBML)
+    for name in os.listdir(model_dir):
+        if name.endswith('.xml'):
+            shutil.copy(os.path.join(model_dir, name), directory)
+    doc = libsbml.readSBMLFromFile(TOY_SBML)
+    model = doc.getModel()
+    model_comp = model.getPlugin('comp')
+    submodel = model_comp.createSubmodel()
+    submodel.setId('fba2')
+    submodel.setModelRef('toy_wholecell_fba')
+    submodel.setSBOTerm(624)
+
+    for pid, value in [('lb_EX_A', -1000), ('ub_EX_A', 1000), ('lb_EX_C', -1000), ('ub_EX_C', 1000),
+                       ('ub_R1', 0.2)]:
+        p = model.createParameter()
+        p.setId('{}_2'.format(pid))
+        p.setValue(value)
+        p.setConstant(True)
+        p.setSBOTerm(625)
+        replaced = p.getPlugin('comp').createReplacedElement()
+        replaced.setSubmodelRef('fba2')
+        replaced.setPortRef('{}_port'.format(pid))
+
+    for rid, sid in [('EX_A', 'A'), ('EX_C', 'C')]:
+        # exchange reaction replaced by the FBA reaction
+        r = model.createReaction()
+        r.setId('{}_2'.format(rid))
+        r.setReversible(False)
+        r.setFast(False)
+        r.setSBOTerm(631)
+        product = r.createProduct()
+        product.setSpecies('dummy_S')
+        product.setStoichiometry(1)
+        product.setConstant(True)
+        r.createKineticLaw().setMath(libsbml.parseL3Formula('0'))
+        replaced_by = r.getPlugin('comp').createReplacedBy()
+        replaced_by.setSubmodelRef('fba2')
+        replaced_by.setPortRef('{}_port'.format(rid))
+
+        # flux parameter and update of the species
+        p = model.createParameter()
+        p.setId('p{}_2'.format(rid))
+        p.setValue(0.0)
+        p.setConstant(False)
+        p.setSBOTerm(612)
+        rule = model.createAssignmentRule()
+        rule.setVariable(p.getId())
+        rule.setMath(libsbml.parseL3Formula(r.getId()))
+        update = model.createReaction()
+        update.setId('update_{}_2'.format(sid))
+        update.setReversible(True)
+        update.setFast(False)
+        reactant = update.createReactant()
+        reactant.setSpecies(sid)
+        reactant.setStoichiometry(1)
+        reactant.setConstant(True)
+        update.createKineticLaw().setMath(libsbml.parseL3Formula('-{}'.format(p.getId())))
+
+    # the top reaction ids of the first FBA submodel differ from its FBA reaction ids
+    submodels = model_comp.getListOfSubmodels()
+    submodels.insert(0, submodels.remove('fba2'))
+    path = os.path.join(directory, 'toy_two_submodels.xml')
+    libsbml.writeSBMLToFile(doc, path)
+    return path
+
+
+@pytest.mark.parametrize('lp_processes', [1, 2])
+def test_two_submodels(tmpdir, lp_processes):
+    sbml_path = two_submodel_sbml(str(tmpdir))
+    dfba_model = DFBAModel(sbml_path=sbml_path)
+    assert [fba_model.submodel.getId() for fba_model in dfba_model.fba_models] == ['fba2', 'fba']
+    simulator = DFBASimulator(dfba_model, lp_processes=lp_processes)
+    assert len(simulator.submodel_solvers) == 1
+    df = simulator.simulate(tstart=0.0, tend=5.0, dt=0.1, show_settings=False).to_dataframe()
+
+    # fluxes of both submodels are stored and written to their flux parameters
+    assert np.allclose(df['EX_A_2'], -0.2)
+    assert np.allclose(df['fba2__R1'], 0.2)
+    assert np.allclose(df['pEX_A_2'], df['EX_A_2'])
+    assert np.allclose(df['pEX_A'], df['EX_A'])
+
+    # the second submodel takes up A in addition to the toy model
+    reference = create_simulator().simulate(tstart=0.0, tend=5.0, dt=0.1, show_settings=False).to_dataframe()
+    assert np.allclose(df['EX_A'], reference['EX_A'], atol=1E-4)
+    assert np.allclose(df['[A]'], reference['[A]'] - 0.2 * df['time'], atol=1E-4)
@@ -0,0 +1,44 @@
+"""
+Tests for the timing of the phases of DFBA simulations.
+"""
+import os
+
+import numpy as np
+
+from sbmlutils.dfba.model import DFBAModel
+from sbmlutils.dfba.simulator import DFBASimulator
+from sbmlutils.dfba.timing import PhaseTimer, PHASES
+from sbmlutils.dfba.toy_wholecell import settings
+
+TOY_SBML = os.path.join(settings.OUT_DIR, 'v16', settings.TOP_LOCATION)
+
+
+def test_phase_timer():
+    timer = PhaseTimer(capacity=2)
+    for k in range(5):
+        timer.step(k)
+        for phase in PHASES:
+            timer.lap(phase)
+    assert timer.n == 5
+    assert timer.times.shape[0] >= 5
+    assert np.all(timer.to_dataframe().values >= 0.0)
+
+
+def test_simulate_timing():
+    simulator = DFBASimulator(DFBAModel(sbml_path=TOY_SBML))
+    result = simulator.simulate(tstart=0.0, tend=10.0, dt=0.5, show_settings=False)
+
+    timing = simulator.timing
+    assert list(timing.columns) == PHASES
+    assert simulator.timer.n == len(result) == 21
+    assert len(timing) == 21
+    assert np.allclose(timing.index, result.time)
+    assert np.all(timing.values >= 0.0)
+
+    # every phase is recorded with pfba and uniqueness checks
+    summary = simulator.timer.summary()
+    assert list(summary.index) == PHASES
+    assert np.all(summary['total'] > 0.0)
+    assert np.allclose(summary['total'], timing.sum(axis=0))
+    assert np.isclose(summary['percent'].sum(), 100.0)
+    assert timing.values.sum() <= simulator.simulation_time
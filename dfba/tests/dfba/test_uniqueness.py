@@ -0,0 +1,83 @@
+"""
+Tests for the uniqueness check of FBA solutions.
+"""
+import numpy as np
+import cobra
+from cobra.util.array import create_stoichiometric_matrix
+
+from sbmlutils.dfba.fva import FVAPool
+from sbmlutils.dfba.lp import FluxExtractor
+from sbmlutils.dfba.uniqueness import UniquenessChecker
+
+from .cobra_models import create_branched_model
+
+
+def check_against_fva(model):
+    """ Compares the uniqueness check with a full FVA of the model. """
+    rids = [r.id for r in model.reactions]
+    S = create_stoichiometric_matrix(model, array_type='dense')
+    lb = np.array([r.lower_bound for r in model.reactions])
+    ub = np.array([r.upper_bound for r in model.reactions])
+
+    model.slim_optimize()
+    extractor = FluxExtractor(model)
+    fluxes = extractor.fluxes()
+    pinned = extractor.pinned(lb, ub)
+
+    checker = UniquenessChecker(model, rids, S=S)
+    fva = checker.check(fluxes, pinned, lb=lb, ub=ub)
+    reference = cobra.flux_analysis.flux_variability_analysis(model, reaction_list=rids)
+    assert np.allclose(fva[:, 0], reference.loc[rids, 'minimum'].values, atol=1E-6)
+    assert np.allclose(fva[:, 1], reference.loc[rids, 'maximum'].values, atol=1E-6)
+    assert np.allclose(fva[:, 2], fluxes)
+    return checker
+
+
+def test_uniqueness_alternative_optima():
+    model = create_branched_model()
+    checker = check_against_fva(model)
+    # the pathways R1 and R2/R3 are alternative optima
+    assert 0 < checker.n_fva < checker.n_checked
+
+
+def test_uniqueness_single_pathway():
+    model = create_branched_model()
+    model.reactions.get_by_id('R2').upper_bound = 0.0
+    model.reactions.get_by_id('R3').bounds = (0.0, 0.0)
+    check_against_fva(model)
+
+
+def test_null_space():
+    model = create_branched_model()
+    rids = [r.id for r in model.reactions]
+    S = create_stoichiometric_matrix(model, array_type='dense')
+    checker = UniquenessChecker(model, rids, S=S)
+
+    # with the uptake fixed the biomass flux follows from the steady state
+    pinned = np.array([True, False, False, False, False])
+    unique = checker.unique_fluxes(pinned)
+    assert list(unique) == [True, False, False, False, True]
+
+    # R1 fixed: the second pathway follows as well
+    pinned = np.array([True, True, False, False, False])
+    assert np.all(checker.unique_fluxes(pinned))
+    assert np.all(checker.unique_fluxes(pinned))
+
+
+def test_fva_pool():
+    model = create_branched_model()
+    rids = [r.id for r in model.reactions]
+    lb = np.array([r.lower_bound for r in model.reactions])
+    ub = np.array([r.upper_bound for r in model.reactions])
+    solution = cobra.flux_analysis.pfba(model)
+    fluxes = solution.fluxes[rids].values
+    c = np.array([1.0 if rid == 'BIO' else 0.0 for rid in rids])
+
+    pool = FVAPool(model, processes=2, objective_coefficients=c, direction='max', pfba=True)
+    try:
+        minimum, maximum = pool.fva(rids, fluxes, lb, ub)
+    finally:
+        pool.close()
+    # the pfba solution is unique
+    assert np.allclose(minimum, fluxes, atol=1E-6)
+    assert np.allclose(maximum, fluxes, atol=1E-6)